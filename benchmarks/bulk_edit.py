@@ -0,0 +1,58 @@
+"""
+bulk_edit.py: time of the bulk operations on selected fields of QtImageViewer as the selection grows.
+The time per field should stay about the same from 500 to 50000 selected fields. Run from the repository root:
+    python -m benchmarks.bulk_edit
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtGui import QImage, Qt
+from PySide6.QtWidgets import QApplication
+
+from benchmarks.selection_latency import addFieldGrid
+from qtImageViewer import QtImageViewer
+
+FIELD_COUNTS = (500, 5000, 50000)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def measure(count: int) -> dict:
+    """ Milliseconds taken by each bulk operation on count selected fields. """
+    viewer = QtImageViewer()
+    viewer.resize(1280, 1024)
+    image = QImage(2480, 3508, QImage.Format_Grayscale8)
+    image.fill(Qt.white)
+    viewer.setImage(image)
+    viewer.selectFields(addFieldGrid(viewer, count))
+
+    operations = (
+        ("move", lambda: viewer.moveSelectedFields(5, 5)),
+        ("align", lambda: viewer.alignSelectedFields(Qt.AlignLeft)),
+        ("set size", lambda: viewer.setSelectedFieldsSize(40, 20)),
+        ("duplicate", lambda: viewer.duplicateSelectedFields()),
+        ("delete", lambda: viewer.removeFields(viewer.selectedFields())),
+    )
+    times = {}
+    for name, operation in operations:
+        start = time.perf_counter()
+        operation()
+        times[name] = (time.perf_counter() - start) * 1000
+
+    viewer.close()
+    return times
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    app = QApplication.instance() or QApplication(sys.argv)
+    for count in FIELD_COUNTS:
+        times = measure(count)
+        print(f"{count:5d} fields: " + "  ".join(f"{name} {ms:8.1f} ms ({1000 * ms / count:5.1f} us/field)"
+                                                 for name, ms in times.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+drag_coalescing.py: geometry changes, repaints and latency while a field is dragged with a 1000 Hz mouse.
+A field is pressed in design mode and moved one pixel per millisecond for DURATION seconds, with and without
+frame coalescing (ResizableRect.FRAME_INTERVAL_MS = 0 applies every mouse event). Reported per second:
+setRect calls, viewport paint events and repainted area, and the latency from a mouse event to the
+geometry change that shows it. Coalesced, there should be at most about 60 setRect calls per second and
+the repainted area should drop accordingly. Run from the repository root:
+    python -m benchmarks.drag_coalescing
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QEvent, QObject, QPointF
+from PySide6.QtGui import QImage, QMouseEvent, Qt
+from PySide6.QtTest import QTest
+from PySide6.QtWidgets import QApplication
+
+from benchmarks.selection_latency import addFieldGrid
+from components.resize_rect import ResizableRect
+from qtImageViewer import QtImageViewer
+
+FIELDS = 10000
+DURATION = 1.0
+EVENT_INTERVAL = 0.001
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class PaintCounter(QObject):
+    """ Event filter that counts the paint events of a widget and the area (pixels) they repaint. """
+
+    def __init__(self):
+        super().__init__()
+        self.paints = 0
+        self.area = 0
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Paint:
+            self.paints += 1
+            self.area += sum(rect.width() * rect.height() for rect in event.region())
+        return False
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def measure(app: QApplication, frameInterval: int) -> dict:
+    ResizableRect.FRAME_INTERVAL_MS = frameInterval
+    viewer = QtImageViewer()
+    viewer.resize(1280, 1024)
+    viewer.show()
+    image = QImage(2480, 3508, QImage.Format_Grayscale8)
+    image.fill(Qt.white)
+    viewer.setImage(image)
+    viewer.setDesignMode()
+    fields = addFieldGrid(viewer, FIELDS)
+    app.processEvents()
+
+    start = viewer.mapFromScene(viewer.fieldStore().rect(int(fields[FIELDS // 2])).center())
+    QTest.mousePress(viewer.viewport(), Qt.LeftButton, Qt.NoModifier, start)
+    app.processEvents()
+    editor = viewer._editor
+    applied = []
+    setRect = editor.setRect
+    editor.setRect = lambda rect: (applied.append(time.perf_counter()), setRect(rect))
+
+    counter = PaintCounter()
+    viewer.viewport().installEventFilter(counter)
+    moves = []
+    begin = time.perf_counter()
+    step = 0
+    while time.perf_counter() - begin < DURATION:
+        step += 1
+        position = QPointF(start.x() + step % 200, start.y() + (step // 200) % 50)
+        event = QMouseEvent(QEvent.MouseMove, position, viewer.viewport().mapToGlobal(position), Qt.NoButton,
+                            Qt.LeftButton, Qt.NoModifier)
+        moves.append(time.perf_counter())
+        app.sendEvent(viewer.viewport(), event)
+        app.processEvents()
+        while time.perf_counter() - moves[-1] < EVENT_INTERVAL:
+            pass
+    elapsed = time.perf_counter() - begin
+    QTest.mouseRelease(viewer.viewport(), Qt.LeftButton, Qt.NoModifier, position.toPoint())
+    app.processEvents()
+    viewer.viewport().removeEventFilter(counter)
+
+    # Latencia de cada evento: hasta el primer cambio de geometría posterior
+    latencies, index = [], 0
+    for moment in moves:
+        while index < len(applied) and applied[index] < moment:
+            index += 1
+        if index < len(applied):
+            latencies.append((applied[index] - moment) * 1000)
+    viewer.close()
+    return {"events": len(moves) / elapsed, "setRect": len(applied) / elapsed, "paints": counter.paints / elapsed,
+            "area": counter.area / elapsed, "latency": statistics.median(latencies),
+            "latency95": statistics.quantiles(latencies, n=20)[-1]}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    app = QApplication.instance() or QApplication(sys.argv)
+    frameInterval = ResizableRect.FRAME_INTERVAL_MS
+    for label, interval in (("every event", 0), ("coalesced", frameInterval)):
+        stats = measure(app, interval)
+        print(f"{label:12s}: {stats['events']:6.0f} events/s, {stats['setRect']:6.0f} setRect/s, "
+              f"{stats['paints']:5.0f} paints/s, {stats['area'] / 1e3:7.0f} kpixel/s repainted, "
+              f"latency median {stats['latency']:5.2f} ms p95 {stats['latency95']:5.2f} ms")
+    ResizableRect.FRAME_INTERVAL_MS = frameInterval
+
+
+if __name__ == "__main__":
+    main()
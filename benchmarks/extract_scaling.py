@@ -0,0 +1,69 @@
+"""
+extract_scaling.py: pages per second of extract_fields with 1, 2, 4... worker processes, up to one per CPU.
+Generates a batch of synthetic bilevel A4 scans (300 dpi, G4 TIFF) and a 60 field template in a temporary
+folder. The speedup should grow close to linearly with the number of workers. Run from the repository root:
+    python -m benchmarks.extract_scaling [pages]
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+from PySide6.QtGui import QImage, QImageWriter
+
+import template_io
+from extract_fields import extractFields
+from field_store import FieldStore
+from image_buffer import qimageFromArray
+
+DEFAULT_PAGES = 48
+A4_300DPI = (2480, 3508)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def makeBatch(folder: str, pages: int) -> tuple:
+    """ Write the scans and the template. Returns (list of scan file names, template file name). """
+    # Ruido en bloques de 8x8 con un 10% de negro, para que la compresión G4 tenga algo de trabajo
+    rng = np.random.default_rng(0)
+    blocks = np.where(rng.random((A4_300DPI[1] // 8, A4_300DPI[0] // 8)) < 0.1, 0, 255).astype(np.uint8)
+    gray = np.ascontiguousarray(np.kron(blocks, np.ones((8, 8), dtype=np.uint8)))
+    scan = qimageFromArray(gray).convertToFormat(QImage.Format_Mono)
+
+    fileNames = []
+    for page in range(pages):
+        fileName = os.path.join(folder, f"scan_{page:04d}.tif")
+        writer = QImageWriter(fileName, b"tiff")
+        writer.setCompression(1)
+        writer.write(scan)
+        fileNames.append(fileName)
+
+    store = FieldStore()
+    column, row = np.meshgrid(np.arange(3), np.arange(20))
+    store.addMany(np.column_stack([200 + column.ravel() * 700, 200 + row.ravel() * 160,
+                                   np.full(60, 600), np.full(60, 120)]))
+    templateFileName = os.path.join(folder, "template.tplb")
+    template_io.saveTemplate(templateFileName, store)
+    return fileNames, templateFileName
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PAGES
+    jobs = [1]
+    while jobs[-1] * 2 <= os.cpu_count():
+        jobs.append(jobs[-1] * 2)
+    if jobs[-1] != os.cpu_count():
+        jobs.append(os.cpu_count())
+
+    with tempfile.TemporaryDirectory() as folder:
+        fileNames, templateFileName = makeBatch(folder, pages)
+        base = None
+        for count in jobs:
+            stats = extractFields(templateFileName, fileNames, os.path.join(folder, f"crops_{count}"), jobs=count)
+            base = base or stats["pagesPerSecond"]
+            print(f"{count:3d} workers: {stats['pages']} pages, {stats['crops']} crops, "
+                  f"{stats['pagesPerSecond']:7.1f} pages/s, speedup {stats['pagesPerSecond'] / base:4.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+field_detection.py: time of FieldDetector.detect() on the sample forms and number of fields proposed.
+It should stay under a second for an A4 page at 300 dpi. Run from the repository root:
+    python -m benchmarks.field_detection [image...]
+"""
+import sys
+import time
+
+from PySide6.QtGui import QImage
+
+from field_detection import FieldDetector
+from image_buffer import ImageBuffer
+
+DEFAULT_IMAGES = ("sample_images/resultado_BN_DINA4.tif", "sample_images/test_flexibar.tif")
+REPEAT = 3
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    detector = FieldDetector()
+    for fileName in sys.argv[1:] or DEFAULT_IMAGES:
+        image = QImage(fileName)
+        if image.isNull():
+            print(f"{fileName}: cannot read")
+            continue
+        buffer = ImageBuffer(image)
+        dpi = image.dotsPerMeterX() * 0.0254 or 300.0
+        times = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            fields = detector.detect(buffer, dpi)
+            times.append(time.perf_counter() - start)
+        print(f"{fileName} ({image.width()}x{image.height()}, {dpi:.0f} dpi): {len(fields)} fields in "
+              f"{min(times) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+frame_stream.py: frame rate of a FrameStream shown in a QtImageViewer zoomed below 1:1 (the frame fitted in a
+smaller window), the case where every frame goes through the fit cache of the TiledImageItem.
+A producer thread pushes NumPy frames (1080p camera, A4 page scanned at 300 dpi) as fast as it can for DURATION seconds while the GUI
+thread shows them. Reported per case: frames shown per second, frames dropped and the cost of showing and
+painting one frame. Checks that the fit cache is reused (redrawn in place) from frame to frame and that the
+frames are shown at TARGET_FPS at least. Run from the repository root:
+    python -m benchmarks.frame_stream
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PySide6.QtWidgets import QApplication
+
+from frame_stream import FrameStream
+from qtImageViewer import QtImageViewer
+
+# 1080p camera frames and an A4 page at 300 dpi, in a window smaller than them
+FRAME_SHAPES = (("RGB uint8", (1080, 1920, 3)), ("gray uint8", (1080, 1920)), ("gray uint8", (3508, 2480)))
+VIEW_SIZE = (1280, 720)
+DURATION = 2.0
+TARGET_FPS = 30.0
+SYNC_FRAMES = 30
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def stream(app: QApplication, viewer: QtImageViewer, frames) -> dict:
+    """ Push frames (cycled) from a producer thread for DURATION seconds and return the stream statistics. """
+    frameStream = FrameStream(viewer)
+
+    def source():
+        index = 0
+        while True:
+            yield frames[index % len(frames)]
+            index += 1
+            # Cede el GIL al hilo de la GUI, como haría una cámara esperando al siguiente frame
+            time.sleep(0.001)
+
+    frameStream.start(source())
+    deadline = time.perf_counter() + DURATION
+    while time.perf_counter() < deadline:
+        app.processEvents()
+    frameStream.stop()
+    app.processEvents()
+    return frameStream.statistics()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def frameMs(viewer: QtImageViewer, frames) -> float:
+    """ Milliseconds to show and paint one frame, synchronously. """
+    start = time.perf_counter()
+    for index in range(SYNC_FRAMES):
+        viewer.setImage(frames[index % len(frames)])
+        viewer.viewport().repaint()
+    return (time.perf_counter() - start) / SYNC_FRAMES * 1000
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    app = QApplication.instance() or QApplication(sys.argv)
+    viewer = QtImageViewer()
+    viewer.resize(*VIEW_SIZE)
+    viewer.show()
+
+    rng = np.random.default_rng(0)
+    for name, shape in FRAME_SHAPES:
+        # Un anillo de 3 frames: el productor no escribe en los que se están mostrando (ver FrameStream)
+        frames = [rng.integers(0, 256, size=shape, dtype=np.uint8) for _ in range(3)]
+        viewer.setImage(frames[0])
+        app.processEvents()
+        scale = viewer.transform().m11()
+        assert scale < 1.0, f"{name}: view at {scale:.2f}, not below 1:1"
+
+        item = viewer._pixmapHandle
+        fitCache = item._fitCache
+        ms = frameMs(viewer, frames)
+        assert fitCache is not None and item._fitCache is fitCache, f"{name}: fit cache rebuilt for every frame"
+
+        stats = stream(app, viewer, frames)
+        print(f"{name} {shape[1]}x{shape[0]} at {scale:.2f}: {stats['fps']:6.1f} fps shown, "
+              f"{stats['dropped']:4d} dropped, {ms:6.2f} ms/frame")
+        assert stats["fps"] >= TARGET_FPS, f"{name}: {stats['fps']:.1f} fps, below {TARGET_FPS:.0f}"
+
+
+if __name__ == "__main__":
+    main()
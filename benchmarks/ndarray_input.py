@@ -0,0 +1,78 @@
+"""
+ndarray_input.py: cost of QtImageViewer.setImage for NumPy frames.
+Compares the zero-copy ndarray path with the usual conversion through a QImage copy
+(what qimage2ndarray or PIL conversions end up doing) and reports the memory allocated by each.
+Run from the repository root:
+    python -m benchmarks.ndarray_input
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PySide6.QtGui import QImage
+from PySide6.QtWidgets import QApplication
+
+from qtImageViewer import QtImageViewer
+
+# A4 page at 600 dpi
+PAGE_SIZE = (7016, 4960)
+FRAMES = 10
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def residentBytes() -> int:
+    """ Current resident set size of the process (Linux), 0 where /proc is not available. """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def copyToQImage(array: np.ndarray) -> QImage:
+    """ Conversion with a copy of the pixel data, as done by the usual ndarray -> QImage helpers. """
+    height, width = array.shape[:2]
+    fmt = QImage.Format_Grayscale8 if array.ndim == 2 else QImage.Format_RGB888
+    return QImage(array.tobytes(), width, height, array.strides[0], fmt).copy()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def run(viewer: QtImageViewer, frames, convert) -> tuple:
+    """ Show every frame and return (ms per frame, bytes allocated while the last frame is shown). """
+    viewer.clearImage()
+    before = residentBytes()
+    start = time.perf_counter()
+    for frame in frames:
+        viewer.setImage(convert(frame) if convert is not None else frame)
+    elapsed = (time.perf_counter() - start) / len(frames)
+    return elapsed * 1000, residentBytes() - before
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    app = QApplication.instance() or QApplication(sys.argv)
+    viewer = QtImageViewer()
+    viewer.resize(1280, 1024)
+
+    rng = np.random.default_rng(0)
+    for name, shape in (("gray uint8", PAGE_SIZE), ("RGB uint8", PAGE_SIZE + (3,))):
+        frames = [rng.integers(0, 256, size=shape, dtype=np.uint8) for _ in range(2)] * (FRAMES // 2)
+        frameBytes = frames[0].nbytes
+
+        zeroCopyMs, zeroCopyBytes = run(viewer, frames, None)
+        shared = np.shares_memory(viewer.imageArray(), frames[-1])
+        copyMs, copyBytes = run(viewer, frames, copyToQImage)
+        app.processEvents()
+
+        print(f"{name} {shape[1]}x{shape[0]} ({frameBytes / 2 ** 20:.1f} MB per frame)")
+        print(f"    ndarray (zero copy)  {zeroCopyMs:8.2f} ms/frame  {zeroCopyBytes / 2 ** 20:8.1f} MB allocated"
+              f"  shares memory: {shared}")
+        print(f"    QImage copy          {copyMs:8.2f} ms/frame  {copyBytes / 2 ** 20:8.1f} MB allocated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+registration.py: time and accuracy of template-to-scan registration (Registration.register) on an A4 page.
+The scans are the sample page shifted, rotated and scaled by known amounts; the error is the largest distance
+between the true and estimated positions of the page corners and centre, in pixels. The time should stay
+well under 100 ms per page. Run from the repository root:
+    python -m benchmarks.registration [image]
+"""
+import sys
+import time
+
+import numpy as np
+from PySide6.QtCore import QRectF
+from PySide6.QtGui import QImage
+
+from image_buffer import ImageBuffer, qimageFromArray
+from registration import Alignment, Registration
+
+DEFAULT_IMAGE = "sample_images/test_flexibar.tif"
+REPEAT = 5
+CASES = (Alignment(40, -25), Alignment(40, -25, 1.5), Alignment(-30, 60, -2.5, 1.03),
+         Alignment(12.5, 7.25, 0.4, 0.98), Alignment(-80, -45, 4.0, 1.0))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def transformed(gray: np.ndarray, alignment: Alignment) -> ImageBuffer:
+    """ The page as scanned with alignment: every scan pixel is the nearest reference pixel, white outside. """
+    height, width = gray.shape
+    inverse = alignment.inverted()
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+    (m11, m12), (m21, m22) = inverse.matrix()
+    x = np.rint(m11 * xs + m12 * ys + inverse.dx).astype(np.intp)
+    y = np.rint(m21 * xs + m22 * ys + inverse.dy).astype(np.intp)
+    inside = (x >= 0) & (y >= 0) & (x < width) & (y < height)
+    scan = np.where(inside, gray[np.clip(y, 0, height - 1), np.clip(x, 0, width - 1)], 255).astype(np.uint8)
+    return ImageBuffer(qimageFromArray(scan), owner=scan)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    reference = QImage(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_IMAGE)
+    if reference.isNull():
+        sys.exit("Cannot read the reference image")
+    width, height = reference.width(), reference.height()
+    grayBuffer = ImageBuffer(reference.convertToFormat(QImage.Format_Grayscale8))
+    gray = grayBuffer.region(QRectF(0, 0, width, height))
+    points = np.array([[0, 0], [width, 0], [0, height], [width, height], [width / 2, height / 2]])
+
+    start = time.perf_counter()
+    registration = Registration(reference)
+    print(f"{width}x{height} reference prepared in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"(factor {registration.factor()})")
+
+    for truth in CASES:
+        scan = transformed(gray, truth)
+        times = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            estimate = registration.register(scan)
+            times.append(time.perf_counter() - start)
+        error = np.hypot(*(estimate.mapPoints(points) - truth.mapPoints(points)).T).max()
+        print(f"shift ({truth.dx:6.1f}, {truth.dy:6.1f}) angle {truth.angle:5.2f} scale {truth.scale:.3f}: "
+              f"{min(times) * 1000:5.1f} ms, error {error:5.2f} px, response {estimate.response:.2f}")
+
+
+if __name__ == "__main__":
+    main()
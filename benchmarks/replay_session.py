@@ -0,0 +1,93 @@
+"""
+replay_session.py: input-to-paint latency of a recorded user session, replayed headless on the main window.
+Sessions are recorded with main.py --record-session FILE (see session_replay.SessionRecorder). The session
+is replayed RUNS times on a fresh MainWindow under the offscreen platform (see SessionReplayer) and the
+p50/p90/p95/p99/max latencies per event type are printed and, with --output, written as JSON. With --compare,
+the latencies are printed next to those of an earlier --output file, to compare a change against a baseline.
+Run from the repository root:
+    python -m benchmarks.replay_session session.json [--fast] [--runs n] [--output file] [--compare file]
+"""
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication
+
+from main_window import MainWindow
+from session_replay import SessionReplayer, latencySummary
+
+RUNS = 1
+PERCENTILES = ("p50", "p90", "p95", "p99", "max")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def replay(app: QApplication, session: dict, realTime: bool) -> List[dict]:
+    window = MainWindow()
+    results = SessionReplayer(window, session).replay(realTime)
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+    return results
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _format(value: Optional[float]) -> str:
+    return f"{value:8.2f}" if value is not None else "       -"
+
+
+def printSummary(summary: dict, baseline: Optional[dict] = None) -> None:
+    print(f"{'event':12s} {'count':>6s} {'painted':>7s} " + " ".join(f"{label:>8s}" for label in PERCENTILES)
+          + "   (ms" + (", baseline below)" if baseline else ")"))
+    for name, stats in summary.items():
+        print(f"{name:12s} {stats['count']:6d} {stats['painted']:7d} "
+              + " ".join(_format(stats[label]) for label in PERCENTILES))
+        if baseline and name in baseline:
+            base = baseline[name]
+            print(f"{'':12s} {base['count']:6d} {base['painted']:7d} "
+                  + " ".join(_format(base[label]) for label in PERCENTILES))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Replay a recorded session and report input-to-paint latencies.")
+    ap.add_argument("session", help="Session file recorded with main.py --record-session")
+    ap.add_argument("--fast", action="store_true", help="Do not keep the recorded pauses between events")
+    ap.add_argument("--runs", type=int, default=RUNS, help=f"Replays, latencies pooled (default: {RUNS})")
+    ap.add_argument("-o", "--output", default=None, help="JSON file for the latencies")
+    ap.add_argument("--compare", default=None, help="JSON latencies of an earlier --output to compare with")
+    args = ap.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    try:
+        session = SessionReplayer.load(args.session)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 2
+
+    results = []
+    for _ in range(max(1, args.runs)):
+        results.extend(replay(app, session, not args.fast))
+    missing = sum(1 for result in results if not result["found"])
+    if missing:
+        print(f"[WARNING] {missing} events for widgets not found: the window has changed since the recording",
+              file=sys.stderr)
+
+    summary = latencySummary(results)
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)["summary"]
+    printSummary(summary, baseline)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"session": args.session, "realTime": not args.fast, "runs": args.runs, "summary": summary,
+                       "events": results}, file, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
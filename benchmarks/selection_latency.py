@@ -0,0 +1,84 @@
+"""
+selection_latency.py: click latency of field selection in QtImageViewer as the number of fields grows.
+Every sample clicks one field in design mode, which selects it and starts editing it, and repaints the view.
+Only the area of the fields whose state changed is repainted, so the repaint should stay about flat with
+the number of fields, and so should the selection handling: the run fails if the median selection time with
+100000 fields is more than MAX_GROWTH times the one with 1000 fields. Run from the repository root:
+    python -m benchmarks.selection_latency
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PySide6.QtGui import QImage, Qt
+from PySide6.QtTest import QTest
+from PySide6.QtWidgets import QApplication
+
+from qtImageViewer import QtImageViewer
+
+FIELD_COUNTS = (10, 1000, 10000, 100000)
+CLICKS = 50
+# Per-click selection cost allowed at 100000 fields relative to 1000 fields
+MAX_GROWTH = 3.0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def addFieldGrid(viewer: QtImageViewer, count: int) -> np.ndarray:
+    """ Add count fields in a grid covering the image. Returns their ids. """
+    columns = max(1, int(count ** 0.5))
+    rows = (count + columns - 1) // columns
+    width = viewer.sceneRect().width() / columns
+    height = viewer.sceneRect().height() / rows
+    index = np.arange(count)
+    rects = np.stack([(index % columns) * width + 2, (index // columns) * height + 2,
+                      np.full(count, width - 4), np.full(count, height - 4)], axis=1)
+    return viewer.addFields(rects)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def measure(app: QApplication, count: int) -> tuple:
+    """ Milliseconds per click spent on the selection handling and on the repaint. """
+    viewer = QtImageViewer()
+    viewer.resize(1280, 1024)
+    viewer.show()
+    image = QImage(2480, 3508, QImage.Format_Grayscale8)
+    image.fill(Qt.white)
+    viewer.setImage(image)
+    viewer.setDesignMode()
+    fields = addFieldGrid(viewer, count)
+    app.processEvents()
+
+    selection, paint = [], []
+    for click in range(CLICKS):
+        rect = viewer.fieldStore().rect(int(fields[(click * 7919) % count]))
+        point = viewer.mapFromScene(rect.center())
+        start = time.perf_counter()
+        QTest.mouseClick(viewer.viewport(), Qt.LeftButton, Qt.NoModifier, point)
+        selected = time.perf_counter()
+        app.processEvents()
+        selection.append((selected - start) * 1000)
+        paint.append((time.perf_counter() - selected) * 1000)
+
+    viewer.close()
+    return selection, paint
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    app = QApplication.instance() or QApplication(sys.argv)
+    medians = {}
+    for count in FIELD_COUNTS:
+        selection, paint = measure(app, count)
+        medians[count] = statistics.median(selection)
+        print(f"{count:6d} fields: selection median {medians[count]:7.3f} ms"
+              f" max {max(selection):7.3f} ms, repaint median {statistics.median(paint):7.2f} ms")
+    growth = medians[100000] / medians[1000]
+    assert growth <= MAX_GROWTH, f"selection {growth:.1f}x slower with 100000 fields than with 1000"
+
+
+if __name__ == "__main__":
+    main()
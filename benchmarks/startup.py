@@ -0,0 +1,50 @@
+"""
+startup.py: time to first paint and to interactive of the application.
+main.py is run RUNS times in a fresh interpreter under the offscreen platform, with --startup-timing
+--quit-after-startup, and the median times reported by StartupTimer are printed. The times start with main.py,
+before its imports, so the interpreter start itself is not included. Run from the repository root:
+    python -m benchmarks.startup [--runs n]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+RUNS = 7
+_REPORT = re.compile(r"startup: first paint (\d+) ms, interactive (\d+) ms")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def startup() -> Tuple[float, float]:
+    """ (first paint, interactive) in ms of one run of main.py. """
+    environment = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    process = subprocess.run([sys.executable, "main.py", "--startup-timing", "--quit-after-startup"],
+                             capture_output=True, text=True, env=environment, timeout=60)
+    match = _REPORT.search(process.stderr)
+    if match is None:
+        raise RuntimeError("No startup report from main.py:\n" + process.stderr)
+    return float(match.group(1)), float(match.group(2))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Time to first paint and to interactive of main.py.")
+    ap.add_argument("--runs", type=int, default=RUNS, help=f"Runs (default: {RUNS})")
+    args = ap.parse_args(argv)
+
+    try:
+        times = [startup() for _ in range(max(1, args.runs))]
+    except (RuntimeError, subprocess.TimeoutExpired) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 2
+    firstPaint = statistics.median(paint for paint, _ in times)
+    interactive = statistics.median(ready for _, ready in times)
+    print(f"first paint {firstPaint:6.0f} ms, interactive {interactive:6.0f} ms (median of {len(times)})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
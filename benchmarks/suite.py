@@ -0,0 +1,324 @@
+"""
+suite.py: headless benchmark suite of the viewer and designer hot paths, with stored results and regression check.
+Cases: decoding of the sample images, setImage and updateViewer (fitInView) of the samples and of synthetic
+600 dpi pages, pan and zoom repaints, rectangle creation through the design-mode mouse handlers, and
+selectionChanged and deleteSelectedItems with 10, 1000 and 10000 fields.
+Every case is run REPEAT times and its median, min and max (ms) are written to a JSON file. If a baseline
+file exists, every case is compared with it by its min, the least noisy of them: more than TOLERANCE slower
+(THRESHOLDS per case) and more than SLACK_MS slower is a regression, and the exit status is 1. Timings are machine dependent: keep the baseline
+of the machine that runs the suite (--update-baseline) and compare on that same machine. Run from the
+repository root:
+    python -m benchmarks.suite [--filter name] [--repeat n] [--baseline file] [--update-baseline]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+import PySide6
+from PySide6.QtCore import QEvent, QPointF
+from PySide6.QtGui import QImage, QMouseEvent, Qt
+from PySide6.QtWidgets import QApplication, QMessageBox
+
+import util
+from benchmarks.selection_latency import addFieldGrid
+from image_buffer import qimageFromArray
+from qtImageViewer import QtImageViewer
+
+SAMPLE_IMAGES = ("sample_images/mandala.jpg", "sample_images/resultado_BN_DINA4.tif",
+                 "sample_images/test_flexibar.tif")
+# A4 at 600 dpi
+SYNTHETIC_SIZE = (4960, 7016)
+FIELD_COUNTS = (10, 1000, 10000)
+REPEAT = 10
+RESULTS_FOLDER = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_OUTPUT = os.path.join(RESULTS_FOLDER, "latest.json")
+DEFAULT_BASELINE = os.path.join(RESULTS_FOLDER, "baseline.json")
+# Slowdown accepted before a case is flagged: relative to the baseline min, per case prefix, and absolute
+TOLERANCE = 0.25
+THRESHOLDS = {"decode": 0.5, "set_image": 0.5}
+SLACK_MS = 0.2
+
+# Cases in run order: (name, setup). setup(app) returns (prepare, run): prepare (untimed, may be None) is
+# called before every run, run is timed
+CASES = []
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def case(name: str):
+    def register(setup: Callable) -> Callable:
+        CASES.append((name, setup))
+        return setup
+    return register
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def newViewer(image: Optional[QImage] = None) -> QtImageViewer:
+    """ Viewer as the main window sets it up (tiled rendering), shown at 1280x1024 with the image. """
+    viewer = QtImageViewer()
+    viewer.tiledRendering = True
+    viewer.resize(1280, 1024)
+    viewer.show()
+    if image is not None:
+        viewer.setImage(image)
+    QApplication.processEvents()
+    return viewer
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def syntheticPage(imageFormat: QImage.Format) -> QImage:
+    """ 600 dpi A4 page with a grid of ruled boxes, like a dense form. """
+    width, height = SYNTHETIC_SIZE
+    array = np.full((height, width), 255, dtype=np.uint8)
+    array[::120, :] = 0
+    array[:, ::160] = 0
+    # Copia: la imagen no debe depender del array
+    image = qimageFromArray(array).copy()
+    return image.convertToFormat(imageFormat) if imageFormat != image.format() else image
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _sampleName(fileName: str) -> str:
+    return os.path.splitext(os.path.basename(fileName))[0]
+
+
+def _registerImageCases() -> None:
+    for fileName in SAMPLE_IMAGES:
+        name = _sampleName(fileName)
+        case(f"decode/{name}")(lambda app, f=fileName: (None, lambda: util.decodeImage(f)))
+        case(f"set_image/{name}")(lambda app, f=fileName: _setImageCase(util.decodeImage(f)[0]))
+    for label, imageFormat in (("gray", QImage.Format_Grayscale8), ("mono", QImage.Format_Mono)):
+        case(f"set_image/600dpi_{label}")(lambda app, f=imageFormat: _setImageCase(syntheticPage(f)))
+        case(f"update_viewer/600dpi_{label}")(lambda app, f=imageFormat: _updateViewerCase(syntheticPage(f)))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _setImageCase(image: QImage) -> Tuple[Callable, Callable]:
+    """ setImage of a new image (a fresh copy every run, so nothing is reused) and its first paint. """
+    viewer = newViewer()
+    copies = []
+
+    def prepare():
+        viewer.clearImage()
+        copies[:] = [image.copy()]
+
+    def run():
+        viewer.setImage(copies[0])
+        viewer.viewport().repaint()
+    return prepare, run
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _updateViewerCase(image: QImage) -> Tuple[Optional[Callable], Callable]:
+    viewer = newViewer(image)
+
+    def run():
+        viewer.updateViewer()
+        viewer.viewport().repaint()
+    return None, run
+
+
+_registerImageCases()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+@case("pan_repaint/600dpi_mono")
+def panRepaint(app: QApplication) -> Tuple[Optional[Callable], Callable]:
+    """ Scroll 64 pixels at 1:1 zoom and repaint. """
+    viewer = newViewer(syntheticPage(QImage.Format_Mono))
+    viewer.zoomStack.append(viewer.sceneRect().adjusted(1000, 1000, -2680, -4990))
+    viewer.updateViewer()
+    bar = viewer.horizontalScrollBar()
+    steps = [64]
+
+    def run():
+        if not bar.minimum() <= bar.value() + steps[0] <= bar.maximum():
+            steps[0] = -steps[0]
+        bar.setValue(bar.value() + steps[0])
+        viewer.viewport().repaint()
+    return None, run
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+@case("zoom_repaint/600dpi_mono")
+def zoomRepaint(app: QApplication) -> Tuple[Optional[Callable], Callable]:
+    """ One wheel step in or out around the centre, applied at once (no animation), and repaint. """
+    viewer = newViewer(syntheticPage(QImage.Format_Mono))
+    factors = [QtImageViewer.ZOOM_STEP]
+
+    def run():
+        viewer.scale(factors[0], factors[0])
+        viewer.viewport().repaint()
+        factors[0] = 1 / factors[0]
+    return None, run
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+@case("create_rect/mouse")
+def createRect(app: QApplication) -> Tuple[Optional[Callable], Callable]:
+    """ Press, drag in 10 steps and release on the image in design mode: one new field, repainted. """
+    viewer = newViewer(syntheticPage(QImage.Format_Grayscale8))
+    viewer.setDesignMode()
+    viewport = viewer.viewport()
+    origins = [QPointF(300, 100)]
+
+    def prepare():
+        viewer.removeFields(viewer.fieldStore().ids())
+        # Dentro de la página, que está centrada: de x = 280 a x = 1000 a la escala de ajuste
+        origins[0] = QPointF(300 + (origins[0].x() + 37) % 600, 100 + (origins[0].y() + 53) % 800)
+
+    def send(eventType: QEvent.Type, position: QPointF, button: Qt.MouseButton, buttons: Qt.MouseButtons):
+        app.sendEvent(viewport, QMouseEvent(eventType, position, viewport.mapToGlobal(position), button, buttons,
+                                            Qt.NoModifier))
+
+    def run():
+        # Eventos enviados directamente: QTest convertiría las pulsaciones seguidas en dobles clics
+        origin = origins[0]
+        send(QEvent.MouseButtonPress, origin, Qt.LeftButton, Qt.LeftButton)
+        for step in range(1, 11):
+            send(QEvent.MouseMove, origin + QPointF(8 * step, 4 * step), Qt.NoButton, Qt.LeftButton)
+        send(QEvent.MouseButtonRelease, origin + QPointF(80, 40), Qt.LeftButton, Qt.NoButton)
+        viewport.repaint()
+    return prepare, run
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _registerFieldCases() -> None:
+    for count in FIELD_COUNTS:
+        case(f"selection_changed/{count}")(lambda app, n=count: _selectionChangedCase(n))
+        case(f"delete_selected/{count}")(lambda app, n=count: _deleteSelectedCase(n))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _selectionChangedCase(count: int) -> Tuple[Callable, Callable]:
+    """ selectionChanged after one more field was selected, and the repaint. """
+    viewer = newViewer(syntheticPage(QImage.Format_Grayscale8))
+    viewer.setDesignMode()
+    fields = addFieldGrid(viewer, count).tolist()
+    turn = [0]
+
+    def prepare():
+        turn[0] += 1
+        with viewer.batchEdit():
+            viewer.fieldStore().setState([fields[(turn[0] * 7919) % count]], viewer.fieldStore().SELECTED, True)
+
+    def run():
+        viewer.selectionChanged()
+        viewer.viewport().repaint()
+    return prepare, run
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _deleteSelectedCase(count: int) -> Tuple[Callable, Callable]:
+    """ deleteSelectedItems of all of count selected fields (confirmation answered yes), and the repaint. """
+    viewer = newViewer(syntheticPage(QImage.Format_Grayscale8))
+    viewer.setDesignMode()
+
+    def prepare():
+        viewer.selectFields(addFieldGrid(viewer, count))
+
+    def run():
+        question = QMessageBox.question
+        QMessageBox.question = lambda *args, **kwargs: QMessageBox.Yes
+        try:
+            viewer.deleteSelectedItems()
+        finally:
+            QMessageBox.question = question
+        viewer.viewport().repaint()
+    return prepare, run
+
+
+_registerFieldCases()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def runCases(app: QApplication, names: List[str], repeat: int) -> dict:
+    results = {}
+    for name, setup in CASES:
+        if name not in names:
+            continue
+        prepare, run = setup(app)
+        times = []
+        for _ in range(repeat):
+            if prepare is not None:
+                prepare()
+            start = time.perf_counter()
+            run()
+            times.append((time.perf_counter() - start) * 1000)
+        for widget in QApplication.topLevelWidgets():
+            widget.close()
+            widget.deleteLater()
+        app.processEvents()
+        results[name] = {"median": statistics.median(times), "min": min(times), "max": max(times)}
+        print(f"{name:32s} median {results[name]['median']:9.3f} ms  min {results[name]['min']:9.3f} ms")
+    return results
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def threshold(name: str) -> float:
+    return THRESHOLDS.get(name.split("/")[0], TOLERANCE)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def compare(results: dict, baseline: dict) -> List[str]:
+    """ Names of the cases whose min regressed against the baseline (printed with the change). """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        change = result["min"] / base["min"] - 1.0 if base["min"] else 0.0
+        regressed = change > threshold(name) and result["min"] - base["min"] > SLACK_MS
+        if regressed:
+            regressions.append(name)
+        print(f"{name:32s} {base['min']:9.3f} -> {result['min']:9.3f} ms {change:+7.1%}"
+              + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark suite of the viewer and designer hot paths.")
+    ap.add_argument("--filter", default="", help="Only the cases whose name contains this text")
+    ap.add_argument("--repeat", type=int, default=REPEAT, help=f"Runs of every case (default: {REPEAT})")
+    ap.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help="JSON file for the results")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON results to compare with")
+    ap.add_argument("--update-baseline", action="store_true", help="Store these results as the baseline")
+    args = ap.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    names = [name for name, _ in CASES if args.filter in name]
+    results = runCases(app, names, max(1, args.repeat))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"created": datetime.datetime.now().isoformat(timespec="seconds"), "platform": platform.platform(),
+                   "python": platform.python_version(), "pyside": PySide6.__version__, "repeat": args.repeat,
+                   "results": results}, file, indent=1)
+
+    status = 0
+    if os.path.isfile(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        print(f"\nAgainst {args.baseline}:")
+        regressions = compare(results, baseline)
+        if regressions:
+            print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+            status = 1
+    if args.update_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+template_io.py: save and load time, file size and peak Python memory of form templates in both formats.
+Peak memory is measured with tracemalloc (NumPy allocations included); for loading it covers the field store
+itself.
+Run from the repository root:
+    python -m benchmarks.template_io
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import template_io
+from field_store import FieldStore
+
+FIELD_COUNTS = (1000, 100000)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def makeStore(count: int) -> FieldStore:
+    """ A store with count random fields, one in ten of them named. """
+    rng = np.random.default_rng(0)
+    store = FieldStore()
+    rects = np.column_stack([rng.uniform(0, 2400, count), rng.uniform(0, 3400, count),
+                             rng.uniform(10, 80, count), rng.uniform(10, 40, count)])
+    ids = store.addMany(rects)
+    for fieldId in ids[::10].tolist():
+        store.setName(int(fieldId), f"field_{fieldId}")
+    return store
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def measure(operation) -> tuple:
+    """ Seconds taken by operation, and peak MB allocated while running it again under tracemalloc
+    (which slows it down too much to time both at once).
+    """
+    start = time.perf_counter()
+    operation()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        for count in FIELD_COUNTS:
+            store = makeStore(count)
+            for extension in template_io.TEMPLATE_EXTENSIONS:
+                fileName = os.path.join(folder, f"template_{count}{extension}")
+                saveTime, savePeak = measure(lambda: template_io.saveTemplate(fileName, store))
+                loaded = FieldStore()
+                loadTime, loadPeak = measure(lambda: template_io.loadTemplate(fileName, loaded))
+                assert np.array_equal(loaded.rects(), store.rects()) and loaded.names() == store.names()
+                print(f"{count:7d} fields {extension:6s} {os.path.getsize(fileName) / 2 ** 20:7.2f} MB file, "
+                      f"save {saveTime * 1000:7.1f} ms (peak {savePeak:6.1f} MB), "
+                      f"load {loadTime * 1000:7.1f} ms (peak {loadPeak:6.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+thumbnails.py: thumbnail cache timings and checks. The thumbnails of the sample images are made with an
+empty disk cache (cold), read back from it by a new ThumbnailCache (warm) and returned from memory. Then
+the cache is checked: the thumbnails are still delivered with an unwritable cache directory, a file
+rewritten during the session gets a new thumbnail, a file that could not be read is retried once
+it changes, and pruning keeps the disk cache under its size limit, removing the least recently used
+thumbnails first. Run from the repository root:
+    python -m benchmarks.thumbnails
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtGui import QImage, Qt
+from PySide6.QtWidgets import QApplication
+
+from thumbnail_cache import ThumbnailCache
+
+SAMPLE_FOLDER = "sample_images"
+TIMEOUT = 30.0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def thumbnails(app: QApplication, cache: ThumbnailCache, files: List[str]) -> Dict[str, QImage]:
+    """ Request files and wait for all their thumbnails (or the timeout). Files that fail are missing. """
+    ready = {}
+    # noinspection PyUnresolvedReferences
+    cache.thumbnailReady.connect(lambda fileName, thumbnail: ready.__setitem__(fileName, thumbnail))
+    for fileName in files:
+        thumbnail = cache.request(fileName)
+        if thumbnail is not None:
+            ready[fileName] = thumbnail
+    # Los fallos no se anuncian: se espera a que no quede nada pendiente
+    deadline = time.perf_counter() + TIMEOUT
+    while any(fileName in cache._pending for fileName in files) and time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+    return ready
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def timed(app: QApplication, cache: ThumbnailCache, files: List[str]) -> float:
+    start = time.perf_counter()
+    ready = thumbnails(app, cache, files)
+    assert len(ready) == len(files), f"{len(files) - len(ready)} thumbnails missing"
+    return (time.perf_counter() - start) * 1000
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def checks(app: QApplication, folder: str, files: List[str]) -> None:
+    # Directorio de caché no escribible: su padre es un archivo
+    blocker = os.path.join(folder, "blocker")
+    open(blocker, "w").close()
+    cache = ThumbnailCache(directory=os.path.join(blocker, "thumbnails"))
+    ready = thumbnails(app, cache, files[:1])
+    assert files[0] in ready and not cache._pending, "no thumbnail with an unwritable cache directory"
+    print("unwritable cache directory: thumbnail delivered")
+
+    # Archivo reescrito durante la sesión
+    cache = ThumbnailCache(directory=os.path.join(folder, "cache"))
+    fileName = os.path.join(folder, "rewritten.png")
+    image = QImage(400, 200, QImage.Format_RGB32)
+    image.fill(Qt.white)
+    image.save(fileName)
+    first = thumbnails(app, cache, [fileName])[fileName]
+    image = QImage(200, 400, QImage.Format_RGB32)
+    image.fill(Qt.black)
+    image.save(fileName)
+    os.utime(fileName, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    second = thumbnails(app, cache, [fileName]).get(fileName)
+    assert second is not None and second.size() != first.size(), "stale thumbnail of a rewritten file"
+    print("rewritten file: new thumbnail")
+
+    # Archivo ilegible (a medio escribir) que luego se completa
+    fileName = os.path.join(folder, "partial.png")
+    with open(fileName, "wb") as file:
+        file.write(b"\x89PNG\r\n")
+    assert fileName not in thumbnails(app, cache, [fileName])
+    image.save(fileName)
+    os.utime(fileName, ns=(time.time_ns(), time.time_ns() + 2 * 10 ** 9))
+    assert fileName in thumbnails(app, cache, [fileName]), "failed file not retried after it changed"
+    print("failed file: retried after it changed")
+
+    # Poda de la caché en disco: se borran primero las miniaturas usadas hace más tiempo
+    directory = os.path.join(folder, "pruned")
+    cache = ThumbnailCache(directory=directory)
+    thumbnails(app, cache, files)
+    paths = [cache.cachePath(fileName) for fileName in files]
+    for age, path in enumerate(reversed(paths)):
+        os.utime(path, ns=(time.time_ns(), time.time_ns() - age * 10 ** 9))
+    sizes = [os.path.getsize(path) for path in paths]
+    limit = sum(sizes) // 2
+    cache = ThumbnailCache(directory=directory, maxDiskBytes=limit)
+    cache._threadPool.waitForDone()
+    kept = [os.path.isfile(path) for path in paths]
+    assert sum(size for size, exists in zip(sizes, kept) if exists) <= limit, "disk cache over its limit"
+    assert kept[-1] and not kept[0], "pruning did not remove the least recently used thumbnails first"
+    print(f"disk cache pruned: {kept.count(True)} of {len(paths)} thumbnails kept under {limit} bytes")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    app = QApplication.instance() or QApplication(sys.argv)
+    files = sorted(os.path.join(SAMPLE_FOLDER, name) for name in os.listdir(SAMPLE_FOLDER)
+                   if not name.startswith("."))
+    folder = tempfile.mkdtemp(prefix="thumbnails_")
+    try:
+        directory = os.path.join(folder, "timings")
+        cache = ThumbnailCache(directory=directory)
+        cold = timed(app, cache, files)
+        memory = timed(app, cache, files)
+        warm = timed(app, ThumbnailCache(directory=directory), files)
+        print(f"{len(files)} files: cold {cold:7.1f} ms, warm (disk) {warm:7.1f} ms, memory {memory:7.2f} ms")
+        checks(app, folder, files)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
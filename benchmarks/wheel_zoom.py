@@ -0,0 +1,106 @@
+"""
+wheel_zoom.py: frame rate of the animated wheel zoom on a full-page scan.
+An A4 page at 300 dpi (the sample image, or a synthetic one) with FIELDS fields is zoomed in and out around
+the cursor by bursts of wheel notches, with draft rendering while zooming (as the viewer does) and with full
+quality all along. Reported: animation frames per second and the cost of the frames (zoom step plus
+repaint), median and worst. The draft frames should stay under the 16 ms of a 60 Hz display.
+Run from the repository root:
+    python -m benchmarks.wheel_zoom [image]
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QEvent, QObject, QPoint, QPointF
+from PySide6.QtGui import QImage, QWheelEvent, Qt
+from PySide6.QtWidgets import QApplication
+
+from benchmarks.selection_latency import addFieldGrid
+from qtImageViewer import QtImageViewer
+
+DEFAULT_IMAGE = "sample_images/test_flexibar.tif"
+FIELDS = 2000
+# Notches of each burst (positive zooms in) and time given to each animation, seconds
+BURSTS = (3, 3, -2, 4, -8)
+SETTLE = 0.6
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class PaintCounter(QObject):
+    """ Event filter that counts the paint events of a widget. """
+
+    def __init__(self):
+        super().__init__()
+        self.paints = 0
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Paint:
+            self.paints += 1
+        return False
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def loadPage(fileName: str) -> QImage:
+    image = QImage(fileName)
+    if image.isNull():
+        image = QImage(2480, 3508, QImage.Format_Grayscale8)
+        image.fill(Qt.white)
+    return image
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def measure(app: QApplication, image: QImage, draft: bool) -> dict:
+    viewer = QtImageViewer()
+    viewer.tiledRendering = True
+    viewer.resize(1280, 1024)
+    viewer.show()
+    viewer.setImage(image)
+    addFieldGrid(viewer, FIELDS)
+    if not draft:
+        viewer._setDraft = lambda draft: None
+    app.processEvents()
+
+    counter = PaintCounter()
+    viewer.viewport().installEventFilter(counter)
+    position = QPointF(400, 300)
+    frames, intervals, animating = [], 0, 0.0
+    for notches in BURSTS:
+        event = QWheelEvent(position, viewer.viewport().mapToGlobal(position), QPoint(), QPoint(0, 120 * notches),
+                            Qt.NoButton, Qt.NoModifier, Qt.NoScrollPhase, False)
+        app.sendEvent(viewer.viewport(), event)
+        shown = []
+        end = time.perf_counter() + SETTLE
+        while time.perf_counter() < end:
+            paints = counter.paints
+            start = time.perf_counter()
+            app.processEvents()
+            now = time.perf_counter()
+            # Solo los fotogramas de la animación, no el repintado suave final
+            if counter.paints != paints and viewer._zoomTimer.isActive():
+                frames.append((now - start) * 1000)
+                shown.append(now)
+        if len(shown) > 1:
+            intervals += len(shown) - 1
+            animating += shown[-1] - shown[0]
+    viewer.viewport().removeEventFilter(counter)
+    viewer.close()
+    return {"frames": len(frames), "fps": intervals / animating if animating else 0.0,
+            "median": statistics.median(frames), "worst": max(frames)}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main() -> None:
+    app = QApplication.instance() or QApplication(sys.argv)
+    image = loadPage(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_IMAGE)
+    print(f"{image.width()}x{image.height()} {image.format().name}, {FIELDS} fields")
+    for label, draft in (("draft", True), ("full quality", False)):
+        stats = measure(app, image, draft)
+        print(f"{label:12s}: {stats['frames']:4d} frames, {stats['fps']:5.1f} fps, "
+              f"frame median {stats['median']:6.2f} ms, worst {stats['worst']:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
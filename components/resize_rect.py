@@ -1,6 +1,6 @@
 import typing
 
-from PySide6.QtCore import QRectF, QSize, Qt
+from PySide6.QtCore import QRectF, QSize, Qt, QTimer
 from PySide6.QtGui import QPen, QBrush, QColor, QResizeEvent
 from PySide6.QtWidgets import (QApplication, QGraphicsView, QGraphicsScene,
                                QGraphicsItem, QGraphicsRectItem, QMainWindow,
@@ -8,12 +8,48 @@ from PySide6.QtWidgets import (QApplication, QGraphicsView, QGraphicsScene,
 
 
 class ResizableRect(QGraphicsRectItem):
+    """
+    Rectangle that is moved by dragging its inside and resized by dragging its edges and corners.
+    While dragging, the geometry changes at most once per FRAME_INTERVAL_MS (one display frame at 60 Hz):
+    mouse events that arrive within a frame only replace the pending rectangle (see setRectCoalesced()), so
+    a high-rate mouse does not repaint the old and new bounding rects several times per frame.
+    """
+
+    FRAME_INTERVAL_MS = 16
+
     def __init__(self, *args):
         super().__init__(*args)
         self.setFlag(QGraphicsItem.ItemIsMovable, True)
         self.setPen(QPen(QBrush(QColor('blue')), 5))
         self.selected_edge = None
         self.click_pos = self.click_rect = None
+        self._pendingRect = None
+        self._frameTimer = QTimer()
+        self._frameTimer.setSingleShot(True)
+        self._frameTimer.setInterval(self.FRAME_INTERVAL_MS)
+        # noinspection PyUnresolvedReferences
+        self._frameTimer.timeout.connect(self._frameElapsed)
+
+    def setRectCoalesced(self, rect: QRectF) -> None:
+        """ setRect() at most once per frame. The first change is applied at once; later ones within the same
+        frame are merged, and the last of them is applied when the frame ends.
+        """
+        self._pendingRect = QRectF(rect)
+        if not self._frameTimer.isActive():
+            self.flushRect()
+            self._frameTimer.start()
+
+    def flushRect(self) -> None:
+        """ Apply the pending rectangle of setRectCoalesced() now, if any. """
+        if self._pendingRect is not None:
+            rect, self._pendingRect = self._pendingRect, None
+            if rect != self.rect():
+                self.setRect(rect)
+
+    def _frameElapsed(self) -> None:
+        if self._pendingRect is not None:
+            self.flushRect()
+            self._frameTimer.start()
 
     def mousePressEvent(self, event):
         """ The mouse is pressed, start tracking movement. """
@@ -123,10 +159,12 @@ class ResizableRect(QGraphicsRectItem):
                 rect.setBottom(rect.top() + 5)
 
         # Finally, update the rect that is now guaranteed to stay in bounds.
-        self.setRect(rect)
+        self.setRectCoalesced(rect)
 
     def mouseReleaseEvent(self, event):
         """ Stop tracking movement when the mouse is released. """
+        self._frameTimer.stop()
+        self.flushRect()
         QApplication.restoreOverrideCursor()
         super().mouseReleaseEvent(event)
 
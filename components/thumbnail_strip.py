@@ -0,0 +1,180 @@
+import os
+from typing import Iterable, List, Optional
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QSize, Qt, QTimer, Signal
+from PySide6.QtGui import QImage
+from PySide6.QtWidgets import QAbstractItemView, QListView, QWidget
+
+from thumbnail_cache import ThumbnailCache
+
+
+class ThumbnailModel(QAbstractListModel):
+    """
+    List model of image files whose decoration is the file thumbnail.
+    Thumbnails are only requested from the ThumbnailCache when the view asks for a row, that is for the
+    rows that are visible. Until a thumbnail is ready the row shows an empty placeholder.
+    Thumbnails are handed to the view as QImage straight from the cache's bounded memory LRU.
+    The fileKey() of each row is read once, the first time the row is painted, and kept until the row is
+    invalidated (setFiles() or invalidate()), so repaints and scrolling do not stat the files.
+    """
+
+    def __init__(self, thumbnails: ThumbnailCache, parent=None):
+        super().__init__(parent)
+        self._thumbnails = thumbnails
+        self._files = []
+        self._rows = {}
+        # fileKey() de las filas ya pintadas
+        self._keys = {}
+
+        size = thumbnails.size()
+        self._placeholder = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+        self._placeholder.fill(Qt.transparent)
+
+        # noinspection PyUnresolvedReferences
+        thumbnails.thumbnailReady.connect(self._onThumbnailReady)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setFiles(self, files: List[str]) -> None:
+        self.beginResetModel()
+        self._files = list(files)
+        self._rows = {fileName: row for row, fileName in enumerate(self._files)}
+        self._keys = {}
+        self.endResetModel()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def invalidate(self, rows: Optional[Iterable[int]] = None) -> None:
+        """ Read again the fileKey() of rows (all by default) the next time they are painted, so files changed
+        on disk get a new thumbnail.
+        """
+        rows = list(self._keys) if rows is None else [row for row in rows if 0 <= row < len(self._files)]
+        for row in rows:
+            self._keys.pop(row, None)
+            index = self.index(row)
+            # noinspection PyUnresolvedReferences
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    # --------------------------------------------------------------------------------------------------------------
+    def fileName(self, row: int) -> Optional[str]:
+        return self._files[row] if 0 <= row < len(self._files) else None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._files)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        fileName = self._files[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(fileName)
+        if role == Qt.ToolTipRole:
+            return fileName
+        if role == Qt.DecorationRole:
+            row = index.row()
+            if row not in self._keys:
+                self._keys[row] = ThumbnailCache.fileKey(fileName)
+            # Un archivo que no se puede leer se queda con el marcador hasta que se invalide la fila
+            key = self._keys[row]
+            thumbnail = self._thumbnails.request(fileName, key) if key is not None else None
+            return thumbnail if thumbnail is not None else self._placeholder
+        return None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onThumbnailReady(self, fileName: str, thumbnail: QImage) -> None:
+        row = self._rows.get(fileName)
+        if row is None:
+            return
+        index = self.index(row)
+        # noinspection PyUnresolvedReferences
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class ThumbnailStrip(QListView):
+    """
+    Vertical strip of thumbnails for the files of a folder. Stays smooth with folders of many thousands of
+    files: items have a uniform size, so the view only lays out and asks data for the visible rows, and when
+    the view scrolls the thumbnails still queued for rows that went out of view are dropped.
+    """
+
+    # Emitted when the user picks a file: row
+    fileActivated = Signal(int)
+
+    def __init__(self, thumbnails: Optional[ThumbnailCache] = None, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self._thumbnails = thumbnails if thumbnails is not None else ThumbnailCache(parent=self)
+        self._model = ThumbnailModel(self._thumbnails, self)
+        self.setModel(self._model)
+
+        size = self._thumbnails.size()
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.TopToBottom)
+        self.setWrapping(False)
+        self.setMovement(QListView.Static)
+        self.setResizeMode(QListView.Adjust)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setIconSize(QSize(size, size))
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setMinimumWidth(size + 2 * self.frameWidth() + self.verticalScrollBar().sizeHint().width() + 16)
+
+        # Al desplazarse se descartan las peticiones pendientes de filas que ya no se ven
+        self._retainTimer = QTimer(self)
+        self._retainTimer.setSingleShot(True)
+        self._retainTimer.setInterval(100)
+        # noinspection PyUnresolvedReferences
+        self._retainTimer.timeout.connect(self._retainVisible)
+        # noinspection PyUnresolvedReferences
+        self.verticalScrollBar().valueChanged.connect(self._onScrolled)
+
+        # noinspection PyUnresolvedReferences
+        self.clicked.connect(self._onClicked)
+        # noinspection PyUnresolvedReferences
+        self.activated.connect(self._onClicked)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def thumbnailCache(self) -> ThumbnailCache:
+        return self._thumbnails
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setFiles(self, files: List[str]) -> None:
+        self._model.setFiles(files)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def invalidate(self, rows: Optional[Iterable[int]] = None) -> None:
+        """ Check again whether the files of rows (all by default) changed on disk. See ThumbnailModel. """
+        self._model.invalidate(rows)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setCurrentRow(self, row: int) -> None:
+        """ Select the row and scroll to it, without emitting fileActivated. """
+        index = self._model.index(row)
+        if index.isValid() and index != self.currentIndex():
+            self.setCurrentIndex(index)
+            self.scrollTo(index)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _visibleFiles(self) -> List[str]:
+        viewport = self.viewport().rect()
+        first = self.indexAt(viewport.topLeft())
+        last = self.indexAt(viewport.bottomLeft())
+        if not first.isValid():
+            return []
+        lastRow = last.row() if last.isValid() else self._model.rowCount() - 1
+        return [self._model.fileName(row) for row in range(first.row(), lastRow + 1)]
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onScrolled(self, value: int) -> None:
+        self._retainTimer.start()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _retainVisible(self) -> None:
+        visible = self._visibleFiles()
+        if visible:
+            self._thumbnails.retain(visible)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onClicked(self, index: QModelIndex) -> None:
+        # noinspection PyUnresolvedReferences
+        self.fileActivated.emit(index.row())
@@ -0,0 +1,300 @@
+import math
+from typing import Optional, Union
+
+import numpy as np
+from PySide6.QtCore import QRectF, Qt
+from PySide6.QtGui import QImage, QPixmap, QPainter
+from PySide6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+
+from image_cache import ImageCache
+
+
+class TiledImageItem(QGraphicsItem):
+    """
+    Graphics item that draws a QImage as a multi-resolution pyramid of fixed-size tiles.
+    Level 0 is the source image, every next level halves the previous one until it fits in a single tile.
+    Only the tiles that intersect the exposed area are drawn, taken from the level that best matches the
+    current zoom. Levels and tiles are built lazily the first time they are needed. The pixmap tiles are kept
+    in an LRU cache of at most TILE_CACHE_BYTES, so panning a large colour page does not end up holding a
+    second 32-bit copy of the whole pyramid.
+    The item covers the same scene rectangle as a QGraphicsPixmapItem holding the same image, so scene
+    coordinates do not change when switching between both.
+    Bilevel and grayscale images (see COMPACT_FORMATS) are never expanded to 32 bits: level 0 is drawn
+    straight from the source image and the coarser levels are kept as Format_Grayscale8 images.
+    Below 1:1 zoom (typically the whole page fitted in the window) the item draws instead from a single
+    area-averaged downsample made for the current scale. That cache is only rebuilt when the scale moves
+    outside FIT_CACHE_TOLERANCE of the one it was built for, and it is not used when it would be larger
+    than FIT_CACHE_MAX_PIXELS. It is a pixmap for colour images and a Format_Grayscale8 QImage for compact
+    ones, a quarter of the memory of a 32-bit pixmap.
+    In draft mode (see setDraft(), used while the view is zooming) the fit cache is never rebuilt: the current
+    one is drawn scaled while within DRAFT_CACHE_TOLERANCE of its scale, and the pyramid tiles otherwise.
+    An image replaced by one of the same size and format (the next frame of a live stream, see FrameStream)
+    keeps the buffers of the coarser levels and of the fit cache: they are redrawn in place from the new image
+    the next time they are needed, each level as the 2 x 2 average of the one above it and the fit cache from
+    its nearest level with bilinear filtering, which costs a fraction of the area-averaged rebuild.
+    """
+
+    DEFAULT_TILE_SIZE = 512
+    # Bytes of pixmap tiles kept: several screens of 512 x 512 32-bit tiles (1 MB each)
+    TILE_CACHE_BYTES = 64 * 1024 * 1024
+
+    # Formats drawn directly from the source QImage instead of going through 32-bit pixmap tiles
+    COMPACT_FORMATS = (QImage.Format_Mono, QImage.Format_MonoLSB, QImage.Format_Grayscale8,
+                       QImage.Format_Grayscale16)
+
+    # Scale ratio (either way) accepted before the fit cache is rebuilt, and its maximum size
+    FIT_CACHE_TOLERANCE = 1.25
+    FIT_CACHE_MAX_PIXELS = 4 * 1024 * 1024
+    # Scale ratio (either way) at which the fit cache is still drawn in draft mode
+    DRAFT_CACHE_TOLERANCE = 2.0
+
+    def __init__(self, image: QImage, tileSize: int = DEFAULT_TILE_SIZE, parent: Optional[QGraphicsItem] = None):
+        super().__init__(parent)
+        # Necesario para que option.exposedRect tenga el área realmente expuesta
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+        self._tileSize = tileSize
+        self._image = QImage()
+        self._compact = False
+        self._levels = []
+        self._tiles = ImageCache(self.TILE_CACHE_BYTES, self.pixmapBytes)
+        self._fitCache = None
+        self._fitCacheScale = 0.0
+        # Niveles y caché con el contenido de la imagen anterior, pendientes de redibujar (ver setImage())
+        self._staleLevels = set()
+        self._fitCacheStale = False
+        self._draft = False
+
+        self.setImage(image)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setImage(self, image: QImage) -> None:
+        """ Replace the source image and drop every cached tile. The coarser levels and the fit cache are
+        dropped too, unless the image has the same size and format as the current one: then they are kept and
+        redrawn in place when next painted.
+        """
+        self._tiles.clear()
+        if not image.isNull() and image.size() == self._image.size() and image.format() == self._image.format():
+            self._image = image
+            self._levels[0] = image
+            self._staleLevels = set(range(1, len(self._levels)))
+            self._fitCacheStale = self._fitCache is not None
+            self.update()
+            return
+
+        self.prepareGeometryChange()
+        self._image = image
+        self._compact = self.isCompactFormat(image)
+        self._levels = [image]
+        self._staleLevels = set()
+        self._fitCache = None
+        self._fitCacheScale = 0.0
+        self._fitCacheStale = False
+        self.update()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def image(self) -> QImage:
+        """ Returns the source image. """
+        return self._image
+
+    # --------------------------------------------------------------------------------------------------------------
+    def pixmap(self) -> QPixmap:
+        """ Returns the source image converted to a QPixmap (full copy). """
+        return QPixmap.fromImage(self._image)
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def isCompactFormat(image: QImage) -> bool:
+        """ Returns whether the image is kept and drawn in its native low bit depth format. """
+        return image.format() in TiledImageItem.COMPACT_FORMATS
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setDraft(self, draft: bool) -> None:
+        """ Draft mode: nothing expensive is built while painting. Leaving it repaints at full quality. """
+        if draft != self._draft:
+            self._draft = draft
+            if not draft:
+                self.update()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def tileSize(self) -> int:
+        return self._tileSize
+
+    # --------------------------------------------------------------------------------------------------------------
+    def memoryUsage(self) -> dict:
+        """ Bytes held by the source image, the coarser pyramid levels, the pixmap tiles (at most
+        TILE_CACHE_BYTES) and the fit cache.
+        """
+        cache = self._fitCache
+        return {
+            "source": self._image.sizeInBytes(),
+            "levels": sum(level.sizeInBytes() for level in self._levels[1:]),
+            "tiles": self._tiles.sizeInBytes(),
+            "cache": 0 if cache is None else cache.sizeInBytes() if isinstance(cache, QImage) else
+            self.pixmapBytes(cache),
+        }
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def pixmapBytes(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    # --------------------------------------------------------------------------------------------------------------
+    def levelCount(self) -> int:
+        """ Number of pyramid levels for the current image, the last one fits in a single tile. """
+        longest = max(self._image.width(), self._image.height(), 1)
+        if longest <= self._tileSize:
+            return 1
+        return math.ceil(math.log2(longest / self._tileSize)) + 1
+
+    # --------------------------------------------------------------------------------------------------------------
+    def boundingRect(self) -> QRectF:
+        return QRectF(self._image.rect())
+
+    # --------------------------------------------------------------------------------------------------------------
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget=None) -> None:
+        if self._image.isNull():
+            return
+
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        cache = self._fitCacheFor(lod)
+        if cache is not None:
+            scale = self._fitCacheScale
+            source = QRectF(exposed.left() * scale, exposed.top() * scale,
+                            exposed.width() * scale, exposed.height() * scale)
+            if self._compact:
+                painter.drawImage(exposed, cache, source)
+            else:
+                painter.drawPixmap(exposed, cache, source)
+            return
+
+        level = self._levelForDetail(lod)
+        levelImage = self._level(level)
+
+        # Factor de escala entre coordenadas de escena y píxeles del nivel
+        sx = self._image.width() / levelImage.width()
+        sy = self._image.height() / levelImage.height()
+
+        size = self._tileSize
+        firstColumn = max(0, int(exposed.left() / sx) // size)
+        lastColumn = min((levelImage.width() - 1) // size, int(exposed.right() / sx) // size)
+        firstRow = max(0, int(exposed.top() / sy) // size)
+        lastRow = min((levelImage.height() - 1) // size, int(exposed.bottom() / sy) // size)
+
+        for row in range(firstRow, lastRow + 1):
+            for column in range(firstColumn, lastColumn + 1):
+                x, y = column * size, row * size
+                width = min(size, levelImage.width() - x)
+                height = min(size, levelImage.height() - y)
+                target = QRectF(x * sx, y * sy, width * sx, height * sy)
+                if self._compact:
+                    # Se pinta directamente desde la imagen compacta, sin expandirla a 32 bits
+                    painter.drawImage(target, levelImage, QRectF(x, y, width, height))
+                else:
+                    tile = self._tile(level, column, row)
+                    painter.drawPixmap(target, tile, QRectF(tile.rect()))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _fitCacheFor(self, lod: float) -> Union[QImage, QPixmap, None]:
+        """ Downsample of the whole image for scale lod, or None if the tiles must be used instead. """
+        if lod >= 1.0 or lod <= 0.0:
+            return None
+        width = max(1, round(self._image.width() * lod))
+        height = max(1, round(self._image.height() * lod))
+        if width * height > self.FIT_CACHE_MAX_PIXELS:
+            return None
+
+        if self._fitCache is not None:
+            ratio = lod / self._fitCacheScale
+            tolerance = self.DRAFT_CACHE_TOLERANCE if self._draft else self.FIT_CACHE_TOLERANCE
+            if 1.0 / tolerance <= ratio <= tolerance:
+                if self._fitCacheStale:
+                    self._redraw(self._fitCache, self._level(self._levelForDetail(self._fitCacheScale)))
+                    self._fitCacheStale = False
+                return self._fitCache
+        if self._draft:
+            return None
+
+        # Se parte del nivel de la pirámide más cercano por encima: el escalado suave promedia por áreas
+        source = self._level(self._levelForDetail(lod))
+        scaled = source.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        if self._compact:
+            self._fitCache = scaled if scaled.format() == QImage.Format_Grayscale8 else \
+                scaled.convertToFormat(QImage.Format_Grayscale8)
+        else:
+            self._fitCache = QPixmap.fromImage(scaled)
+        self._fitCacheScale = width / self._image.width()
+        self._fitCacheStale = False
+        return self._fitCache
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _levelForDetail(self, lod: float) -> int:
+        """ Coarsest level whose resolution is still at least the on-screen resolution. """
+        if lod <= 0:
+            return self.levelCount() - 1
+        level = int(math.floor(math.log2(1.0 / lod))) if lod < 1.0 else 0
+        return min(max(level, 0), self.levelCount() - 1)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _level(self, level: int) -> QImage:
+        if level in self._staleLevels:
+            self._staleLevels.discard(level)
+            self._halve(self._levels[level], self._level(level - 1))
+        while len(self._levels) <= level:
+            previous = self._level(len(self._levels) - 1)
+            scaled = previous.scaled(max(1, previous.width() // 2), max(1, previous.height() // 2),
+                                     Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            if self._compact and scaled.format() != QImage.Format_Grayscale8:
+                # El escalado suave de imágenes bitonales devuelve ARGB32
+                scaled = scaled.convertToFormat(QImage.Format_Grayscale8)
+            self._levels.append(scaled)
+        return self._levels[level]
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _halve(target: QImage, source: QImage) -> None:
+        """ Redraw a level in place as the 2 x 2 average of source, the level above it. """
+        if source.format() != target.format() or source.depth() not in (8, 24, 32):
+            # Nivel 0 en otro formato (bitonal, 16 bits por canal...): a escala 1/2 el bilineal también promedia 2 x 2
+            TiledImageItem._redraw(target, source)
+            return
+        channels = source.depth() // 8
+        width, height = target.width(), target.height()
+        pixels = np.frombuffer(source.constBits(), np.uint8).reshape(source.height(), source.bytesPerLine())
+        pixels = pixels[:2 * height, :2 * width * channels].reshape(2 * height, 2 * width, channels)
+        total = pixels[0::2, 0::2].astype(np.uint16)
+        total += pixels[1::2, 0::2]
+        total += pixels[0::2, 1::2]
+        total += pixels[1::2, 1::2]
+        total += 2
+        total >>= 2
+        view = np.frombuffer(target.bits(), np.uint8).reshape(height, target.bytesPerLine())
+        view[:, :width * channels] = total.reshape(height, width * channels)
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _redraw(target: Union[QImage, QPixmap], source: QImage) -> None:
+        """ Draw source scaled over the whole of target, bilinear filtered. """
+        painter = QPainter(target)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        painter.drawImage(QRectF(target.rect()), source)
+        painter.end()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _tile(self, level: int, column: int, row: int) -> QPixmap:
+        key = (level, column, row)
+        tile = self._tiles.get(key)
+        if tile is None:
+            size = self._tileSize
+            levelImage = self._level(level)
+            x, y = column * size, row * size
+            tile = QPixmap.fromImage(levelImage.copy(x, y, min(size, levelImage.width() - x),
+                                                     min(size, levelImage.height() - y)))
+            # Se devuelve aunque no quepa en la caché: el frame actual se pinta igual
+            self._tiles.put(key, tile)
+        return tile
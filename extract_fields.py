@@ -0,0 +1,256 @@
+"""
+extract_fields.py: headless batch extraction of the field crops of a form template from scanned images.
+Every page of every input image is decoded once, in a pool of worker processes, and the rectangle of each
+template field is written to <output>/<image name>[_p<page>]/<field name or id>.<format>; a name already
+taken by another field of the template gets "_<field id>" appended, so no crop overwrites another.
+With --scores, the fill score (fraction of ink pixels, see FillScorer) of every field of every page is
+written to a CSV file too, or instead of the crops if no output folder is given.
+With --reference, the image the template fields were placed on, every page is first registered against it
+(see Registration) and the fields are mapped onto the page, so shifted or slightly skewed scans are cropped
+at the right place.
+Inputs are image files, folders (their image files) and glob patterns; "-" reads one input per line from
+standard input, so a long list of scans can be streamed in while the extraction runs. A file named by
+several inputs (a folder and an overlapping glob, a repeated argument) is only processed once.
+    python extract_fields.py -t form.tplb -o crops scans/ "more/*.tif"
+    python extract_fields.py -t omr.json --scores scores.csv scans/
+    python extract_fields.py -t form.tplb -r blank_form.tif -o crops scans/
+"""
+import argparse
+import csv
+import glob
+import math
+import multiprocessing
+import os
+import sys
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import template_io
+import util
+from field_store import FieldStore
+from fill_scorer import FillScorer
+from registration import Registration
+
+DEFAULT_FORMAT = "png"
+PROGRESS_INTERVAL = 2.0
+
+# Fields of the template in each worker process: (name of the crop file, left, top, right, bottom)
+_fields = []
+# (n, 4) rectangles of the fields for the fill scores
+_rects = None
+# Registration against the reference image of the template, if any
+_registration = None
+# extractFields() arguments in each worker process: outputFolder, imageFormat, scores, threshold, reference
+_options = {}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def iterImageFiles(inputs: Iterable[str]) -> Iterator[str]:
+    """ Image files named by inputs, lazily: files, folders (their image files, sorted), glob patterns
+    and "-" for one input per line read from standard input. Each file is yielded once, the first time it
+    is named (files are compared by their real path).
+    """
+    seen = set()
+    for fileName in _iterInputs(inputs):
+        path = os.path.normcase(os.path.realpath(fileName))
+        if path not in seen:
+            seen.add(path)
+            yield fileName
+
+
+def _iterInputs(inputs: Iterable[str]) -> Iterator[str]:
+    for name in inputs:
+        if name == "-":
+            yield from _iterInputs(line.strip() for line in sys.stdin if line.strip())
+        elif os.path.isdir(name):
+            yield from util.listImageFiles(name)
+        elif os.path.isfile(name):
+            yield name
+        else:
+            for fileName in sorted(glob.iglob(name, recursive=True)):
+                if os.path.isfile(fileName) and os.path.splitext(fileName)[1].lower() in util.IMAGE_EXTENSIONS:
+                    yield fileName
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def templateCrops(store: FieldStore) -> List[Tuple[str, int, int, int, int]]:
+    """ Crop file name (without extension) and pixel bounds (left, top, right, bottom) of every field.
+    File names are unique: a name already taken (duplicate names, or different names that are the same once
+    sanitized) gets the field id appended.
+    """
+    names = store.names()
+    crops = []
+    # En minúsculas: en sistemas de archivos que no distinguen mayúsculas también colisionan
+    used = set()
+    for fieldId, bounds in zip(store.ids().tolist(), _pixelBounds(store.rects())):
+        name = names.get(fieldId) or str(fieldId)
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        unique, suffix = safe, 1
+        while unique.lower() in used:
+            unique = f"{safe}_{fieldId}" if suffix == 1 else f"{safe}_{fieldId}_{suffix}"
+            suffix += 1
+        used.add(unique.lower())
+        crops.append((unique,) + bounds)
+    return crops
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _pixelBounds(rects) -> List[Tuple[int, int, int, int]]:
+    """ Pixel bounds (left, top, right, bottom) of each row of an (n, 4) array of x, y, width, height. """
+    return [(math.floor(x), math.floor(y), math.ceil(x + w), math.ceil(y + h)) for x, y, w, h in rects.tolist()]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _loadReference(fileName: str) -> Registration:
+    image, error = util.decodeImage(fileName)
+    if image is None:
+        raise RuntimeError(f"Cannot read the reference image '{fileName}': {error}")
+    return Registration(image)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _initWorker(templateFileName: str, options: dict) -> None:
+    global _fields, _rects, _registration, _options
+    store = FieldStore()
+    template_io.loadTemplate(templateFileName, store)
+    _fields = templateCrops(store)
+    _rects = store.rects()
+    _registration = _loadReference(options["reference"]) if options["reference"] is not None else None
+    _options = options
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _extractFile(fileName: str) -> Tuple[str, int, int, str, list]:
+    """ Write the crops of every page of fileName and score its fields.
+    Returns (file name, pages, crops written, error, [(page, list of field scores)]).
+    """
+    stem = os.path.splitext(os.path.basename(fileName))[0]
+    pageCount = util.imagePageCount(fileName)
+    pages = crops = 0
+    scores = []
+    for page in range(pageCount):
+        image, error = util.decodeImage(fileName, page)
+        if image is None:
+            return fileName, pages, crops, error, scores
+        rects, fields = _rects, _fields
+        if _registration is not None:
+            rects = _registration.register(image).mapRects(_rects)
+            fields = [(name,) + bounds for (name, *_), bounds in zip(_fields, _pixelBounds(rects))]
+        if _options["scores"]:
+            scores.append((page, FillScorer(image, _options["threshold"]).scores(rects).tolist()))
+        if _options["outputFolder"] is not None:
+            folder = os.path.join(_options["outputFolder"], stem if pageCount == 1 else f"{stem}_p{page + 1}")
+            os.makedirs(folder, exist_ok=True)
+            width, height = image.width(), image.height()
+            for name, left, top, right, bottom in fields:
+                left, top = max(left, 0), max(top, 0)
+                right, bottom = min(right, width), min(bottom, height)
+                if right <= left or bottom <= top:
+                    continue
+                crop = image.copy(left, top, right - left, bottom - top)
+                if not crop.save(os.path.join(folder, f"{name}.{_options['imageFormat']}")):
+                    return fileName, pages, crops, f"Cannot write crop {name} of page {page + 1}", scores
+                crops += 1
+        pages += 1
+    return fileName, pages, crops, "", scores
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def extractFields(templateFileName: str, fileNames: Iterable[str], outputFolder: Optional[str],
+                  jobs: Optional[int] = None, imageFormat: str = DEFAULT_FORMAT,
+                  progress: Optional[Callable[[dict], None]] = None, scoresFileName: Optional[str] = None,
+                  threshold: int = FillScorer.DEFAULT_THRESHOLD, referenceFileName: Optional[str] = None) -> dict:
+    """ Write the crops of the template fields of every page of fileNames to outputFolder (unless it is None)
+    and their fill scores to the CSV file scoresFileName (if given), using jobs worker processes (one per
+    CPU by default). Files are handed to the workers as fileNames yields them.
+    If referenceFileName is given, the fields are mapped onto each page by registering it against that image.
+    progress, if given, is called every PROGRESS_INTERVAL seconds with the statistics so far.
+    Returns the statistics: files, pages, crops, errors (list of (file name, error)), seconds, pagesPerSecond.
+    """
+    # Se comprueba la plantilla antes de arrancar los procesos
+    store = FieldStore()
+    template_io.loadTemplate(templateFileName, store)
+    if referenceFileName is not None:
+        _loadReference(referenceFileName)
+    if outputFolder is not None:
+        os.makedirs(outputFolder, exist_ok=True)
+    options = {"outputFolder": outputFolder, "imageFormat": imageFormat, "scores": scoresFileName is not None,
+               "threshold": threshold, "reference": referenceFileName}
+    scoresFile = open(scoresFileName, "w", newline="", encoding="utf-8") if scoresFileName is not None else None
+    if scoresFile is not None:
+        scoresWriter = csv.writer(scoresFile)
+        scoresWriter.writerow(["file", "page", "field_id", "name", "score"])
+        fieldIds = store.ids().tolist()
+        fieldNames = [store.name(fieldId) for fieldId in fieldIds]
+
+    stats = {"files": 0, "pages": 0, "crops": 0, "errors": [], "seconds": 0.0, "pagesPerSecond": 0.0}
+    start = lastProgress = time.perf_counter()
+    # spawn: los procesos no heredan el estado de Qt del proceso principal, igual en todas las plataformas
+    context = multiprocessing.get_context("spawn")
+    try:
+        with context.Pool(jobs or os.cpu_count(), initializer=_initWorker,
+                          initargs=(templateFileName, options)) as pool:
+            for fileName, pages, crops, error, scores in pool.imap_unordered(_extractFile, fileNames):
+                stats["files"] += 1
+                stats["pages"] += pages
+                stats["crops"] += crops
+                if error:
+                    stats["errors"].append((fileName, error))
+                for page, pageScores in scores:
+                    scoresWriter.writerows([fileName, page + 1, fieldId, name, f"{score:.4f}"]
+                                           for fieldId, name, score in zip(fieldIds, fieldNames, pageScores))
+                now = time.perf_counter()
+                stats["seconds"] = now - start
+                stats["pagesPerSecond"] = stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0
+                if progress is not None and now - lastProgress >= PROGRESS_INTERVAL:
+                    lastProgress = now
+                    progress(stats)
+    finally:
+        if scoresFile is not None:
+            scoresFile.close()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["pagesPerSecond"] = stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _printProgress(stats: dict) -> None:
+    print(f"[INFO] {stats['files']} files, {stats['pages']} pages, {stats['pagesPerSecond']:.1f} pages/s",
+          file=sys.stderr)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Extract the field crops of a form template from scanned images.")
+    ap.add_argument("inputs", nargs="+", help="Image files, folders, glob patterns or - to read them from stdin")
+    ap.add_argument("-t", "--template", required=True, help="Template file (.json or .tplb)")
+    ap.add_argument("-o", "--output", default=None, help="Folder for the crops")
+    ap.add_argument("-s", "--scores", default=None, help="CSV file for the fill scores of the fields")
+    ap.add_argument("--threshold", type=int, default=FillScorer.DEFAULT_THRESHOLD,
+                    help="Gray level below which a pixel is ink, for the fill scores (default: 128)")
+    ap.add_argument("-r", "--reference", default=None,
+                    help="Reference image of the template: register every page against it and map the fields")
+    ap.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: one per CPU)")
+    ap.add_argument("-f", "--format", default=DEFAULT_FORMAT, help="Image format of the crops (default: png)")
+    args = ap.parse_args(argv)
+    if args.output is None and args.scores is None:
+        ap.error("at least one of --output and --scores is required")
+
+    try:
+        stats = extractFields(args.template, iterImageFiles(args.inputs), args.output, args.jobs, args.format,
+                              progress=_printProgress, scoresFileName=args.scores, threshold=args.threshold,
+                              referenceFileName=args.reference)
+    except (OSError, RuntimeError) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 2
+
+    for fileName, error in stats["errors"]:
+        print(f"[ERROR] {fileName}: {error}", file=sys.stderr)
+    print(f"[INFO] {stats['files']} files, {stats['pages']} pages, {stats['crops']} crops in "
+          f"{stats['seconds']:.2f} s: {stats['pagesPerSecond']:.1f} pages/s")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
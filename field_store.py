@@ -0,0 +1,336 @@
+# --------------------------------------------------------------------------------------------------------------
+from typing import Iterable, Optional, Tuple, Union
+
+import numpy as np
+from PySide6.QtCore import QPointF, QRectF
+
+# Record of a field: rectangle in scene coordinates, unique id and state flags (FieldStore.SELECTED, ...)
+FIELD_DTYPE = np.dtype([("x", np.float64), ("y", np.float64), ("w", np.float64), ("h", np.float64),
+                        ("id", np.int64), ("state", np.uint8)])
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class FieldStore:
+    """
+    Compact store of the form fields (design rectangles): one record of FIELD_DTYPE per field in a NumPy
+    structured array, instead of a QGraphicsItem per field.
+    Fields are kept in creation order (the last one is on top) with increasing ids, so an id is found by
+    binary search and bulk operations (select, move, align, remove...) are vectorized over the array.
+    Ids are never reused. Operations taking ids ignore the ones that are not in the store.
+    Field names are optional and kept apart, in a dictionary by id.
+    Every change also grows a dirty rectangle covering the fields it touched (before and after), so a view
+    only needs to repaint that area (see takeDirtyRect).
+    bounds() and typicalSize() are kept until the geometry changes (fields added, removed or moved), so a
+    selection change does not scan the whole store.
+    """
+
+    SELECTED = 0x01
+    # Shown by its own graphics item while it is being edited, so the overlay does not draw it
+    EDITING = 0x02
+
+    def __init__(self, capacity: int = 1024):
+        self._data = np.zeros(max(1, capacity), dtype=FIELD_DTYPE)
+        self._count = 0
+        self._nextId = 1
+        self._names = {}
+        # Contiguous copy of the ids for the binary search (a column of the records is strided), see _find()
+        self._ids = None
+        # Dirty area as (left, top, right, bottom), None if clean
+        self._dirty = None
+        # bounds() y typicalSize() de la geometría actual, se vacía al añadir, quitar o mover campos
+        self._geometry = {}
+
+    # --------------------------------------------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return self._count
+
+    # --------------------------------------------------------------------------------------------------------------
+    def __contains__(self, fieldId: int) -> bool:
+        return len(self.indices([fieldId])) > 0
+
+    # --------------------------------------------------------------------------------------------------------------
+    def fields(self) -> np.ndarray:
+        """ Records of all the fields (a view, in creation order). """
+        return self._data[:self._count]
+
+    # --------------------------------------------------------------------------------------------------------------
+    def ids(self) -> np.ndarray:
+        return self.fields()["id"].copy()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def clear(self, resetIds: bool = False) -> None:
+        """ Remove every field. With resetIds, ids start again from 1 (e.g. before loading a template). """
+        self._touch(slice(None))
+        self._count = 0
+        self._ids = None
+        self._geometry.clear()
+        self._names = {}
+        if resetIds:
+            self._nextId = 1
+
+    # --------------------------------------------------------------------------------------------------------------
+    def nextId(self) -> int:
+        """ Id that the next field added will get. """
+        return self._nextId
+
+    # --------------------------------------------------------------------------------------------------------------
+    def add(self, rect: QRectF) -> int:
+        """ Add a field and return its id. """
+        return int(self.addMany(np.array([[rect.x(), rect.y(), rect.width(), rect.height()]]))[0])
+
+    # --------------------------------------------------------------------------------------------------------------
+    def addMany(self, rects: np.ndarray, states: Optional[np.ndarray] = None,
+                ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """ Add fields from an (n, 4) array of x, y, width, height. Returns their ids.
+        ids gives the ids of the new fields instead (e.g. read from a template). They must be increasing and
+        not lower than nextId(), else a RuntimeError is raised.
+        """
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        count = len(rects)
+        if ids is None:
+            ids = np.arange(self._nextId, self._nextId + count, dtype=np.int64)
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+            if len(ids) != count:
+                raise RuntimeError("FieldStore.addMany: There must be one id per rectangle.")
+            if count and (ids[0] < self._nextId or np.any(np.diff(ids) <= 0)):
+                raise RuntimeError("FieldStore.addMany: Ids must be increasing and not already used.")
+        self._reserve(self._count + count)
+        new = self._data[self._count:self._count + count]
+        new["x"], new["y"], new["w"], new["h"] = rects.T
+        new["id"] = ids
+        new["state"] = 0 if states is None else states
+        self._count += count
+        self._ids = None
+        self._geometry.clear()
+        if count:
+            self._nextId = int(ids[-1]) + 1
+        self._touch(slice(self._count - count, self._count))
+        return ids
+
+    # --------------------------------------------------------------------------------------------------------------
+    def remove(self, ids: Iterable[int]) -> None:
+        keep = np.ones(self._count, dtype=bool)
+        index = self.indices(ids)
+        self._touch(index)
+        keep[index] = False
+        if self._names:
+            for fieldId in self.fields()["id"][index].tolist():
+                self._names.pop(fieldId, None)
+        kept = self.fields()[keep]
+        self._data[:len(kept)] = kept
+        self._count = len(kept)
+        self._ids = None
+        self._geometry.clear()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def indices(self, ids: Iterable[int]) -> np.ndarray:
+        """ Positions in fields() of the given ids. """
+        positions, found = self._find(ids)
+        return positions[found]
+
+    # --------------------------------------------------------------------------------------------------------------
+    def name(self, fieldId: int) -> str:
+        return self._names.get(fieldId, "")
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setName(self, fieldId: int, name: str) -> None:
+        if fieldId not in self:
+            return
+        if name:
+            self._names[fieldId] = name
+        else:
+            self._names.pop(fieldId, None)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setNames(self, names: dict) -> None:
+        """ Set the names of many fields at once, from a dictionary by id. """
+        _, found = self._find(list(names.keys()))
+        for (fieldId, name), present in zip(names.items(), found.tolist()):
+            if not present:
+                continue
+            if name:
+                self._names[fieldId] = name
+            else:
+                self._names.pop(fieldId, None)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def names(self) -> dict:
+        """ Names of the named fields, by id. Do not modify it, use setName(). """
+        return self._names
+
+    # --------------------------------------------------------------------------------------------------------------
+    def rect(self, fieldId: int) -> Optional[QRectF]:
+        index = self.indices([fieldId])
+        if len(index) == 0:
+            return None
+        record = self._data[index[0]]
+        return QRectF(float(record["x"]), float(record["y"]), float(record["w"]), float(record["h"]))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setRect(self, fieldId: int, rect: QRectF) -> None:
+        self.setRects([fieldId], np.array([[rect.x(), rect.y(), rect.width(), rect.height()]]))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def rects(self, ids: Optional[Iterable[int]] = None) -> np.ndarray:
+        """ (n, 4) array of x, y, width, height of the given fields (all by default). """
+        fields = self.fields() if ids is None else self.fields()[self.indices(ids)]
+        return np.stack([fields["x"], fields["y"], fields["w"], fields["h"]], axis=1)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setRects(self, ids: Iterable[int], rects: np.ndarray) -> None:
+        """ Set the rectangles of the fields from an (n, 4) array, in the same order as ids.
+        Fields whose rectangle does not change are left untouched (not dirty, geometry kept).
+        """
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        positions, found = self._find(ids)
+        index, rects = positions[found], rects[found]
+        fields = self.fields()
+        changed = np.zeros(len(index), dtype=bool)
+        for column, name in enumerate(("x", "y", "w", "h")):
+            changed |= fields[name][index] != rects[:, column]
+        if not changed.any():
+            return
+        index, rects = index[changed], rects[changed]
+        self._touch(index)
+        for column, name in enumerate(("x", "y", "w", "h")):
+            fields[name][index] = rects[:, column]
+        self._touch(index)
+        self._geometry.clear()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def translate(self, ids: Iterable[int], dx: float, dy: float) -> None:
+        index = self.indices(ids)
+        self._touch(index)
+        fields = self.fields()
+        fields["x"][index] += dx
+        fields["y"][index] += dy
+        self._touch(index)
+        self._geometry.clear()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def state(self, fieldId: int) -> int:
+        """ State flags of a field (0 if it is not in the store). """
+        index = self.indices([fieldId])
+        return int(self.fields()["state"][index[0]]) if len(index) else 0
+
+    # --------------------------------------------------------------------------------------------------------------
+    def withState(self, flag: int) -> np.ndarray:
+        """ Ids of the fields with a state flag set. """
+        fields = self.fields()
+        return fields["id"][(fields["state"] & flag) != 0]
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setState(self, ids: Iterable[int], flag: int, on: bool = True) -> None:
+        index = self.indices(ids)
+        self._touch(index)
+        state = self.fields()["state"]
+        if on:
+            state[index] |= flag
+        else:
+            state[index] &= ~np.uint8(flag)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def clearState(self, flag: int) -> None:
+        state = self.fields()["state"]
+        index = np.flatnonzero(state & flag)
+        self._touch(index)
+        state[index] &= ~np.uint8(flag)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def selected(self) -> np.ndarray:
+        return self.withState(self.SELECTED)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def intersectMask(self, rect: QRectF) -> np.ndarray:
+        """ Boolean mask over fields() of the fields that overlap rect (edges included). """
+        left, top, right, bottom = self._edges()
+        return (left <= rect.right()) & (right >= rect.left()) & (top <= rect.bottom()) & (bottom >= rect.top())
+
+    # --------------------------------------------------------------------------------------------------------------
+    def fieldAt(self, point: Union[QPointF, QRectF], margin: float = 0) -> Optional[int]:
+        """ Id of the topmost field containing point (within margin), or None. """
+        if isinstance(point, QPointF):
+            point = QRectF(point.x() - margin, point.y() - margin, 2 * margin, 2 * margin)
+        hits = np.flatnonzero(self.intersectMask(point))
+        return int(self.fields()["id"][hits[-1]]) if len(hits) else None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def bounds(self) -> QRectF:
+        """ Rectangle bounding all the fields (null if there are none). """
+        bounds = self._geometry.get("bounds")
+        if bounds is None:
+            bounds = self._geometry["bounds"] = self._bounds(self.fields())
+        return QRectF(bounds)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def typicalSize(self, samples: int = 1000) -> float:
+        """ Median of the smaller side of the fields, estimated from about samples of them. 0 if empty. """
+        size = self._geometry.get(("typicalSize", samples))
+        if size is None:
+            fields = self.fields()[::max(1, self._count // samples)]
+            size = float(np.median(np.minimum(fields["w"], fields["h"]))) if len(fields) else 0.0
+            self._geometry[("typicalSize", samples)] = size
+        return size
+
+    # --------------------------------------------------------------------------------------------------------------
+    def takeDirtyRect(self) -> Optional[QRectF]:
+        """ Rectangle covering every field changed since the last call (None if none), and reset it. """
+        if self._dirty is None:
+            return None
+        left, top, right, bottom = self._dirty
+        self._dirty = None
+        return QRectF(left, top, right - left, bottom - top)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _find(self, ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """ Binary search of ids: position of each one in fields() and whether it was found there. """
+        ids = np.asarray(ids if isinstance(ids, np.ndarray) else list(ids), dtype=np.int64)
+        if self._ids is None:
+            self._ids = np.ascontiguousarray(self.fields()["id"])
+        stored = self._ids
+        positions = np.searchsorted(stored, ids)
+        found = positions < len(stored)
+        found[found] = stored[positions[found]] == ids[found]
+        return positions, found
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _edges(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Contiguous left, top, right and bottom of the fields, kept until the geometry changes (the columns
+        of the records are strided, and hit tests on every click should not rebuild right and bottom).
+        """
+        edges = self._geometry.get("edges")
+        if edges is None:
+            fields = self.fields()
+            edges = self._geometry["edges"] = (np.ascontiguousarray(fields["x"]), np.ascontiguousarray(fields["y"]),
+                                               fields["x"] + fields["w"], fields["y"] + fields["h"])
+        return edges
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _bounds(fields: np.ndarray) -> QRectF:
+        if len(fields) == 0:
+            return QRectF()
+        left, top = float(fields["x"].min()), float(fields["y"].min())
+        right, bottom = float((fields["x"] + fields["w"]).max()), float((fields["y"] + fields["h"]).max())
+        return QRectF(left, top, right - left, bottom - top)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _touch(self, index: Union[np.ndarray, slice]) -> None:
+        """ Add the fields at index (positions in fields()) to the dirty rectangle. """
+        fields = self.fields()[index]
+        if len(fields) == 0:
+            return
+        bounds = (float(fields["x"].min()), float(fields["y"].min()),
+                  float((fields["x"] + fields["w"]).max()), float((fields["y"] + fields["h"]).max()))
+        if self._dirty is not None:
+            bounds = (min(bounds[0], self._dirty[0]), min(bounds[1], self._dirty[1]),
+                      max(bounds[2], self._dirty[2]), max(bounds[3], self._dirty[3]))
+        self._dirty = bounds
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _reserve(self, count: int) -> None:
+        if count > len(self._data):
+            data = np.zeros(max(count, 2 * len(self._data)), dtype=FIELD_DTYPE)
+            data[:self._count] = self.fields()
+            self._data = data
@@ -0,0 +1,100 @@
+# --------------------------------------------------------------------------------------------------------------
+from typing import Union
+
+import numpy as np
+from PySide6.QtCore import QRectF
+from PySide6.QtGui import QImage
+
+from image_buffer import ImageBuffer
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class FillScorer:
+    """
+    Ink density (fill score) of rectangles of a page, for checkbox / OMR fields.
+    The page is binarized once (ink = gray level below threshold) into a summed-area table, so the score
+    of any rectangle is the 4-corner difference of the table: O(1) per rectangle and vectorized over any
+    number of them with scores().
+    The table is built in strips of STRIP_ROWS rows read through ImageBuffer.region(), so bilevel scans
+    are unpacked a strip at a time and never expanded to 32 bits. It takes 4 bytes per pixel.
+    """
+
+    DEFAULT_THRESHOLD = 128
+    STRIP_ROWS = 256
+
+    def __init__(self, image: Union[QImage, ImageBuffer], threshold: int = DEFAULT_THRESHOLD):
+        buffer = image if isinstance(image, ImageBuffer) else ImageBuffer(image)
+        self._width, self._height = buffer.width(), buffer.height()
+        self._threshold = threshold
+        self._table = self._summedAreaTable(buffer, threshold)
+
+    # --------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def _summedAreaTable(cls, buffer: ImageBuffer, threshold: int) -> np.ndarray:
+        """ (height + 1, width + 1) table of the ink pixel count above and left of each position. """
+        width, height = buffer.width(), buffer.height()
+        table = np.zeros((height + 1, width + 1), dtype=np.uint32)
+        scale = 257 if buffer.array().dtype == np.uint16 else 1
+        for top in range(0, height, cls.STRIP_ROWS):
+            values = buffer.region(QRectF(0, top, width, cls.STRIP_ROWS))
+            if values.ndim == 3:
+                # Nivel de gris como qGray: (11 R + 16 G + 5 B) / 32
+                values = values.astype(np.uint32)
+                values = (values[..., 0] * 11 + values[..., 1] * 16 + values[..., 2] * 5) // 32
+            ink = values < threshold * scale
+            strip = table[top + 1:top + 1 + len(ink), 1:]
+            np.cumsum(ink, axis=1, dtype=np.uint32, out=strip)
+            np.cumsum(strip, axis=0, dtype=np.uint32, out=strip)
+            strip += table[top, 1:]
+        return table
+
+    # --------------------------------------------------------------------------------------------------------------
+    def width(self) -> int:
+        return self._width
+
+    # --------------------------------------------------------------------------------------------------------------
+    def height(self) -> int:
+        return self._height
+
+    # --------------------------------------------------------------------------------------------------------------
+    def threshold(self) -> int:
+        return self._threshold
+
+    # --------------------------------------------------------------------------------------------------------------
+    def inkCount(self, rect: QRectF) -> int:
+        """ Number of ink pixels covered by rect (clipped to the page). """
+        return int(self.inkCounts(np.array([[rect.x(), rect.y(), rect.width(), rect.height()]]))[0])
+
+    # --------------------------------------------------------------------------------------------------------------
+    def score(self, rect: QRectF) -> float:
+        """ Fraction (0 to 1) of the pixels covered by rect (clipped to the page) that are ink.
+        0 if rect does not overlap the page.
+        """
+        return float(self.scores(np.array([[rect.x(), rect.y(), rect.width(), rect.height()]]))[0])
+
+    # --------------------------------------------------------------------------------------------------------------
+    def inkCounts(self, rects: np.ndarray) -> np.ndarray:
+        """ Ink pixel count of each row of an (n, 4) array of x, y, width, height. """
+        left, top, right, bottom = self._bounds(rects)
+        table = self._table
+        return (table[bottom, right].astype(np.int64) - table[top, right] - table[bottom, left]
+                + table[top, left])
+
+    # --------------------------------------------------------------------------------------------------------------
+    def scores(self, rects: np.ndarray) -> np.ndarray:
+        """ Fill score of each row of an (n, 4) array of x, y, width, height. """
+        left, top, right, bottom = self._bounds(rects)
+        area = (right - left) * (bottom - top)
+        counts = self.inkCounts(rects)
+        return np.divide(counts, area, out=np.zeros(len(area)), where=area > 0)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _bounds(self, rects: np.ndarray) -> tuple:
+        """ Pixel bounds (left, top, right, bottom) of the rectangles, clipped to the page. """
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        x, y, w, h = rects.T
+        left = np.clip(np.floor(x), 0, self._width).astype(np.intp)
+        top = np.clip(np.floor(y), 0, self._height).astype(np.intp)
+        right = np.clip(np.ceil(x + w), left, self._width).astype(np.intp)
+        bottom = np.clip(np.ceil(y + h), top, self._height).astype(np.intp)
+        return left, top, right, bottom
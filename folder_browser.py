@@ -0,0 +1,251 @@
+# --------------------------------------------------------------------------------------------------------------
+import os
+from typing import List, Optional, Tuple
+
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtGui import QImage
+
+import util
+from image_cache import ImageCache
+from qtImageViewer import QtImageViewer
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class FolderBrowser(QObject):
+    """
+    Next/previous navigation over the pages of the image files of a folder, shown in a QtImageViewer.
+    Multi-page files (TIFF) are browsed page by page and only the page being shown is decoded.
+    Decoded pages are kept in an LRU ImageCache limited in bytes, keyed by (file name, page). After every
+    move the next prefetchCount pages in the browsing direction are decoded in the background, so paging
+    forward (or backward) shows cached pages immediately. Pages of the current file further than
+    keepPages from the current one are dropped from the cache.
+    Pages that are not cached are loaded through the viewer's ImageLoader, so a newer move cancels them.
+    Prefetches run below the loads in the loader's pool, and after every move the queued ones that are no
+    longer ahead in the browsing direction (the direction or the folder changed, or the move jumped) are
+    dropped, so they never run before the page the user is waiting for.
+    """
+
+    # Emitted when a new folder is opened, before its first page is shown: folder name
+    folderOpened = Signal(str)
+    # Emitted when the current page changes: index in files(), file name, page
+    currentChanged = Signal(int, str, int)
+    # Emitted when the current page is actually on screen (at once if cached): index, file name, page
+    imageShown = Signal(int, str, int)
+
+    DEFAULT_PREFETCH_COUNT = 3
+    DEFAULT_KEEP_PAGES = 8
+
+    def __init__(self, viewer: QtImageViewer, parent: Optional[QObject] = None,
+                 maxCacheBytes: int = ImageCache.DEFAULT_MAX_BYTES, prefetchCount: int = DEFAULT_PREFETCH_COUNT,
+                 keepPages: int = DEFAULT_KEEP_PAGES):
+        super().__init__(parent)
+        self._viewer = viewer
+        self._loader = viewer.imageLoader()
+        self._cache = ImageCache(maxCacheBytes)
+        self.prefetchCount = prefetchCount
+        self.keepPages = keepPages
+
+        self._files = []
+        self._pageCounts = {}
+        self._index = -1
+        self._page = 0
+        self._direction = 1
+        self._prefetching = set()
+
+        # noinspection PyUnresolvedReferences
+        self._loader.imageLoaded.connect(self._onImageLoaded)
+        # noinspection PyUnresolvedReferences
+        self._loader.imagePrefetched.connect(self._onImagePrefetched)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def open(self, path: str) -> bool:
+        """ Browse the folder at path, or the folder containing the file at path starting at that file. """
+        if os.path.isdir(path):
+            folder, current = path, None
+        elif os.path.isfile(path):
+            folder, current = os.path.dirname(path), os.path.abspath(path)
+        else:
+            return False
+
+        files = util.listImageFiles(folder)
+        if not files:
+            return False
+
+        self._loader.cancelPrefetches()
+        self._files = files
+        self._pageCounts = {}
+        self._direction = 1
+        self._prefetching.clear()
+        index = 0
+        if current is not None:
+            absolute = [os.path.abspath(fileName) for fileName in files]
+            index = absolute.index(current) if current in absolute else 0
+        self._index, self._page = -1, 0
+        # noinspection PyUnresolvedReferences
+        self.folderOpened.emit(folder)
+        self.goTo(index)
+        return True
+
+    # --------------------------------------------------------------------------------------------------------------
+    def files(self) -> List[str]:
+        return self._files
+
+    # --------------------------------------------------------------------------------------------------------------
+    def currentIndex(self) -> int:
+        return self._index
+
+    # --------------------------------------------------------------------------------------------------------------
+    def currentPage(self) -> int:
+        return self._page
+
+    # --------------------------------------------------------------------------------------------------------------
+    def currentFile(self) -> Optional[str]:
+        return self._files[self._index] if 0 <= self._index < len(self._files) else None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def pageCount(self, index: Optional[int] = None) -> int:
+        """ Number of pages of the file at index (the current one by default). Read once per file. """
+        index = self._index if index is None else index
+        if not 0 <= index < len(self._files):
+            return 0
+        fileName = self._files[index]
+        if fileName not in self._pageCounts:
+            self._pageCounts[fileName] = util.imagePageCount(fileName)
+        return self._pageCounts[fileName]
+
+    # --------------------------------------------------------------------------------------------------------------
+    def cache(self) -> ImageCache:
+        return self._cache
+
+    # --------------------------------------------------------------------------------------------------------------
+    def hasNext(self) -> bool:
+        return self._step(self._index, self._page, 1) is not None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def hasPrevious(self) -> bool:
+        return self._step(self._index, self._page, -1) is not None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def next(self) -> None:
+        """ Next page, or first page of the next file. """
+        position = self._step(self._index, self._page, 1)
+        if position is not None:
+            self.goTo(*position)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def previous(self) -> None:
+        """ Previous page, or last page of the previous file. """
+        position = self._step(self._index, self._page, -1)
+        if position is not None:
+            self.goTo(*position)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def goTo(self, index: int, page: int = 0) -> None:
+        """ Show a page of the file at index. Cached pages are shown synchronously, the rest are loaded in the
+        background.
+        """
+        if not 0 <= index < len(self._files) or (index, page) == (self._index, self._page):
+            return
+        if not 0 <= page < self.pageCount(index):
+            return
+
+        if self._index >= 0:
+            self._direction = 1 if (index, page) > (self._index, self._page) else -1
+        self._index, self._page = index, page
+        fileName = self._files[index]
+        key = (fileName, page)
+
+        image = self._cache.get(key)
+        # Se descartan las precargas en cola que ya no van por delante, también la de esta página si aún no ha
+        # empezado: se carga con la prioridad normal
+        for dropped in self._loader.cancelPrefetches(self._prefetchKeys()):
+            self._prefetching.discard(dropped)
+        if image is not None:
+            self._loader.cancel()
+            self._viewer.setImage(image)
+        elif key in self._prefetching:
+            # Ya se está decodificando: se muestra en cuanto llegue (ver _onImagePrefetched)
+            self._loader.cancel()
+        else:
+            self._loader.load(fileName, page)
+
+        # noinspection PyUnresolvedReferences
+        self.currentChanged.emit(index, fileName, page)
+        self._releaseFarPages()
+        self._prefetch()
+
+        if image is not None:
+            # noinspection PyUnresolvedReferences
+            self.imageShown.emit(index, fileName, page)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _step(self, index: int, page: int, direction: int) -> Optional[Tuple[int, int]]:
+        """ Position (file index, page) one page away in direction, or None at either end. """
+        if not 0 <= index < len(self._files):
+            return None
+        page += direction
+        if 0 <= page < self.pageCount(index):
+            return index, page
+        index += direction
+        if not 0 <= index < len(self._files):
+            return None
+        return index, 0 if direction > 0 else self.pageCount(index) - 1
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _prefetchKeys(self) -> List[Tuple[str, int]]:
+        """ (file name, page) of the next prefetchCount pages in the browsing direction. """
+        keys = []
+        position = (self._index, self._page)
+        for _ in range(self.prefetchCount):
+            position = self._step(*position, self._direction)
+            if position is None:
+                break
+            keys.append((self._files[position[0]], position[1]))
+        return keys
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _prefetch(self) -> None:
+        """ Decode ahead the next prefetchCount pages in the browsing direction. """
+        for key in self._prefetchKeys():
+            if key in self._cache or key in self._prefetching:
+                continue
+            self._prefetching.add(key)
+            self._loader.prefetch(*key)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _releaseFarPages(self) -> None:
+        """ Drop from the cache the pages of the current file that are far from the current page. """
+        fileName = self._files[self._index]
+        count = self.pageCount()
+        if count <= 2 * self.keepPages + 1:
+            return
+        for page in range(count):
+            if abs(page - self._page) > self.keepPages:
+                self._cache.remove((fileName, page))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onImageLoaded(self, image: QImage, fileName: str, page: int) -> None:
+        # El viewer ya muestra la imagen, aquí solo se guarda en la caché.
+        # _pageCounts contiene los ficheros de la carpeta que ya se han visitado o precargado
+        if fileName in self._pageCounts:
+            self._cache.put((fileName, page), image)
+        if (fileName, page) == (self.currentFile(), self._page):
+            # noinspection PyUnresolvedReferences
+            self.imageShown.emit(self._index, fileName, page)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onImagePrefetched(self, image: QImage, fileName: str, page: int) -> None:
+        key = (fileName, page)
+        self._prefetching.discard(key)
+        current = key == (self.currentFile(), self._page)
+        if image.isNull():
+            if current:
+                # Se vuelve a intentar por la vía normal para que el error llegue a loadFailed
+                self._loader.load(fileName, page)
+            return
+        if fileName in self._pageCounts:
+            self._cache.put(key, image)
+        if current:
+            self._viewer.setImage(image)
+            # noinspection PyUnresolvedReferences
+            self.imageShown.emit(self._index, fileName, page)
@@ -0,0 +1,127 @@
+# --------------------------------------------------------------------------------------------------------------
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from qtImageViewer import QtImageViewer
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class FrameStream(QObject):
+    """
+    Live display of frames produced by another thread (scanner, camera...) in a QtImageViewer.
+    Frames (QImage or ndarray, see QtImageViewer.setImage) are handed over with pushFrame() from any thread.
+    The stream is double buffered: the front frame is the one on screen and the back slot holds the
+    newest frame not shown yet. A frame arriving while the back slot is full replaces it and the old one
+    is counted as dropped, so the viewer always shows the newest frame and never builds a backlog.
+    Frames of the same size keep the current zoom and pan.
+    An ndarray frame is displayed without copying: the producer must not write into an array while it
+    is the front or back frame (handing over a new array per frame, or a ring of at least 3, is enough).
+    """
+
+    # Emitted on the GUI thread after a frame is shown, with the number of frames shown so far.
+    frameShown = Signal(int)
+
+    # Internal: wakes up the GUI thread when the back slot goes from empty to full.
+    _frameReady = Signal()
+
+    def __init__(self, viewer: QtImageViewer, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._viewer = viewer
+
+        self._lock = threading.Lock()
+        self._backFrame = None
+        self._frontFrame = None
+
+        self._received = 0
+        self._shown = 0
+        self._dropped = 0
+        self._startTime = None
+
+        self._producer = None
+        self._stopEvent = threading.Event()
+
+        # noinspection PyUnresolvedReferences
+        self._frameReady.connect(self._present)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def pushFrame(self, frame: Any) -> None:
+        """ Hand over a new frame. Thread safe and non-blocking. """
+        with self._lock:
+            if self._startTime is None:
+                self._startTime = time.perf_counter()
+            self._received += 1
+            wake = self._backFrame is None
+            if not wake:
+                self._dropped += 1
+            self._backFrame = frame
+
+        if wake:
+            # Solo hay un aviso pendiente como máximo: el GUI recoge siempre el último frame
+            # noinspection PyUnresolvedReferences
+            self._frameReady.emit()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def start(self, source: Iterable) -> None:
+        """ Iterate source (for example a camera generator) in a producer thread and push every frame. """
+        self.stop()
+        self._stopEvent.clear()
+        self._producer = threading.Thread(target=self._produce, args=(source,), name="FrameStream", daemon=True)
+        self._producer.start()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """ Stop the producer thread started with start(). Frames already pushed may still be shown. """
+        if self._producer is not None:
+            self._stopEvent.set()
+            self._producer.join(timeout)
+            self._producer = None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def isRunning(self) -> bool:
+        return self._producer is not None and self._producer.is_alive()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def statistics(self) -> dict:
+        """ Frames received, shown and dropped, and the rate at which frames are being shown. """
+        with self._lock:
+            elapsed = time.perf_counter() - self._startTime if self._startTime is not None else 0.0
+            return {
+                "received": self._received,
+                "shown": self._shown,
+                "dropped": self._dropped,
+                "fps": self._shown / elapsed if elapsed > 0 else 0.0,
+            }
+
+    # --------------------------------------------------------------------------------------------------------------
+    def resetStatistics(self) -> None:
+        with self._lock:
+            self._received = self._shown = self._dropped = 0
+            self._startTime = None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _produce(self, source: Iterable) -> None:
+        for frame in source:
+            if self._stopEvent.is_set():
+                break
+            self.pushFrame(frame)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _present(self) -> None:
+        """ GUI thread: swap the back frame to the front and show it. """
+        with self._lock:
+            frame = self._backFrame
+            self._backFrame = None
+        if frame is None:
+            return
+
+        self._viewer.setImage(frame)
+        self._frontFrame = frame
+
+        with self._lock:
+            self._shown += 1
+            shown = self._shown
+        # noinspection PyUnresolvedReferences
+        self.frameShown.emit(shown)
@@ -0,0 +1,227 @@
+# --------------------------------------------------------------------------------------------------------------
+import math
+from typing import Optional, Union, Tuple
+
+import numpy as np
+from PySide6.QtCore import QRectF
+from PySide6.QtGui import QImage, qGray
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# QImage format for each (dtype, channels) of an input array
+_ARRAY_FORMATS = {
+    (np.dtype(np.uint8), 1): QImage.Format_Grayscale8,
+    (np.dtype(np.uint16), 1): QImage.Format_Grayscale16,
+    (np.dtype(np.uint8), 3): QImage.Format_RGB888,
+    (np.dtype(np.uint8), 4): QImage.Format_RGBA8888,
+    (np.dtype(np.uint16), 4): QImage.Format_RGBA64,
+}
+# Qt has no 48-bit RGB format: uint16 RGB is copied into RGBX64 (see qimageFromArray)
+_PADDED_FORMATS = {
+    (np.dtype(np.uint16), 3): QImage.Format_RGBX64,
+}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def qimageFromArray(array: np.ndarray) -> QImage:
+    """ Wrap a C-contiguous ndarray in a QImage without copying the pixel data.
+    Accepts uint8/uint16 gray (h, w) or (h, w, 1), uint8 RGB (h, w, 3) and uint8/uint16 RGBA (h, w, 4).
+    The QImage points into the array memory: the array must stay alive and unchanged in size while
+    the QImage (or anything sharing it) is in use.
+    uint16 RGB (h, w, 3) has no matching QImage format: it is copied into a new Format_RGBX64 QImage
+    (8 bytes per pixel) that owns its memory, and the array can then be dropped.
+    Raises a RuntimeError for any other shape, dtype or memory layout.
+    """
+    if array.ndim == 2:
+        channels = 1
+    elif array.ndim == 3:
+        channels = array.shape[2]
+    else:
+        raise RuntimeError("qimageFromArray: Array must have shape (h, w) or (h, w, channels).")
+
+    height, width = array.shape[:2]
+    fmt = _PADDED_FORMATS.get((array.dtype, channels))
+    if fmt is not None:
+        image = QImage(width, height, fmt)
+        stride = image.bytesPerLine()
+        padded = np.frombuffer(image.bits(), dtype=np.uint8, count=stride * height).reshape(height, stride)
+        padded = padded.view(array.dtype)[:, :width * 4].reshape(height, width, 4)
+        padded[..., :channels] = array
+        padded[..., channels:] = np.iinfo(array.dtype).max
+        return image
+
+    fmt = _ARRAY_FORMATS.get((array.dtype, channels))
+    if fmt is None:
+        raise RuntimeError(f"qimageFromArray: Unsupported array of {array.dtype} with shape {array.shape}: use "
+                           f"uint8 or uint16 with 1 (gray), 3 (RGB) or 4 (RGBA) channels.")
+    if not array.flags.c_contiguous:
+        raise RuntimeError("qimageFromArray: Array must be C-contiguous (use numpy.ascontiguousarray).")
+
+    return QImage(array.data, width, height, array.strides[0], fmt)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class ImageBuffer:
+    """
+    Decoded source image kept resident together with a zero-copy NumPy view of its pixel data.
+    The view is built once from QImage.constBits() and shares memory with the QImage, so pixel lookups
+    are O(1) and region statistics are vectorized over a slice of the view, without converting the image.
+    Formats without a direct NumPy layout are converted once to ARGB32 when the buffer is created.
+    Array layout by format:
+        Mono / MonoLSB: (height, bytesPerLine) uint8 with 8 packed pixels per byte.
+        Grayscale8 / Indexed8: (height, width) uint8.   Grayscale16: (height, width) uint16.
+        RGB888: (height, width, 3) RGB.   RGBA8888*: (height, width, 4) RGBA.
+        RGBA64 / RGBX64: (height, width, 4) uint16 RGBA.
+        RGB32 / ARGB32*: (height, width, 4) in memory order, that is BGRA.
+    Pixel values and statistics are always reported as gray levels or RGB(A), whatever the memory order.
+    """
+
+    _BITS = {QImage.Format_Mono: "big", QImage.Format_MonoLSB: "little"}
+    _GRAY = (QImage.Format_Grayscale8, QImage.Format_Grayscale16)
+    _INDEXED = (QImage.Format_Mono, QImage.Format_MonoLSB, QImage.Format_Indexed8)
+    _BGRA = (QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied)
+    _RGBA = (QImage.Format_RGBA8888, QImage.Format_RGBX8888, QImage.Format_RGBA8888_Premultiplied,
+             QImage.Format_RGBA64, QImage.Format_RGBX64)
+    _SUPPORTED = _INDEXED + _GRAY + _BGRA + _RGBA + (QImage.Format_RGB888,)
+
+    def __init__(self, image: QImage, owner: Optional[np.ndarray] = None):
+        if image.format() not in self._SUPPORTED:
+            image = image.convertToFormat(QImage.Format_ARGB32)
+        self._image = image
+        # Array whose memory the image wraps (see qimageFromArray), kept alive with the buffer
+        self._owner = owner
+        self._format = image.format()
+        self._array = self._view(image)
+
+        # Tabla de colores a nivel de gris para imágenes indexadas (incluidas las bitonales)
+        self._lut = None
+        if self._format in self._INDEXED:
+            self._lut = np.array([qGray(color) for color in image.colorTable()] or [0, 255], dtype=np.uint8)
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _view(image: QImage) -> np.ndarray:
+        height, stride = image.height(), image.bytesPerLine()
+        raw = np.frombuffer(image.constBits(), dtype=np.uint8, count=stride * height).reshape(height, stride)
+
+        fmt = image.format()
+        width = image.width()
+        if fmt in ImageBuffer._BITS:
+            return raw
+        if fmt == QImage.Format_Grayscale16:
+            return raw.view(np.uint16)[:, :width]
+        if fmt in (QImage.Format_RGBA64, QImage.Format_RGBX64):
+            return raw.view(np.uint16)[:, :width * 4].reshape(height, width, 4)
+        if fmt == QImage.Format_RGB888:
+            return raw[:, :width * 3].reshape(height, width, 3)
+        if fmt in ImageBuffer._BGRA or fmt in ImageBuffer._RGBA:
+            return raw[:, :width * 4].reshape(height, width, 4)
+        return raw[:, :width]
+
+    # --------------------------------------------------------------------------------------------------------------
+    def image(self) -> QImage:
+        return self._image
+
+    # --------------------------------------------------------------------------------------------------------------
+    def array(self) -> np.ndarray:
+        """ Read-only NumPy view of the pixel data (see the class docstring for the layout). """
+        return self._array
+
+    # --------------------------------------------------------------------------------------------------------------
+    def width(self) -> int:
+        return self._image.width()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def height(self) -> int:
+        return self._image.height()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def channels(self) -> int:
+        """ 1 for gray level data, 3 for RGB and 4 for RGBA. """
+        if self._format in self._INDEXED or self._format in self._GRAY:
+            return 1
+        if self._format in (QImage.Format_RGB888, QImage.Format_RGB32, QImage.Format_RGBX8888):
+            return 3
+        return 4
+
+    # --------------------------------------------------------------------------------------------------------------
+    def pixel(self, x: float, y: float) -> Optional[Union[int, Tuple[int, ...]]]:
+        """ Value of the pixel containing scene point (x, y): a gray level or an RGB(A) tuple.
+        Returns None if the point is outside the image.
+        """
+        column, row = int(math.floor(x)), int(math.floor(y))
+        if not (0 <= column < self.width() and 0 <= row < self.height()):
+            return None
+
+        if self._format in self._BITS:
+            byte = int(self._array[row, column >> 3])
+            shift = 7 - (column & 7) if self._format == QImage.Format_Mono else column & 7
+            return int(self._lut[(byte >> shift) & 1])
+
+        value = self._array[row, column]
+        if self._lut is not None:
+            return int(self._lut[value])
+        if value.ndim == 0:
+            return int(value)
+        return tuple(int(v) for v in self._channelsRgb(value))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def region(self, rect: QRectF) -> np.ndarray:
+        """ Pixels covered by rect as gray levels (height, width) or RGB(A) (height, width, channels).
+        Returns a view into the buffer when the layout allows it, else a copy of just that region.
+        """
+        left, top, right, bottom = self._pixelBounds(rect)
+        if self._format in self._BITS:
+            packed = self._array[top:bottom, left >> 3:(right + 7) >> 3]
+            bits = np.unpackbits(packed, axis=1, bitorder=self._BITS[self._format])
+            offset = left & 7
+            return self._lut[bits[:, offset:offset + right - left]]
+
+        values = self._array[top:bottom, left:right]
+        if self._lut is not None:
+            return self._lut[values]
+        if values.ndim == 3:
+            return self._channelsRgb(values)
+        return values
+
+    # --------------------------------------------------------------------------------------------------------------
+    def regionStats(self, rect: QRectF, bins: int = 256) -> Optional[dict]:
+        """ Mean, min, max and histogram of the pixels covered by rect (clipped to the image).
+        For colour images every value is per channel and the histogram has shape (channels, bins).
+        Returns None if rect does not overlap the image.
+        """
+        values = self.region(rect)
+        if values.size == 0:
+            return None
+
+        samples = values.reshape(-1, self.channels()).T
+        top = 65536 if values.dtype == np.uint16 else 256
+        histogram = np.stack([np.histogram(channel, bins=bins, range=(0, top))[0] for channel in samples])
+
+        stats = {
+            "count": samples.shape[1],
+            "mean": samples.mean(axis=1),
+            "min": samples.min(axis=1),
+            "max": samples.max(axis=1),
+            "histogram": histogram,
+        }
+        if self.channels() == 1:
+            stats = {key: (value[0] if key != "count" else value) for key, value in stats.items()}
+        return stats
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _pixelBounds(self, rect: QRectF) -> Tuple[int, int, int, int]:
+        left = min(max(int(math.floor(rect.left())), 0), self.width())
+        top = min(max(int(math.floor(rect.top())), 0), self.height())
+        right = min(max(int(math.ceil(rect.right())), left), self.width())
+        bottom = min(max(int(math.ceil(rect.bottom())), top), self.height())
+        return left, top, right, bottom
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _channelsRgb(self, values: np.ndarray) -> np.ndarray:
+        """ Reorder the last axis to RGB(A) and drop the padding byte of RGB32/RGBX. """
+        channels = self.channels()
+        if self._format in self._BGRA:
+            order = [2, 1, 0, 3][:channels]
+            return values[..., order]
+        return values[..., :channels]
@@ -0,0 +1,85 @@
+# --------------------------------------------------------------------------------------------------------------
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from PySide6.QtGui import QImage
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class ImageCache:
+    """
+    LRU cache of decoded images limited by the total number of bytes they use.
+    Adding an image evicts the least recently used ones until the total fits in maxBytes again.
+    An image bigger than maxBytes on its own is not cached.
+    sizeOf gives the bytes of a cached value (QImage.sizeInBytes by default), so that other values such as
+    QPixmap tiles can be cached too.
+    """
+
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+    def __init__(self, maxBytes: int = DEFAULT_MAX_BYTES, sizeOf: Callable[[QImage], int] = QImage.sizeInBytes):
+        self._maxBytes = maxBytes
+        self._sizeOf = sizeOf
+        self._images = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    # --------------------------------------------------------------------------------------------------------------
+    def get(self, key: Hashable) -> Optional[QImage]:
+        """ Returns the cached image and marks it as most recently used, or None. """
+        image = self._images.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self._images.move_to_end(key)
+        self.hits += 1
+        return image
+
+    # --------------------------------------------------------------------------------------------------------------
+    def put(self, key: Hashable, image: QImage) -> None:
+        self.remove(key)
+        size = self._sizeOf(image)
+        if size > self._maxBytes:
+            return
+        self._images[key] = image
+        self._bytes += size
+        self._evict()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def remove(self, key: Hashable) -> None:
+        image = self._images.pop(key, None)
+        if image is not None:
+            self._bytes -= self._sizeOf(image)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def clear(self) -> None:
+        self._images.clear()
+        self._bytes = 0
+
+    # --------------------------------------------------------------------------------------------------------------
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._images
+
+    # --------------------------------------------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._images)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def sizeInBytes(self) -> int:
+        return self._bytes
+
+    # --------------------------------------------------------------------------------------------------------------
+    def maxBytes(self) -> int:
+        return self._maxBytes
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setMaxBytes(self, maxBytes: int) -> None:
+        self._maxBytes = maxBytes
+        self._evict()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _evict(self) -> None:
+        while self._bytes > self._maxBytes and self._images:
+            _, image = self._images.popitem(last=False)
+            self._bytes -= self._sizeOf(image)
@@ -0,0 +1,142 @@
+# --------------------------------------------------------------------------------------------------------------
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtGui import QImage
+
+import util
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class _DecodeSignals(QObject):
+    # request id, decoded image (null on error), file name, page, error message, decode seconds
+    finished = Signal(int, QImage, str, int, str, float)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class _DecodeTask(QRunnable):
+    """ Decodes one page of a file in a worker thread and reports back through its signals object. """
+
+    def __init__(self, loader: "ImageLoader", request: Optional[int], fileName: str, page: int):
+        super().__init__()
+        self.signals = _DecodeSignals()
+        self._loader = loader
+        self._request = request
+        self._fileName = fileName
+        self._page = page
+
+    def run(self) -> None:
+        # Si ya se ha pedido otra imagen no merece la pena decodificar esta
+        if self._request is not None and self._loader.isStale(self._request):
+            return
+        start = time.perf_counter()
+        image, error = util.decodeImage(self._fileName, self._page)
+        seconds = time.perf_counter() - start
+        request = self._request if self._request is not None else ImageLoader.PREFETCH
+        self.signals.finished.emit(request, image if image is not None else QImage(), self._fileName, self._page,
+                                   error, seconds)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class ImageLoader(QObject):
+    """
+    Decodes image files on a worker pool so the GUI thread never blocks on a large TIFF.
+    Only the most recent request is delivered: calling load() again, or cancel(), drops any
+    load still queued and discards the result of one already being decoded.
+    Results are delivered on the thread the loader lives in (normally the GUI thread).
+    prefetch() decodes ahead of time without cancelling or being cancelled by load(). Prefetches run at
+    PREFETCH_PRIORITY, below loads and the other work of the pool, and the queued ones can be dropped with
+    cancelPrefetches().
+    """
+
+    imageLoaded = Signal(QImage, str, int)  # image, file name, page
+    loadFailed = Signal(str, str)  # file name, error message
+    imagePrefetched = Signal(QImage, str, int)  # image (null on error), file name, page
+    decoded = Signal(str, int, float)  # file name, page, decode seconds: every decode, also prefetches and stale ones
+
+    # Request id reported by prefetch tasks
+    PREFETCH = -1
+    # Prioridad en el pool de las precargas: por debajo de las cargas (0) y de las miniaturas (-1)
+    PREFETCH_PRIORITY = -2
+
+    def __init__(self, parent: Optional[QObject] = None, threadPool: Optional[QThreadPool] = None):
+        super().__init__(parent)
+        self._threadPool = threadPool if threadPool is not None else QThreadPool.globalInstance()
+        self._request = 0
+        self._pendingTask = None
+        # Precargas sin terminar por (file name, page)
+        self._prefetchTasks = {}
+
+    # --------------------------------------------------------------------------------------------------------------
+    def load(self, fileName: str, page: int = 0) -> int:
+        """ Start decoding a page of fileName in the background, cancelling any previous load.
+        Returns the request id.
+        """
+        self.cancel()
+        task = _DecodeTask(self, self._request, fileName, page)
+        # noinspection PyUnresolvedReferences
+        task.signals.finished.connect(self._onFinished)
+        self._pendingTask = task
+        self._threadPool.start(task)
+        return self._request
+
+    # --------------------------------------------------------------------------------------------------------------
+    def prefetch(self, fileName: str, page: int = 0) -> None:
+        """ Decode a page of fileName in the background and report it through imagePrefetched
+        (null image on error).
+        """
+        task = _DecodeTask(self, None, fileName, page)
+        # noinspection PyUnresolvedReferences
+        task.signals.finished.connect(self._onFinished)
+        self._prefetchTasks[(fileName, page)] = task
+        self._threadPool.start(task, self.PREFETCH_PRIORITY)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def cancelPrefetches(self, keep: Iterable[Tuple[str, int]] = ()) -> List[Tuple[str, int]]:
+        """ Drop the queued prefetches of every (file name, page) not in keep. Those already being decoded
+        finish normally. Returns the (file name, page) of the dropped ones, which are never reported.
+        """
+        keep = set(keep)
+        dropped = []
+        for key in [key for key in self._prefetchTasks if key not in keep]:
+            if self._threadPool.tryTake(self._prefetchTasks[key]):
+                del self._prefetchTasks[key]
+                dropped.append(key)
+        return dropped
+
+    # --------------------------------------------------------------------------------------------------------------
+    def cancel(self) -> None:
+        """ Cancel the current load, if any. Its result will never be delivered. """
+        if self._pendingTask is not None:
+            self._threadPool.tryTake(self._pendingTask)
+            self._pendingTask = None
+        self._request += 1
+
+    # --------------------------------------------------------------------------------------------------------------
+    def isLoading(self) -> bool:
+        return self._pendingTask is not None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def isStale(self, request: int) -> bool:
+        """ Returns whether a newer request has replaced this one. Safe to call from worker threads. """
+        return request != self._request
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onFinished(self, request: int, image: QImage, fileName: str, page: int, error: str, seconds: float) -> None:
+        # noinspection PyUnresolvedReferences
+        self.decoded.emit(fileName, page, seconds)
+        if request == self.PREFETCH:
+            self._prefetchTasks.pop((fileName, page), None)
+            # noinspection PyUnresolvedReferences
+            self.imagePrefetched.emit(image, fileName, page)
+            return
+        if self.isStale(request):
+            return
+        self._pendingTask = None
+        if image.isNull():
+            # noinspection PyUnresolvedReferences
+            self.loadFailed.emit(fileName, error)
+        else:
+            # noinspection PyUnresolvedReferences
+            self.imageLoaded.emit(image, fileName, page)
@@ -1,3 +1,9 @@
+import time
+
+# Origen de los tiempos de arranque: antes de las importaciones
+STARTUP = time.perf_counter()
+
+import argparse
 import ctypes
 import sys
 
@@ -5,19 +11,51 @@ from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QApplication
 
 from main_window import MainWindow
+from render_stats import StartupTimer
 
 import resources
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    # Opciones propias; el resto de argumentos son para Qt
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--record-session', metavar='FILE', default=None,
+                        help='Record the input of the session to FILE (see benchmarks/replay_session.py)')
+    parser.add_argument('--startup-timing', action='store_true',
+                        help='Print the time to first paint and to interactive')
+    parser.add_argument('--quit-after-startup', action='store_true', help='Quit once interactive (for benchmarks)')
+    options, qtArgs = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qtArgs)
     app.setStyle('Fusion')
     app.setWindowIcon(QIcon(':/icons/app_icon'))
 
-    # Código para cambiar el icono de la aplicación en la barra de tareas
-    my_app_id = "designer"
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(my_app_id)
+    # Código para cambiar el icono de la aplicación en la barra de tareas (solo existe en Windows)
+    if sys.platform == 'win32':
+        my_app_id = "designer"
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(my_app_id)
 
+    timer = StartupTimer(STARTUP)
     window = MainWindow()
+    # La ventana está completa: interactiva en cuanto se pinte y se vacíe la cola de eventos
+    timer.setInteractive()
+    timer.watch(window)
     window.show()
-    sys.exit(app.exec())
 
+    if options.startup_timing:
+        # noinspection PyUnresolvedReferences
+        timer.finished.connect(lambda: print(timer.report(), file=sys.stderr))
+    if options.quit_after_startup:
+        # noinspection PyUnresolvedReferences
+        timer.finished.connect(app.quit)
+
+    recorder = None
+    if options.record_session is not None:
+        from session_replay import SessionRecorder
+        recorder = SessionRecorder(window)
+        recorder.start()
+
+    result = app.exec()
+    if recorder is not None:
+        recorder.stop()
+        recorder.save(options.record_session)
+    sys.exit(result)
@@ -8,12 +8,13 @@ from qtImageViewer import QtImageViewer
 
 
 # Custom slot for handling mouse clicks in our viewer.
-# Just prints the (row, column) matrix index of the
-# image pixel that was clicked on.
+# Prints the (row, column) matrix index of the image pixel
+# that was clicked on and its value, read from the viewer's
+# resident image buffer (no image conversion per click).
 def handleLeftClick(x, y):
     row = int(y)
     column = int(x)
-    print(f"Pixel (row={row}, column={column})")
+    print(f"Pixel (row={row}, column={column}) = {viewer.pixelValue(x, y)}")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
+import os
+
 from PySide6.QtCore import QSize
 from PySide6.QtGui import QAction, Qt, QActionGroup, QIcon
-from PySide6.QtWidgets import QMainWindow, QToolBar
+from PySide6.QtWidgets import QMainWindow, QToolBar, QDockWidget, QFileDialog
 
 import util
 
@@ -11,6 +13,8 @@ import util
 # Main Window
 # Implementing designer funcionality
 # ----------------------------------------------------------------------------------------------------------------------
+from components.thumbnail_strip import ThumbnailStrip
+from folder_browser import FolderBrowser
 from qtImageViewer import QtImageViewer
 
 
@@ -18,10 +22,13 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.viewer = None
+        self.browser = None
+        self.thumbnails = None
         self.setWindowTitle("Form Designer")
         self.setMinimumSize(1280, 1024)
 
         self.create_viewer()
+        self.create_thumbnail_strip()
         self.create_menubar()
         self.create_statusbar()
 
@@ -36,6 +43,7 @@ class MainWindow(QMainWindow):
 
         file_menu = menu.addMenu("File")
         edit_menu = menu.addMenu("Edit")
+        view_menu = menu.addMenu("View")
 
         # Add action to file menu
         open_file = QAction(QIcon(":/icons/open_icon"), "Open Image File", self)
@@ -44,6 +52,44 @@ class MainWindow(QMainWindow):
         file_menu.addAction(open_file)
         toolbar.addAction(open_file)
 
+        open_folder = QAction("Open Image Folder", self)
+        open_folder.setShortcut("Ctrl+Shift+O")
+        open_folder.triggered.connect(self.open_folder)
+        file_menu.addAction(open_folder)
+
+        # Form templates
+        file_menu.addSeparator()
+        open_template = QAction("Open Template", self)
+        open_template.setShortcut("Ctrl+T")
+        open_template.triggered.connect(self.open_template)
+        file_menu.addAction(open_template)
+
+        save_template = QAction("Save Template As", self)
+        save_template.setShortcut("Ctrl+Shift+S")
+        save_template.triggered.connect(self.save_template)
+        file_menu.addAction(save_template)
+
+        set_reference = QAction("Set Image as Template Reference", self)
+        set_reference.triggered.connect(self.set_reference_image)
+        file_menu.addAction(set_reference)
+
+        align_fields = QAction("Align Fields to Image", self)
+        align_fields.setShortcut("Ctrl+Shift+A")
+        align_fields.triggered.connect(self.align_fields)
+        file_menu.addAction(align_fields)
+
+        # Folder navigation
+        file_menu.addSeparator()
+        previous_image = QAction("Previous Image", self)
+        previous_image.setShortcut("PgUp")
+        previous_image.triggered.connect(self.browser.previous)
+        file_menu.addAction(previous_image)
+
+        next_image = QAction("Next Image", self)
+        next_image.setShortcut("PgDown")
+        next_image.triggered.connect(self.browser.next)
+        file_menu.addAction(next_image)
+
         # Add QActionGroup to edit menu
         viewer_mode_normal = QAction(QIcon(":/icons/normal_mode_icon"), "Normal mode", self)
         viewer_mode_normal.setCheckable(True)
@@ -71,6 +117,58 @@ class MainWindow(QMainWindow):
         delete_sel_items.triggered.connect(self.viewer.deleteSelectedItems)
         edit_menu.addAction(delete_sel_items)
 
+        duplicate_sel_items = QAction("Duplicate Selected Items", self)
+        duplicate_sel_items.setShortcut("Ctrl+D")
+        duplicate_sel_items.triggered.connect(lambda: self.viewer.duplicateSelectedFields())
+        edit_menu.addAction(duplicate_sel_items)
+
+        detect_fields = QAction("Detect Fields", self)
+        detect_fields.setShortcut("Ctrl+Shift+D")
+        detect_fields.triggered.connect(self.detect_fields)
+        edit_menu.addAction(detect_fields)
+
+        align_menu = edit_menu.addMenu("Align Selected Items")
+        for name, alignment in (("Left", Qt.AlignLeft), ("Horizontal Center", Qt.AlignHCenter),
+                                ("Right", Qt.AlignRight), ("Top", Qt.AlignTop),
+                                ("Vertical Center", Qt.AlignVCenter), ("Bottom", Qt.AlignBottom)):
+            align = QAction(name, self)
+            align.triggered.connect(lambda checked=False, a=alignment: self.viewer.alignSelectedFields(a))
+            align_menu.addAction(align)
+
+        # Zoom: animated around the centre of the view, and back and forward through the zoom history
+        zoom_in = QAction("Zoom In", self)
+        zoom_in.setShortcut("Ctrl++")
+        zoom_in.triggered.connect(lambda: self.viewer.zoomBy(QtImageViewer.ZOOM_STEP))
+        view_menu.addAction(zoom_in)
+
+        zoom_out = QAction("Zoom Out", self)
+        zoom_out.setShortcut("Ctrl+-")
+        zoom_out.triggered.connect(lambda: self.viewer.zoomBy(1 / QtImageViewer.ZOOM_STEP))
+        view_menu.addAction(zoom_out)
+
+        view_menu.addSeparator()
+        zoom_back = QAction("Previous Zoom", self)
+        zoom_back.setShortcut("Alt+Left")
+        zoom_back.triggered.connect(self.viewer.zoomBack)
+        view_menu.addAction(zoom_back)
+
+        zoom_forward = QAction("Next Zoom", self)
+        zoom_forward.setShortcut("Alt+Right")
+        zoom_forward.triggered.connect(self.viewer.zoomForward)
+        view_menu.addAction(zoom_forward)
+
+        # Render statistics of the viewer, to see why it lags on a given machine
+        view_menu.addSeparator()
+        render_stats = QAction("Show Render Statistics", self)
+        render_stats.setCheckable(True)
+        render_stats.setShortcut("Ctrl+Shift+R")
+        render_stats.toggled.connect(lambda checked: self.viewer.setRenderStatsEnabled(checked, overlay=checked))
+        view_menu.addAction(render_stats)
+
+        save_render_stats = QAction("Save Render Statistics", self)
+        save_render_stats.triggered.connect(self.save_render_stats)
+        view_menu.addAction(save_render_stats)
+
         toolbar.addSeparator()
         toolbar.addAction(delete_sel_items)
 
@@ -93,13 +191,159 @@ class MainWindow(QMainWindow):
         self.viewer.canPan = True
         self.viewer.canZoom = True
 
+        # Los formularios escaneados son grandes: solo se pintan los tiles visibles
+        self.viewer.tiledRendering = True
+
         self.setCentralWidget(self.viewer)
 
+        # Navegación por carpeta, con caché de imágenes decodificadas y precarga de las siguientes
+        self.browser = FolderBrowser(self.viewer, self)
+        # noinspection PyUnresolvedReferences
+        self.browser.currentChanged.connect(self.image_changed)
+        # noinspection PyUnresolvedReferences
+        self.browser.imageShown.connect(self.image_loaded)
+        # noinspection PyUnresolvedReferences
+        self.viewer.imageLoader().loadFailed.connect(self.image_load_failed)
+        # Puntuación de relleno en vivo del campo en edición
+        # noinspection PyUnresolvedReferences
+        self.viewer.fieldsChanged.connect(self.field_score)
+        # noinspection PyUnresolvedReferences
+        self.viewer.fieldsDetected.connect(self.fields_detected)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Create thumbnail strip for the browsed folder
+    def create_thumbnail_strip(self):
+        self.thumbnails = ThumbnailStrip()
+        # noinspection PyUnresolvedReferences
+        self.thumbnails.fileActivated.connect(self.browser.goTo)
+        # noinspection PyUnresolvedReferences
+        self.browser.folderOpened.connect(self.folder_opened)
+        # noinspection PyUnresolvedReferences
+        self.browser.currentChanged.connect(self.thumbnail_follow)
+
+        dock = QDockWidget("Thumbnails", self)
+        dock.setObjectName("thumbnails_dock")
+        dock.setAllowedAreas(Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea)
+        dock.setWidget(self.thumbnails)
+        self.addDockWidget(Qt.LeftDockWidgetArea, dock)
+
+    def folder_opened(self, folder_name):
+        self.thumbnails.setFiles(self.browser.files())
+
+    def thumbnail_follow(self, index, file_name, page):
+        # El archivo que se abre se vuelve a comprobar por si ha cambiado en disco
+        self.thumbnails.invalidate([index])
+        self.thumbnails.setCurrentRow(index)
+
     # ------------------------------------------------------------------------------------------------------------------
     # Open image in designer
     def open_file(self):
-        image, name = util.loadImageFromFile(self, "sample_images")
+        file_name = util.getImageFileName(self, "sample_images")
+
+        if len(file_name):
+            # La imagen se decodifica en segundo plano, el viewer la muestra cuando está lista.
+            # Se navega por su carpeta para poder pasar a la siguiente/anterior
+            self.browser.open(file_name)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Open a folder and show its first image
+    def open_folder(self):
+        folder_name = util.getImageFolderName(self, "sample_images")
+
+        if len(folder_name) and not self.browser.open(folder_name):
+            self.statusBar().showMessage("No images found in " + folder_name)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Load / save the fields of a form template
+    def open_template(self):
+        file_name = util.getTemplateFileName(self, "templates")
+
+        if len(file_name):
+            try:
+                self.viewer.loadTemplate(file_name)
+            except (OSError, RuntimeError) as e:
+                self.statusBar().showMessage("Error loading template " + os.path.basename(file_name) + ": " + str(e))
+                return
+            self.statusBar().showMessage("Template loaded: {} ({} fields)".format(
+                os.path.basename(file_name), len(self.viewer.fieldStore())))
+
+    def save_template(self):
+        file_name = util.getTemplateFileName(self, "templates", save=True)
+
+        if len(file_name):
+            try:
+                self.viewer.saveTemplate(file_name)
+            except (OSError, RuntimeError) as e:
+                self.statusBar().showMessage("Error saving template " + os.path.basename(file_name) + ": " + str(e))
+                return
+            self.statusBar().showMessage("Template saved: " + os.path.basename(file_name))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Dump of the render statistics recorded so far
+    def save_render_stats(self):
+        file_name, selected = QFileDialog.getSaveFileName(self, "Save render statistics.",
+                                                          filter="JSON files (*.json);;CSV files (*.csv)")
+        if not len(file_name):
+            return
+        if not os.path.splitext(file_name)[1]:
+            file_name += ".csv" if "csv" in selected else ".json"
+        try:
+            self.viewer.renderStats().dump(file_name)
+        except OSError as e:
+            self.statusBar().showMessage("Error saving render statistics: " + str(e))
+            return
+        self.statusBar().showMessage("Render statistics saved: " + os.path.basename(file_name))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Automatic fields from the boxes and lines of a blank form
+    def detect_fields(self):
+        if self.viewer.detectFields():
+            self.statusBar().showMessage("Detecting fields...")
+
+    def fields_detected(self, count):
+        self.statusBar().showMessage("{} fields detected".format(count))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Registration of the template fields onto the current image
+    def set_reference_image(self):
+        if self.viewer.setReferenceImage():
+            self.statusBar().showMessage("Current image set as the template reference")
+
+    def align_fields(self):
+        if not self.viewer.hasReferenceImage():
+            self.statusBar().showMessage("Set a template reference image first")
+            return
+        alignment = self.viewer.alignFieldsToImage()
+        if alignment is not None:
+            self.statusBar().showMessage("Fields aligned: shift ({:.1f}, {:.1f}), rotation {:.2f} deg, "
+                                         "scale {:.3f}".format(alignment.dx, alignment.dy, alignment.angle,
+                                                               alignment.scale))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Fill score (ink density) of the field being edited
+    def field_score(self):
+        score = self.viewer.fieldScore()
+        if score is None:
+            return
+        field_id = self.viewer.editingField()
+        name = self.viewer.fieldStore().name(field_id)
+        label = "Field {}".format(field_id) + (" ({})".format(name) if name else "")
+        self.statusBar().showMessage("{}: fill {:.1%}".format(label, score))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Current image changed / shown
+    def image_changed(self, index, file_name, page):
+        self.statusBar().showMessage(self.image_status("Loading image: ", index, file_name, page))
+
+    def image_loaded(self, index, file_name, page):
+        self.statusBar().showMessage(self.image_status("Image loaded: ", index, file_name, page))
+
+    def image_status(self, prefix, index, file_name, page):
+        status = prefix + os.path.basename(file_name)
+        page_count = self.browser.pageCount(index)
+        if page_count > 1:
+            status += " page {}/{}".format(page + 1, page_count)
+        return status + " ({}/{})".format(index + 1, len(self.browser.files()))
 
-        if image is not None:
-            self.viewer.setImage(image)
-            self.statusBar().showMessage("Image loaded: " + name)
+    def image_load_failed(self, file_name, error):
+        self.statusBar().showMessage("Error loading image " + os.path.basename(file_name) + ": " + error)
@@ -1,17 +1,31 @@
 """
 QtImageViewer.py: PyQt image viewer widget for a QPixmap in a QGraphicsView scene with mouse zooming and panning.
 """
+import math
 import os
 import sys
-from typing import Optional, Any
+import time
+from contextlib import contextmanager
+from typing import Optional, Any, Iterable
 
+import numpy as np
 import PySide6
-from PySide6.QtCore import Signal, QRectF, QSizeF
-from PySide6.QtGui import Qt, QPixmap, QImage, QPainterPath, QTransform, QBrush, QPen, QColor
-from PySide6.QtWidgets import QGraphicsView, QGraphicsScene, QApplication, QFileDialog, QGraphicsRectItem, \
-    QGraphicsItem, QMessageBox
+from PySide6.QtCore import Signal, QEvent, QRect, QRectF, QSizeF, QPointF, QThreadPool, QTimer
+from PySide6.QtGui import Qt, QPixmap, QImage, QTransform, QPainter
+from PySide6.QtWidgets import QGraphicsView, QGraphicsScene, QApplication, QFileDialog, \
+    QGraphicsItem, QMessageBox, QRubberBand
 
+from components.field_overlay_item import FieldOverlayItem
 from components.resize_rect import ResizableRect
+from components.tiled_image_item import TiledImageItem
+import template_io
+from field_detection import FieldDetectionTask
+from field_store import FieldStore
+from fill_scorer import FillScorer
+from image_buffer import ImageBuffer, qimageFromArray
+from image_loader import ImageLoader
+from registration import Alignment, Registration
+from render_stats import PaintTimer, RenderStats, timed
 
 __author__ = "NBL"
 __version__ = "1.0"
@@ -22,15 +36,22 @@ __version__ = "1.0"
 class QtImageViewer(QGraphicsView):
     """
     PyQt image viewer widget for a QPixmap in a QGraphicsView scene with mouse zooming and panning.
-    Displays a QImage or QPixmap (QImage is internally converted to a QPixmap).
-    To display any other image format, you must first convert it to a QImage or QPixmap.
+    Displays a QImage, QPixmap or NumPy ndarray (QImage is internally converted to a QPixmap).
+    With tiledRendering enabled, the image is drawn from a multi-resolution pyramid of tiles (TiledImageItem).
+    Bilevel and grayscale QImages always take that path, so they stay resident in their native format.
+    C-contiguous uint8/uint16 ndarrays (gray, RGB, RGBA) are wrapped without copying (see qimageFromArray)
+    and also take that path, except uint16 RGB, which has no matching QImage format and is copied once.
+    To display any other image format, you must first convert it to one of the above.
     Some useful image format conversion utilities:
-        qimage2ndarray: NumPy ndarray <==> QImage    (https://github.com/hmeine/qimage2ndarray)
         ImageQt: PIL Image <==> QImage  (https://github.com/python-pillow/Pillow/blob/master/PIL/ImageQt.py)
     Mouse interaction:
         Left mouse button drag: Pan image.
         Right mouse button drag: Zoom box.
         Right mouse button doubleclick: Zoom to show entire image.
+        Mouse wheel, pinch: Zoom in or out around the cursor, animated (see zoomBy()).
+        Back and forward mouse buttons: Previous or next zoom of zoomStack (see zoomBack(), zoomForward()).
+    While zooming the image is drawn in draft quality (no smoothing, no cache rebuilt) and smoothly again
+    ZOOM_IDLE_MS after the zoom stops, so the animation keeps up with the display on full-page scans.
     """
 
     # Mouse button signals emit image scene (x, y) coordinates.
@@ -42,9 +63,29 @@ class QtImageViewer(QGraphicsView):
     leftMouseButtonDoubleClicked = Signal(float, float)
     rightMouseButtonDoubleClicked = Signal(float, float)
 
+    # Emitted after the fields were added, removed, (de)selected or edited, also while one is dragged.
+    fieldsChanged = Signal()
+    # Emitted when detectFields() finishes, with the number of fields added.
+    fieldsDetected = Signal(int)
+
     # Image viewer modes
     VIEWER_MODE, DESIGN_MODE = list(range(2))
 
+    # Brushes of the design rectangles (fields), normal and selected
+    FIELD_BRUSH = FieldOverlayItem.BRUSH
+    SELECTED_FIELD_BRUSH = FieldOverlayItem.SELECTED_BRUSH
+
+    # Zoom factor of one wheel notch, largest zoom (screen pixels per image pixel), interval between animation
+    # frames, time constant of the animation (seconds) and time without zooming before drawing smoothly again
+    ZOOM_STEP = 1.25
+    MAX_ZOOM = 32.0
+    ZOOM_FRAME_MS = 16
+    ZOOM_TIME_CONSTANT = 0.04
+    ZOOM_IDLE_MS = 150
+
+    # Refresh interval of the render statistics overlay
+    STATS_OVERLAY_MS = 250
+
     # ------------------------------------------------------------------------------------------------------------------
     # Constructor
     def __init__(self):
@@ -53,11 +94,31 @@ class QtImageViewer(QGraphicsView):
         # Image is displayed as QPixmap in a QGraphicsScene attached to this QGraphicsView.
         self.scene = QGraphicsScene()
         self.setScene(self.scene)
-        # noinspection PyUnresolvedReferences
-        self.scene.selectionChanged.connect(self.selectionChanged)
+        # Only the areas that changed are repainted (old and new bounding rect of a dragged field), never the
+        # bounding rect of all of them as SmartViewportUpdate may choose
+        self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        # Smooth image while idle, see _setDraft(). A resize keeps the centre of the zoomed view
+        self.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
 
         # Store a local handle to the scene's current image pixmap.
         self._pixmapHandle = None
+        # Rectangle of the image currently shown (None until the first setImage or after clearImage).
+        self._imageRect = None
+
+        # Decoded source image kept resident, and its NumPy view (built on first query).
+        # _sourceArray keeps alive the ndarray passed to setImage(), whose memory the source image wraps.
+        self._sourceImage = None
+        self._sourceArray = None
+        self._buffer = None
+        self._scorer = None
+
+        # Template registration: reference image the fields were placed on, and alignment of the fields to the
+        # current image (identity while they are where the template put them)
+        self._registration = None
+        self._alignment = Alignment()
+        # Last field detection started: results of older ones, or for another image, are dropped
+        self._detectRequest = 0
 
         # Image aspect ratio mode.
         # !!! ONLY applies to full image. Aspect ratio is always ignored when zooming.
@@ -73,12 +134,55 @@ class QtImageViewer(QGraphicsView):
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
 
-        # Stack of QRectF zoom boxes in scene coordinates
+        # Stack of QRectF zoom boxes in scene coordinates, and the ones left by zoomBack() for zoomForward()
         self.zoomStack = []
+        self._zoomForward = []
+
+        # Wheel and pinch zoom: scale the animation goes to, scene point kept under a viewport point, and
+        # whether a zoom is in progress (animating or waiting for ZOOM_IDLE_MS before it is recorded)
+        self._zoomTarget = 1.0
+        self._zoomAnchor = QPointF()
+        self._zoomAnchorScene = QPointF()
+        self._zoomTime = 0.0
+        self._zooming = False
+        self._zoomTimer = QTimer(self)
+        self._zoomTimer.setInterval(self.ZOOM_FRAME_MS)
+        # noinspection PyUnresolvedReferences
+        self._zoomTimer.timeout.connect(self._zoomFrame)
+        self._idleTimer = QTimer(self)
+        self._idleTimer.setSingleShot(True)
+        self._idleTimer.setInterval(self.ZOOM_IDLE_MS)
+        # noinspection PyUnresolvedReferences
+        self._idleTimer.timeout.connect(self._finishZoom)
+
+        # Zoom box drawn while dragging with the right button: a widget over the viewport, so it does not go
+        # through the scene (its selection area would select and deselect every field it crosses)
+        self._zoomBand = None
+        self._zoomOrigin = None
 
         # Flags for enabling/disabling mouse interaction
         self.canZoom = True
         self.canPan = True
+        # Touch screen pinch zoom (touchpad pinch arrives as native gestures, see viewportEvent())
+        self.viewport().grabGesture(Qt.PinchGesture)
+
+        # Tiled rendering: the image is drawn from a pyramid of tiles and only the visible ones are painted.
+        # Recommended for large scans. Takes effect on the next call to setImage().
+        self.tiledRendering = False
+
+        # Opt-in render statistics (see setRenderStatsEnabled()). The paint timer is only installed while enabled
+        self._renderStats = RenderStats()
+        self._renderStats.setMemorySource(lambda: self.memoryReport().get("total", 0))
+        self._paintTimer = None
+        self._statsTimer = QTimer(self)
+        self._statsTimer.setInterval(self.STATS_OVERLAY_MS)
+
+        # Background decoder used by loadImageFromFile(). A new load cancels the previous one.
+        self._loader = ImageLoader(self)
+        # noinspection PyUnresolvedReferences
+        self._loader.imageLoaded.connect(self._onImageLoaded)
+        # noinspection PyUnresolvedReferences
+        self._loader.decoded.connect(self._onImageDecoded)
 
         # Image viewer mode
         self._mode = self.VIEWER_MODE
@@ -86,6 +190,18 @@ class QtImageViewer(QGraphicsView):
         # Utilizo este valor para puntero del rectangulo que está activo para crearlo
         self._current_rect_item = None
         self._start_point = None
+        # Last rectangle of the editor reported by fieldsChanged while dragging
+        self._draggedRect = QRectF()
+
+        # Design rectangles (fields), all drawn by one overlay item above the image
+        self._fields = FieldStore()
+        self._overlay = FieldOverlayItem(self._fields)
+        self.scene.addItem(self._overlay)
+        # Item (and field id) of the field being edited with the mouse, see _editField()
+        self._editor = None
+        self._editedField = None
+        # Depth of nested batchEdit() blocks. The fields are repainted once, when the outermost ends
+        self._batchDepth = 0
 
     # --------------------------------------------------------------------------------------------------------------
     # Functions
@@ -99,6 +215,12 @@ class QtImageViewer(QGraphicsView):
         if self.hasImage():
             self.scene.removeItem(self._pixmapHandle)
             self._pixmapHandle = None
+        self._imageRect = None
+        self._sourceImage = None
+        self._sourceArray = None
+        self._buffer = None
+        self._scorer = None
+        self._detectRequest += 1
 
     # --------------------------------------------------------------------------------------------------------------
     def pixmap(self) -> Optional[Any]:
@@ -109,32 +231,205 @@ class QtImageViewer(QGraphicsView):
 
     # --------------------------------------------------------------------------------------------------------------
     def image(self) -> Optional[Any]:
-        """ Returns the scene's current image pixmap as a QImage, or else None if no image exists."""
+        """ Returns the scene's current image as a QImage, or else None if no image exists.
+        The source image is kept resident, so there is no conversion per call.
+        """
         if self.hasImage():
-            return self._pixmapHandle.pixmap().toImage()
+            if self._sourceImage is None:
+                # Solo ocurre si se ha pasado un QPixmap: se convierte una única vez
+                self._sourceImage = self._pixmapHandle.pixmap().toImage()
+            return self._sourceImage
         return None
 
     # --------------------------------------------------------------------------------------------------------------
+    def imageBuffer(self) -> Optional[ImageBuffer]:
+        """ Returns the resident source buffer with its NumPy view, or else None if no image exists."""
+        if self._buffer is None and self.hasImage():
+            self._buffer = ImageBuffer(self.image(), owner=self._sourceArray)
+        return self._buffer
+
+    # --------------------------------------------------------------------------------------------------------------
+    def imageArray(self) -> Optional[Any]:
+        """ Returns a read-only NumPy view of the source pixels (layout documented in ImageBuffer)."""
+        buffer = self.imageBuffer()
+        return buffer.array() if buffer is not None else None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def pixelValue(self, x: float, y: float) -> Optional[Any]:
+        """ Returns the gray level or RGB(A) tuple of the image pixel at scene (x, y), or None if outside."""
+        buffer = self.imageBuffer()
+        return buffer.pixel(x, y) if buffer is not None else None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def regionStats(self, rect: QRectF) -> Optional[dict]:
+        """ Returns mean, min, max and histogram of the image pixels inside a scene rectangle."""
+        buffer = self.imageBuffer()
+        return buffer.regionStats(rect) if buffer is not None else None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def fillScorer(self) -> Optional[FillScorer]:
+        """ Returns the fill scorer (summed-area table of ink) of the image, built on first use, or None."""
+        buffer = self.imageBuffer()
+        if self._scorer is None and buffer is not None:
+            self._scorer = FillScorer(buffer)
+        return self._scorer
+
+    # --------------------------------------------------------------------------------------------------------------
+    def fieldScore(self, fieldId: Optional[int] = None) -> Optional[float]:
+        """ Returns the fill score (fraction of ink pixels) of a field, by default the one being edited.
+        Follows the editor while the field is dragged. None if there is no such field or no image.
+        """
+        fieldId = self._editedField if fieldId is None else fieldId
+        if fieldId is None:
+            return None
+        rect = self._editor.rect() if fieldId == self._editedField else self._fields.rect(fieldId)
+        scorer = self.fillScorer()
+        return scorer.score(rect) if rect is not None and scorer is not None else None
+
+    # --------------------------------------------------------------------------------------------------------------
+    @timed("upload")
     def setImage(self, image: Any) -> None:
         """
-        Set the scene's current image pixmap to the input QImage or QPixmap.
-        Raises a RuntimeError if the input image has type other than QImage or QPixmap.
-        type image: QImage | QPixmap
+        Set the scene's current image pixmap to the input QImage, QPixmap or ndarray.
+        With tiledRendering enabled the image is shown through a TiledImageItem instead of a single pixmap.
+        Bilevel and grayscale QImages are always shown that way, so they are never expanded to 32 bits.
+        An ndarray is wrapped without copying and is kept alive for as long as it is displayed;
+        it must not be resized or freed meanwhile.
+        Raises a RuntimeError if the input image has type other than QImage, QPixmap or a supported ndarray.
+        type image: QImage | QPixmap | numpy.ndarray
         """
+        array = None
+        if isinstance(image, np.ndarray):
+            array = image
+            image = qimageFromArray(array)
+
+        if self.tiledRendering or array is not None \
+                or (type(image) is QImage and TiledImageItem.isCompactFormat(image)):
+            self._setTiledImage(image)
+            self._setSourceImage(image, array)
+            return
+
         if type(image) is QPixmap:
             pixmap = image
         elif type(image) is QImage:
             pixmap = QPixmap.fromImage(image)
         else:
-            raise RuntimeError("ImageViewer.setImage: Argument must be a QImage or QPixmap.")
+            raise RuntimeError("ImageViewer.setImage: Argument must be a QImage, QPixmap or ndarray.")
+
+        if isinstance(self._pixmapHandle, TiledImageItem):
+            self.clearImage()
 
         if self.hasImage():
             self._pixmapHandle.setPixmap(pixmap)
         else:
             self._pixmapHandle = self.scene.addPixmap(pixmap)
+            self._pixmapHandle.setZValue(-1)  # Always below the design rectangles
+            self._pixmapHandle.setTransformationMode(Qt.SmoothTransformation)
 
-        self.setSceneRect(QRectF(pixmap.rect()))  # Set scene size to image size.
-        self.updateViewer()
+        self._setSourceImage(image)
+        self._setImageRect(QRectF(pixmap.rect()))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _setTiledImage(self, image: Any) -> None:
+        """ Show the image through a TiledImageItem. Same scene coordinates as the single pixmap item. """
+        if type(image) is QPixmap:
+            image = image.toImage()
+        elif type(image) is not QImage:
+            raise RuntimeError("ImageViewer.setImage: Argument must be a QImage, QPixmap or ndarray.")
+
+        if isinstance(self._pixmapHandle, TiledImageItem):
+            self._pixmapHandle.setImage(image)
+        else:
+            self.clearImage()
+            self._pixmapHandle = TiledImageItem(image)
+            self._pixmapHandle.setZValue(-1)  # Always below the design rectangles
+            self.scene.addItem(self._pixmapHandle)
+
+        self._setImageRect(QRectF(image.rect()))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _setImageRect(self, rect: QRectF) -> None:
+        """ Set scene size to image size. The view (fit or zoom) is only recomputed when the size changes,
+        so consecutive frames of the same size keep the current zoom and pan.
+        """
+        if rect != self._imageRect:
+            self._imageRect = rect
+            self.setSceneRect(rect)
+            self.updateViewer()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _setSourceImage(self, image: Any, array: Optional[np.ndarray] = None) -> None:
+        """ Keep the decoded QImage resident. For a QPixmap it is only converted when first queried. """
+        self._sourceImage = image if type(image) is QImage else None
+        self._sourceArray = array
+        self._buffer = None
+        self._scorer = None
+        self._detectRequest += 1
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _isImageItem(self, item: Optional[QGraphicsItem]) -> bool:
+        """ Returns whether the item is the one showing the image (single pixmap or tiled). """
+        return item is not None and item is self._pixmapHandle
+
+    # --------------------------------------------------------------------------------------------------------------
+    def memoryReport(self) -> dict:
+        """ Bytes used by the displayed image, split into source, pyramid levels, pixmap tiles and fit cache.
+        'argb32' is what the same image takes as a single 32-bit pixmap, for comparison.
+        """
+        if not self.hasImage():
+            return {}
+
+        if isinstance(self._pixmapHandle, TiledImageItem):
+            report = self._pixmapHandle.memoryUsage()
+            image = self._pixmapHandle.image()
+            report["format"] = image.format().name
+        else:
+            pixmap = self._pixmapHandle.pixmap()
+            report = {"source": pixmap.width() * pixmap.height() * pixmap.depth() // 8, "levels": 0, "tiles": 0}
+            report["format"] = "QPixmap (depth {})".format(pixmap.depth())
+            image = pixmap
+
+        report["total"] = report["source"] + report["levels"] + report["tiles"] + report.get("cache", 0)
+        report["argb32"] = image.width() * image.height() * 4
+        return report
+
+    # --------------------------------------------------------------------------------------------------------------
+    def renderStats(self) -> RenderStats:
+        """ Render statistics: paint time and items per frame, mousePressEvent, mouseMoveEvent and selectionChanged
+        times, decode and upload (setImage) times and image memory. Only recorded while enabled.
+        """
+        return self._renderStats
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setRenderStatsEnabled(self, enabled: bool, overlay: bool = False) -> None:
+        """ Start or stop recording the render statistics; with overlay they are also shown over the image,
+        refreshed every STATS_OVERLAY_MS. Disabled (the default) the viewer pays nothing for them but a flag check.
+        """
+        self._renderStats.setEnabled(enabled)
+        if enabled and self._paintTimer is None:
+            self._paintTimer = PaintTimer(self, self._renderStats, self._overlay.drawnCount)
+            self.viewport().installEventFilter(self._paintTimer)
+            # noinspection PyUnresolvedReferences
+            self._statsTimer.timeout.connect(self._paintTimer.updateOverlay)
+        elif not enabled and self._paintTimer is not None:
+            self._paintTimer.setOverlayVisible(False)
+            self.viewport().removeEventFilter(self._paintTimer)
+            self._statsTimer.stop()
+            # noinspection PyUnresolvedReferences
+            self._statsTimer.timeout.disconnect(self._paintTimer.updateOverlay)
+            self._paintTimer.deleteLater()
+            self._paintTimer = None
+        if self._paintTimer is not None:
+            self._paintTimer.setOverlayVisible(overlay)
+            if overlay:
+                self._statsTimer.start()
+            else:
+                self._statsTimer.stop()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onImageDecoded(self, fileName: str, page: int, seconds: float) -> None:
+        if self._renderStats.enabled:
+            self._renderStats.addTiming("decode", seconds)
 
     # --------------------------------------------------------------------------------------------------------------
     def updateViewer(self) -> None:
@@ -143,39 +438,237 @@ class QtImageViewer(QGraphicsView):
         if not self.hasImage():
             return
 
+        self._stopZoom()
         if len(self.zoomStack) and self.sceneRect().contains(self.zoomStack[-1]):
             self.fitInView(self.zoomStack[-1], self.aspectRatioMode)  # Lo pongo en modo que conserve el aspect ratio
         else:
             self.zoomStack = []  # Clear the zoom stack (in case we got here because of an invalid zoom).
             self.fitInView(self.sceneRect(), self.aspectRatioMode)  # Show entire image (use current aspect ratio mode).
 
+    # --------------------------------------------------------------------------------------------------------------
+    def isZoomed(self) -> bool:
+        """ Returns whether the view shows less than the entire image. """
+        return self._zooming or (len(self.zoomStack) > 0 and self.zoomStack[-1] != self.sceneRect())
+
+    # --------------------------------------------------------------------------------------------------------------
+    def zoomBy(self, factor: float, position: Optional[QPointF] = None) -> None:
+        """ Zoom by factor (above 1 zooms in), keeping the scene point under position (viewport coordinates,
+        by default the centre) in place. The scale is animated at display rate and limited between the entire
+        image and MAX_ZOOM; further calls while animating accumulate. The result is recorded in zoomStack when
+        the zoom stops.
+        """
+        if not self.hasImage():
+            return
+        current = self.transform().m11()
+        target = min(max((self._zoomTarget if self._zooming else current) * factor, self._fitScale()),
+                     max(self.MAX_ZOOM, self._fitScale()))
+        if not self._zooming and abs(target / current - 1.0) < 1e-3:
+            return
+        self._setZoomAnchor(position)
+        self._zoomTarget = target
+        if not self._zoomTimer.isActive():
+            self._zoomTime = time.perf_counter()
+            self._zoomTimer.start()
+        self._startZoom()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def zoomBack(self) -> bool:
+        """ Go back to the previous zoom of zoomStack (or the entire image). Returns whether there was one. """
+        self._finishZoom()
+        if not len(self.zoomStack):
+            return False
+        self._zoomForward.append(self.zoomStack.pop())
+        self.updateViewer()
+        return True
+
+    # --------------------------------------------------------------------------------------------------------------
+    def zoomForward(self) -> bool:
+        """ Redo the last zoom undone by zoomBack(). Returns whether there was one. """
+        self._finishZoom()
+        if not len(self._zoomForward):
+            return False
+        self.zoomStack.append(self._zoomForward.pop())
+        self.updateViewer()
+        return True
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _pushZoom(self, rect: QRectF) -> None:
+        """ Record a new zoom box. The zooms undone by zoomBack() can no longer be redone. """
+        self.zoomStack.append(rect)
+        self._zoomForward.clear()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _fitScale(self) -> float:
+        """ Scale at which fitInView() shows the entire image (same 2 pixel margin). """
+        view = self.viewport().rect().adjusted(2, 2, -2, -2)
+        scene = self.sceneRect()
+        if scene.isEmpty() or view.isEmpty():
+            return 1.0
+        return min(view.width() / scene.width(), view.height() / scene.height())
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _setZoomAnchor(self, position: Optional[QPointF]) -> None:
+        position = QPointF(self.viewport().rect().center()) if position is None else QPointF(position)
+        self._zoomAnchor = position
+        self._zoomAnchorScene = self.mapToScene(position.toPoint())
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _scaleAroundAnchor(self, factor: float) -> None:
+        """ Incremental scale of the view, then scroll so that the anchor scene point is under the anchor. """
+        self.scale(factor, factor)
+        # Siempre respecto al punto de escena inicial: el redondeo de las barras de scroll no se acumula
+        moved = QPointF(self.mapFromScene(self._zoomAnchorScene)) - self._zoomAnchor
+        self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() + round(moved.x()))
+        self.verticalScrollBar().setValue(self.verticalScrollBar().value() + round(moved.y()))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _zoomFrame(self) -> None:
+        """ One animation frame: covers the part of the remaining scale given by the time elapsed. """
+        now = time.perf_counter()
+        remaining = self._zoomTarget / self.transform().m11()
+        fraction = 1.0 - math.exp(-(now - self._zoomTime) / self.ZOOM_TIME_CONSTANT)
+        self._zoomTime = now
+        if abs(math.log(remaining)) * (1.0 - fraction) < 0.005:
+            # Lo que falta no se ve: se termina de golpe
+            self._zoomTimer.stop()
+            self._scaleAroundAnchor(remaining)
+            self._idleTimer.start()
+        else:
+            self._scaleAroundAnchor(remaining ** fraction)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _zoomNow(self, factor: float, position: QPointF) -> None:
+        """ Zoom without animation, for pinch gestures that already arrive at display rate. """
+        if not self.hasImage():
+            return
+        self._zoomTimer.stop()
+        current = self.transform().m11()
+        factor = min(max(current * factor, self._fitScale()), max(self.MAX_ZOOM, self._fitScale())) / current
+        self._setZoomAnchor(position)
+        self._scaleAroundAnchor(factor)
+        self._zoomTarget = self.transform().m11()
+        self._startZoom()
+        self._idleTimer.start()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _startZoom(self) -> None:
+        self._idleTimer.stop()
+        if not self._zooming:
+            self._zooming = True
+            self._setDraft(True)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _finishZoom(self) -> None:
+        """ End the zoom in progress, if any: full quality again and the visible area recorded in zoomStack. """
+        if not self._zooming:
+            return
+        if self._zoomTimer.isActive():
+            self._zoomTimer.stop()
+            self._scaleAroundAnchor(self._zoomTarget / self.transform().m11())
+        self._stopZoom()
+        visible = self.mapToScene(self.viewport().rect()).boundingRect().intersected(self.sceneRect())
+        if visible.isValid() and visible != (self.zoomStack[-1] if len(self.zoomStack) else self.sceneRect()):
+            self._pushZoom(visible)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _stopZoom(self) -> None:
+        self._zoomTimer.stop()
+        self._idleTimer.stop()
+        if self._zooming:
+            self._zooming = False
+            self._setDraft(False)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _setDraft(self, draft: bool) -> None:
+        """ Draft quality while zooming: no smoothing and nothing expensive built while painting. """
+        self.setRenderHint(QPainter.SmoothPixmapTransform, not draft)
+        if isinstance(self._pixmapHandle, TiledImageItem):
+            self._pixmapHandle.setDraft(draft)
+        elif self._pixmapHandle is not None:
+            self._pixmapHandle.setTransformationMode(Qt.FastTransformation if draft else Qt.SmoothTransformation)
+        if not draft:
+            self.viewport().update()
+
     # Comento esta funcion porque me interesa sacar este diálogo fuera del visor
     # --------------------------------------------------------------------------------------------------------------
-    def loadImageFromFile(self, fileName="") -> None:
+    def loadImageFromFile(self, fileName="", page=0) -> None:
         """ Load an image from file.
         Without any arguments, loadImageFromFile() will pop up a file dialog to choose the image file.
         With a fileName argument, loadImageFromFile(fileName) will attempt to load the specified image file directly.
+        For multi-page files only the given page is decoded.
+        The file is decoded in the background and shown when ready; see imageLoader() for the result signals.
         """
         if len(fileName) == 0:
             fileName, _ = QFileDialog.getOpenFileName(self, "Open image file.")
 
         if len(fileName) and os.path.isfile(fileName):
-            image = QImage(fileName)
-            self.setImage(image)
+            self._loader.load(fileName, page)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def imageLoader(self) -> ImageLoader:
+        """ Returns the background loader used by loadImageFromFile(). """
+        return self._loader
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onImageLoaded(self, image: QImage, fileName: str, page: int) -> None:
+        self.setImage(image)
 
     # --------------------------------------------------------------------------------------------------------------
     def setViewerMode(self):
         self._mode = self.VIEWER_MODE
+        self._editField(None)
 
     # --------------------------------------------------------------------------------------------------------------
     def setDesignMode(self):
         self._mode = self.DESIGN_MODE
 
+    # --------------------------------------------------------------------------------------------------------------
+    # FIELDS
+    # The design rectangles (fields) live in a FieldStore and are all drawn by one FieldOverlayItem. Only the
+    # field being edited is a real ResizableRect (the editor), written back to the store when released.
+    # --------------------------------------------------------------------------------------------------------------
+    def fieldStore(self) -> FieldStore:
+        return self._fields
+
+    # --------------------------------------------------------------------------------------------------------------
+    def addField(self, rect: QRectF) -> int:
+        """ Add a design rectangle (field) covering rect, in scene coordinates. Returns its id. """
+        return int(self.addFields(np.array([[rect.x(), rect.y(), rect.width(), rect.height()]]))[0])
+
+    # --------------------------------------------------------------------------------------------------------------
+    def addFields(self, rects: np.ndarray) -> np.ndarray:
+        """ Add fields from an (n, 4) array of x, y, width, height. Returns their ids. """
+        with self.batchEdit():
+            return self._fields.addMany(rects)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def loadTemplate(self, fileName: str) -> None:
+        """ Replace the fields with the ones of a template file (see template_io).
+        Only the store is filled: the fields are drawn by the overlay and no item is created for them.
+        Raises OSError or RuntimeError if the file cannot be read, leaving no fields.
+        """
+        # Las ids del fichero pueden coincidir con la del campo en edición
+        self._editField(None)
+        with self.batchEdit():
+            template_io.loadTemplate(fileName, self._fields)
+        self._alignment = Alignment()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def saveTemplate(self, fileName: str) -> None:
+        """ Save the fields to a template file, in the format given by its extension (see template_io). """
+        with self.batchEdit():
+            template_io.saveTemplate(fileName, self._fields)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def editingField(self) -> Optional[int]:
+        """ Id of the field shown by the editor item, if any. """
+        return self._editedField
+
     # --------------------------------------------------------------------------------------------------------------
     def deleteSelectedItems(self):
         """ Show a dialog to confirm deletion. """
 
-        if len(self.scene.selectedItems()) == 0:
+        if len(self.selectedFields()) == 0:
             return
 
         reply = QMessageBox.question(self, "Confirm Deletion", "Delete selected items?",
@@ -183,22 +676,218 @@ class QtImageViewer(QGraphicsView):
         if reply == QMessageBox.No:
             return
 
-        for item in self.scene.selectedItems():
-            if isinstance(item, QGraphicsRectItem):
-                self.scene.removeItem(item)
+        self.removeFields(self.selectedFields())
+
+    # --------------------------------------------------------------------------------------------------------------
+    # BULK EDITING
+    # All of them are vectorized over the field store, so the cost is linear in the number of fields.
+    # --------------------------------------------------------------------------------------------------------------
+    @contextmanager
+    def batchEdit(self):
+        """ Context manager for changes to the field store. The overlay and the editor are updated once, when
+        the outermost block ends.
+        """
+        if self._batchDepth == 0:
+            self._commitEditor()
+        self._batchDepth += 1
+        try:
+            yield
+        finally:
+            self._batchDepth -= 1
+            if self._batchDepth == 0:
+                self.selectionChanged()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def selectedFields(self) -> np.ndarray:
+        """ Ids of the selected fields. """
+        return self._fields.selected()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def selectFields(self, ids: Iterable[int], add: bool = False) -> None:
+        """ Select the given fields, replacing the current selection unless add is True. """
+        with self.batchEdit():
+            if not add:
+                self._fields.clearState(FieldStore.SELECTED)
+            self._fields.setState(ids, FieldStore.SELECTED)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def clearFieldSelection(self) -> None:
+        with self.batchEdit():
+            self._fields.clearState(FieldStore.SELECTED)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def removeFields(self, ids: Iterable[int]) -> None:
+        """ Remove fields, without confirmation. """
+        with self.batchEdit():
+            self._fields.remove(ids)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def moveSelectedFields(self, dx: float, dy: float) -> None:
+        """ Move the selected fields by (dx, dy) scene units. """
+        with self.batchEdit():
+            self._fields.translate(self.selectedFields(), dx, dy)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def alignSelectedFields(self, alignment: Qt.AlignmentFlag) -> None:
+        """ Align the selected fields to an edge (Qt.AlignLeft, AlignRight, AlignTop, AlignBottom) or centre line
+        (Qt.AlignHCenter, AlignVCenter) of the rectangle bounding all of them.
+        """
+        with self.batchEdit():
+            ids = self.selectedFields()
+            if len(ids) < 2:
+                return
+            rects = self._fields.rects(ids)
+            x, y, w, h = rects.T
+            if alignment == Qt.AlignLeft:
+                x[:] = x.min()
+            elif alignment == Qt.AlignRight:
+                x[:] = (x + w).max() - w
+            elif alignment == Qt.AlignHCenter:
+                x[:] = (x.min() + (x + w).max()) / 2 - w / 2
+            elif alignment == Qt.AlignTop:
+                y[:] = y.min()
+            elif alignment == Qt.AlignBottom:
+                y[:] = (y + h).max() - h
+            elif alignment == Qt.AlignVCenter:
+                y[:] = (y.min() + (y + h).max()) / 2 - h / 2
+            self._fields.setRects(ids, rects)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setSelectedFieldsSize(self, width: Optional[float] = None, height: Optional[float] = None) -> None:
+        """ Resize the selected fields keeping their top left corner. None keeps that dimension. """
+        with self.batchEdit():
+            ids = self.selectedFields()
+            rects = self._fields.rects(ids)
+            if width is not None:
+                rects[:, 2] = width
+            if height is not None:
+                rects[:, 3] = height
+            self._fields.setRects(ids, rects)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def duplicateSelectedFields(self, dx: float = 10, dy: float = 10) -> np.ndarray:
+        """ Copy the selected fields, offset by (dx, dy). The copies become the selection. Returns their ids. """
+        with self.batchEdit():
+            rects = self._fields.rects(self.selectedFields())
+            rects[:, :2] += (dx, dy)
+            self._fields.clearState(FieldStore.SELECTED)
+            return self._fields.addMany(rects, states=FieldStore.SELECTED)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def detectFields(self) -> bool:
+        """ Find the boxes and lines of the current image (a blank form) on a worker thread and add them as
+        fields, replacing the selection, when done (see FieldDetector). Returns False if there is no image.
+        """
+        buffer = self.imageBuffer()
+        if buffer is None:
+            return False
+        dpi = self.image().dotsPerMeterX() * 0.0254 or 300.0
+        self._detectRequest += 1
+        task = FieldDetectionTask(self._detectRequest, buffer, dpi)
+        # noinspection PyUnresolvedReferences
+        task.signals.finished.connect(self._onFieldsDetected)
+        QThreadPool.globalInstance().start(task)
+        return True
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onFieldsDetected(self, request: int, rects: np.ndarray) -> None:
+        if request != self._detectRequest:
+            return
+        with self.batchEdit():
+            self._fields.clearState(FieldStore.SELECTED)
+            self._fields.addMany(rects, states=FieldStore.SELECTED)
+        self.fieldsDetected.emit(len(rects))
+
+    # --------------------------------------------------------------------------------------------------------------
+    # TEMPLATE REGISTRATION
+    # The fields are placed on a reference image of the form and mapped onto every other scan of it.
+    # --------------------------------------------------------------------------------------------------------------
+    def setReferenceImage(self) -> bool:
+        """ Use the current image as the reference of the template, the one its fields are placed on.
+        Returns False if there is no image.
+        """
+        buffer = self.imageBuffer()
+        if buffer is None:
+            return False
+        self._registration = Registration(buffer)
+        self._alignment = Alignment()
+        return True
+
+    # --------------------------------------------------------------------------------------------------------------
+    def hasReferenceImage(self) -> bool:
+        return self._registration is not None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def alignFieldsToImage(self) -> Optional[Alignment]:
+        """ Register the current image against the reference image and move all the fields onto it, from
+        wherever the previous alignment left them. Returns the alignment (reference to current image), or None
+        if there is no reference or no image.
+        """
+        buffer = self.imageBuffer()
+        if self._registration is None or buffer is None:
+            return None
+        alignment = self._registration.register(buffer)
+        with self.batchEdit():
+            rects = alignment.mapRects(self._alignment.inverted().mapRects(self._fields.rects()))
+            self._fields.setRects(self._fields.ids(), rects)
+        self._alignment = alignment
+        return alignment
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _editField(self, fieldId: Optional[int]) -> None:
+        """ Show a field with the editor item (a ResizableRect), so it can be moved and resized with the mouse.
+        None hands the field being edited back to the overlay.
+        """
+        if fieldId == self._editedField:
+            return
+        self._commitEditor()
+        if self._editor is not None:
+            self._fields.setState([self._editedField], FieldStore.EDITING, False)
+            self.scene.removeItem(self._editor)
+            self._editor, self._editedField = None, None
+
+        rect = self._fields.rect(fieldId) if fieldId is not None else None
+        if rect is not None:
+            self._fields.setState([fieldId], FieldStore.EDITING)
+            self._editor = ResizableRect()
+            self._editor.setPen(FieldOverlayItem.pen())
+            self._editor.setZValue(1)
+            self._editor.setRect(rect)
+            self.scene.addItem(self._editor)
+            self._editedField = fieldId
+        self.selectionChanged()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _commitEditor(self) -> None:
+        """ Write the rectangle of the editor item back to the field store. """
+        if self._editor is not None:
+            self._editor.flushRect()
+            self._fields.setRect(self._editedField, self._editor.rect())
 
     # --------------------------------------------------------------------------------------------------------------
     # SIGNALS
     # --------------------------------------------------------------------------------------------------------------
+    @timed()
     def selectionChanged(self):
-        """ Slot creado para pintar de color diferente los elementos seleccionados """
+        """ Slot creado para pintar de color diferente los elementos seleccionados.
+        Repaints the overlay and brings the editor item in line with the store after any change to the fields.
+        """
+        if self._batchDepth:
+            return
         try:
-            for item in self.scene.items():
-                if isinstance(item, QGraphicsRectItem):
-                    if item.isSelected():
-                        item.setBrush(QBrush(QColor(255, 225, 98, 127)))
-                    else:
-                        item.setBrush(QBrush(QColor(255, 0, 0, 127)))
+            if self._editor is not None:
+                rect = self._fields.rect(self._editedField)
+                if rect is None:
+                    # El campo en edición se ha borrado
+                    self.scene.removeItem(self._editor)
+                    self._editor, self._editedField = None, None
+                else:
+                    selected = self._fields.state(self._editedField) & FieldStore.SELECTED
+                    self._editor.setRect(rect)
+                    self._editor.setBrush(self.SELECTED_FIELD_BRUSH if selected else self.FIELD_BRUSH)
+            self._overlay.fieldsChanged()
+            # noinspection PyUnresolvedReferences
+            self.fieldsChanged.emit()
         except Exception as e:
             print("[ERROR] Error al cambiar el color de los elementos seleccionados")
             print(e)
@@ -211,21 +900,63 @@ class QtImageViewer(QGraphicsView):
     def resizeEvent(self, event: PySide6.QtGui.QResizeEvent) -> None:
         """
         Reimplemented from QWidget.
-        Maintain current zoom on resize
+        Maintain current zoom on resize: the entire image is fitted again, a zoomed view keeps its scale and centre
         """
-        self.updateViewer()
+        if self.isZoomed():
+            QGraphicsView.resizeEvent(self, event)
+        else:
+            self.updateViewer()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def wheelEvent(self, event: PySide6.QtGui.QWheelEvent) -> None:
+        """ Zoom around the cursor. Scrolling with a touchpad (pixel deltas) still pans. """
+        if not self.canZoom or not self.hasImage() or not event.pixelDelta().isNull() \
+                or event.angleDelta().y() == 0:
+            QGraphicsView.wheelEvent(self, event)
+            return
+        self.zoomBy(self.ZOOM_STEP ** (event.angleDelta().y() / 120), event.position())
+        event.accept()
 
     # --------------------------------------------------------------------------------------------------------------
+    def viewportEvent(self, event: QEvent) -> bool:
+        """ Pinch zoom: native touchpad gestures and touch screen pinch gestures. """
+        if self.canZoom and self.hasImage():
+            if event.type() == QEvent.NativeGesture and event.gestureType() == Qt.ZoomNativeGesture:
+                self._zoomNow(1.0 + event.value(), event.position())
+                return True
+            if event.type() == QEvent.Gesture and event.gesture(Qt.PinchGesture) is not None:
+                pinch = event.gesture(Qt.PinchGesture)
+                center = self.viewport().mapFromGlobal(pinch.centerPoint().toPoint())
+                self._zoomNow(pinch.scaleFactor(), QPointF(center))
+                event.accept(pinch)
+                return True
+        return QGraphicsView.viewportEvent(self, event)
 
+    # --------------------------------------------------------------------------------------------------------------
+    @timed()
     def mousePressEvent(self, event: PySide6.QtGui.QMouseEvent) -> None:
         """ Start mouse pan or zoom mode """
         scenePos = self.mapToScene(event.position().toPoint())
 
+        if event.button() in (Qt.BackButton, Qt.ForwardButton) and self.canZoom:
+            if event.button() == Qt.BackButton:
+                self.zoomBack()
+            else:
+                self.zoomForward()
+            event.accept()
+            return
         if event.button() == Qt.RightButton:
-            if self.canZoom:
-                self.setDragMode(QGraphicsView.RubberBandDrag)
             # noinspection PyUnresolvedReferences
             self.rightMouseButtonPressed.emit(scenePos.x(), scenePos.y())
+            if self.canZoom:
+                self._finishZoom()
+                if self._zoomBand is None:
+                    self._zoomBand = QRubberBand(QRubberBand.Rectangle, self.viewport())
+                self._zoomOrigin = event.position().toPoint()
+                self._zoomBand.setGeometry(QRect(self._zoomOrigin, self._zoomOrigin))
+                self._zoomBand.show()
+                event.accept()
+                return
         else:
             if self._mode == self.VIEWER_MODE:
                 """Comportamiento en el caso de que estamos en modo visualización"""
@@ -237,27 +968,37 @@ class QtImageViewer(QGraphicsView):
             elif self._mode == self.DESIGN_MODE and self.hasImage():
                 """Comportamiento en el caso de que estamos en modo diseño"""
                 # print(self.scene.itemAt(scenePos, QTransform()).type())
-                if self.scene.itemAt(scenePos, QTransform()) is not None \
-                        and self.scene.itemAt(scenePos, QTransform()).type() == 7:
-                    self._current_rect_item = ResizableRect()
-                    self._current_rect_item.setBrush(QColor(255, 0, 0, 127))
-                    pen = QPen(Qt.red)
-                    pen.setCosmetic(True)
-                    pen.setWidth(3)
-                    self._current_rect_item.setPen(pen)
-                    self._current_rect_item.setFlags(QGraphicsItem.ItemIsMovable
-                                                     | QGraphicsItem.ItemIsSelectable)
-
-                    self.scene.addItem(self._current_rect_item)
-                    self._start_point = scenePos
-                    print("Start point: ", self._start_point)
-                    rect = QRectF(self._start_point, QSizeF(0, 0))
-                    self._current_rect_item.setRect(rect)
+                item = self.scene.itemAt(scenePos, QTransform())
+                if self._editor is None or item is not self._editor:
+                    # El editor recibe el evento directamente; el resto de campos se buscan en el almacén
+                    fieldId = self._fields.fieldAt(scenePos, FieldOverlayItem.PEN_WIDTH / self.transform().m11())
+                    if fieldId is not None:
+                        selected = self._fields.state(fieldId) & FieldStore.SELECTED
+                        if event.modifiers() & Qt.ControlModifier:
+                            with self.batchEdit():
+                                self._fields.setState([fieldId], FieldStore.SELECTED, not selected)
+                        elif not selected:
+                            self.selectFields([fieldId])
+                        self._editField(fieldId)
+                    elif self._isImageItem(item):
+                        self._start_point = scenePos
+                        fieldId = self.addField(QRectF(self._start_point, QSizeF(0, 0)))
+                        self.selectFields([fieldId])
+                        self._editField(fieldId)
+                        self._current_rect_item = self._editor
 
         QGraphicsView.mousePressEvent(self, event)
+        if self._mode == self.DESIGN_MODE and event.button() == Qt.LeftButton:
+            # Los campos no son items de la escena: el evento está atendido aunque ningún item lo acepte
+            event.accept()
 
     # --------------------------------------------------------------------------------------------------------------
+    @timed()
     def mouseMoveEvent(self, event: PySide6.QtGui.QMouseEvent) -> None:
+        if self._zoomOrigin is not None:
+            self._zoomBand.setGeometry(QRect(self._zoomOrigin, event.position().toPoint()).normalized())
+            event.accept()
+            return
         scenePos = self.mapToScene(event.position().toPoint())
         # print("Mouse move: ", scenePos, "Event: ", event.position().toPoint())
         if self._mode == self.DESIGN_MODE and self.hasImage():
@@ -269,8 +1010,13 @@ class QtImageViewer(QGraphicsView):
                                       scenePos.y() - self._start_point.y())
                 rect = QRectF(self._start_point, rectSize)
 
-                self._current_rect_item.setRect(rect)
+                self._current_rect_item.setRectCoalesced(rect)
         QGraphicsView.mouseMoveEvent(self, event)
+        # Solo cuando el editor ha cambiado de verdad: como mucho una vez por fotograma (ver ResizableRect)
+        if self._editor is not None and event.buttons() & Qt.LeftButton and self._editor.rect() != self._draggedRect:
+            self._draggedRect = self._editor.rect()
+            # noinspection PyUnresolvedReferences
+            self.fieldsChanged.emit()
 
     # --------------------------------------------------------------------------------------------------------------
     def mouseReleaseEvent(self, event: PySide6.QtGui.QMouseEvent) -> None:
@@ -278,14 +1024,22 @@ class QtImageViewer(QGraphicsView):
         scenePos = self.mapToScene(event.position().toPoint())
 
         if event.button() == Qt.MouseButton.RightButton:
-            if self.canZoom:
+            if self._zoomOrigin is not None:
+                self._zoomOrigin = None
+                self._zoomBand.hide()
                 viewBBox = self.zoomStack[-1] if len(self.zoomStack) else self.sceneRect()
-                selectionBBox = self.scene.selectionArea().boundingRect().intersected(viewBBox)
-                self.scene.setSelectionArea(QPainterPath())  # Clear current selection area
-                if selectionBBox.isValid() and (selectionBBox != viewBBox):
-                    self.zoomStack.append(selectionBBox)
-                    self.updateViewer()
-            self.setDragMode(QGraphicsView.NoDrag)
+                band = self._zoomBand.geometry()
+                # Un clic sin arrastre (o casi) no hace zoom
+                minimum = QApplication.startDragDistance()
+                if band.width() >= minimum and band.height() >= minimum:
+                    zoomBBox = self.mapToScene(band).boundingRect().intersected(viewBBox)
+                    if zoomBBox.isValid() and (zoomBBox != viewBBox):
+                        self._pushZoom(zoomBBox)
+                        self.updateViewer()
+                # noinspection PyUnresolvedReferences
+                self.rightMouseButtonReleased.emit(scenePos.x(), scenePos.y())
+                event.accept()
+                return
             # noinspection PyUnresolvedReferences
             self.rightMouseButtonReleased.emit(scenePos.x(), scenePos.y())
         else:
@@ -295,6 +1049,10 @@ class QtImageViewer(QGraphicsView):
                 self.leftMouseButtonReleased.emit(scenePos.x(), scenePos.y())
             elif self._mode == self.DESIGN_MODE:
                 self._current_rect_item = None
+                self._commitEditor()
+                self._overlay.fieldsChanged()
+                # noinspection PyUnresolvedReferences
+                self.fieldsChanged.emit()
 
         QGraphicsView.mouseReleaseEvent(self, event)
 
@@ -307,13 +1065,26 @@ class QtImageViewer(QGraphicsView):
             self.leftMouseButtonDoubleClicked.emit(scenePos.x(), scenePos.y())
         elif event.button() == Qt.MouseButton.RightButton:
             if self.canZoom:
-                self.zoomStack.clear()
+                self._finishZoom()
+                if len(self.zoomStack) and self.zoomStack[-1] != self.sceneRect():
+                    self._pushZoom(self.sceneRect())
                 self.updateViewer()
             self.rightMouseButtonDoubleClicked.emit(scenePos.x(), scenePos.y())
 
         QGraphicsView.mouseDoubleClickEvent(self, event)
 
     # --------------------------------------------------------------------------------------------------------------
+    def keyPressEvent(self, event: PySide6.QtGui.QKeyEvent) -> None:
+        """ In design mode the arrow keys move the selected fields, 1 pixel or 10 with Shift. """
+        steps = {Qt.Key_Left: (-1, 0), Qt.Key_Right: (1, 0), Qt.Key_Up: (0, -1), Qt.Key_Down: (0, 1)}
+        if self._mode == self.DESIGN_MODE and event.key() in steps and len(self.selectedFields()):
+            step = 10 if event.modifiers() & Qt.ShiftModifier else 1
+            dx, dy = steps[event.key()]
+            self.moveSelectedFields(dx * step, dy * step)
+            return
+        QGraphicsView.keyPressEvent(self, event)
+
+    # --------------------------------------------------------------------------------------------------------------
 
 
 # --------------------------------------------------------------------------------------------------------------
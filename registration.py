@@ -0,0 +1,325 @@
+# --------------------------------------------------------------------------------------------------------------
+import math
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PySide6.QtCore import QRectF
+from PySide6.QtGui import QImage, QTransform
+
+from image_buffer import ImageBuffer
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class Alignment:
+    """
+    Similarity transform from template (reference image) coordinates to scan coordinates:
+        scan = scale * rotate(angle) * template + (dx, dy)
+    with the angle in degrees, clockwise in image coordinates (y down), like QTransform.rotate().
+    response is the height of the phase correlation peak (about 0.05 or more for a reliable match).
+    """
+
+    def __init__(self, dx: float = 0.0, dy: float = 0.0, angle: float = 0.0, scale: float = 1.0,
+                 response: float = 1.0):
+        self.dx, self.dy = dx, dy
+        self.angle, self.scale = angle, scale
+        self.response = response
+
+    # --------------------------------------------------------------------------------------------------------------
+    def __repr__(self) -> str:
+        return (f"Alignment(dx={self.dx:.2f}, dy={self.dy:.2f}, angle={self.angle:.3f}, scale={self.scale:.4f}, "
+                f"response={self.response:.3f})")
+
+    # --------------------------------------------------------------------------------------------------------------
+    def isIdentity(self) -> bool:
+        return (self.dx, self.dy, self.angle, self.scale) == (0.0, 0.0, 0.0, 1.0)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def matrix(self) -> np.ndarray:
+        """ 2x2 linear part (scale and rotation). """
+        radians = math.radians(self.angle)
+        cos, sin = self.scale * math.cos(radians), self.scale * math.sin(radians)
+        return np.array([[cos, -sin], [sin, cos]])
+
+    # --------------------------------------------------------------------------------------------------------------
+    def transform(self) -> QTransform:
+        """ The same transform as a QTransform (points are mapped as row vectors by Qt). """
+        (m11, m12), (m21, m22) = self.matrix()
+        return QTransform(m11, m21, m12, m22, self.dx, self.dy)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def inverted(self) -> "Alignment":
+        inverse = np.linalg.inv(self.matrix())
+        dx, dy = -inverse @ np.array([self.dx, self.dy])
+        return Alignment(float(dx), float(dy), -self.angle, 1.0 / self.scale, self.response)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def mapPoints(self, points: np.ndarray) -> np.ndarray:
+        """ Map an (n, 2) array of template points to the scan. """
+        return np.asarray(points, dtype=np.float64) @ self.matrix().T + (self.dx, self.dy)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def mapRects(self, rects: np.ndarray) -> np.ndarray:
+        """ Map an (n, 4) array of x, y, width, height from the template to the scan.
+        Fields stay axis-aligned: the centre is mapped and the size scaled, so mapping with an alignment and
+        then with its inverse gives back the same rectangles.
+        """
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        size = rects[:, 2:] * self.scale
+        centers = self.mapPoints(rects[:, :2] + rects[:, 2:] / 2)
+        return np.hstack([centers - size / 2, size])
+
+    # --------------------------------------------------------------------------------------------------------------
+    def mapRect(self, rect: QRectF) -> QRectF:
+        x, y, w, h = self.mapRects(np.array([[rect.x(), rect.y(), rect.width(), rect.height()]]))[0]
+        return QRectF(x, y, w, h)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class Registration:
+    """
+    Registration of scans against the reference image of a template by FFT phase correlation
+    (Fourier-Mellin), on images downsampled to about SIZE pixels and inverted so that ink, not paper,
+    carries the signal.
+    Rotation and scale are found first, by phase correlation of the log-polar resampled magnitude spectra
+    (which do not depend on translation), searching within MAX_ANGLE degrees and MAX_SCALE. The scan is
+    rotated and scaled back and the translation is found by a second phase correlation. Last, a grid of
+    TILES x TILES tiles is correlated with the reference and the similarity that best fits their sub-pixel
+    shifts refines the estimate: the log-polar spectrum alone is only good to about 0.3% of scale.
+    The reference, its tiles and the log-polar sampling grid are prepared once in the constructor, so
+    register() costs the downsampling of the scan and a few FFTs: about 50 ms for an A4 page at 300 dpi.
+    """
+
+    SIZE = 512
+    MAX_ANGLE = 10.0
+    MAX_SCALE = 1.15
+    TILES = 4
+    TILE_SIZE = 64
+    # Respuesta mínima de la correlación de una tesela para tenerla en cuenta (las teselas en blanco no sirven)
+    # y desplazamiento máximo respecto a la estimación global, en píxeles de la imagen reducida
+    MIN_TILE_RESPONSE = 0.15
+    MAX_TILE_SHIFT = 3.0
+    # Radio mínimo del espectro muestreado: las frecuencias más bajas son el contorno de la página
+    MIN_RADIUS = 4
+
+    def __init__(self, reference: Union[QImage, ImageBuffer], size: int = SIZE):
+        buffer = reference if isinstance(reference, ImageBuffer) else ImageBuffer(reference)
+        self._size = size
+        self._factor = max(1, math.ceil(max(buffer.width(), buffer.height()) / size))
+        # La página reducida se centra en el lienzo, donde la ventana de Hann pesa más
+        self._shape = (min(buffer.height() // self._factor, size), min(buffer.width() // self._factor, size))
+        self._origin = np.array([(size - self._shape[1]) // 2, (size - self._shape[0]) // 2], dtype=np.float64)
+        self._window = np.outer(np.hanning(size), np.hanning(size)).astype(np.float32)
+        self._highPass = self._highPassFilter(size)
+
+        radii = size // 2
+        self._logBase = math.exp(math.log(radii / self.MIN_RADIUS) / radii)
+        angles = np.linspace(0, np.pi, size, endpoint=False)
+        radius = self.MIN_RADIUS * self._logBase ** np.arange(radii)
+        self._polarGrid = self._samplingGrid(size / 2 + radius[None, :] * np.cos(angles)[:, None],
+                                             size / 2 + radius[None, :] * np.sin(angles)[:, None], (size, size))
+
+        self._reference = self._downsample(buffer)
+        self._referenceSpectrum = np.fft.rfft2(self._reference)
+        self._referencePolar = np.fft.rfft2(self._logPolar(self._reference))
+        self._tileWindow = np.outer(np.hanning(self.TILE_SIZE), np.hanning(self.TILE_SIZE)).astype(np.float32)
+        self._tileOrigins = self._tileGrid()
+        self._referenceTiles = np.fft.rfft2(self._tiles(self._reference, self._tileOrigins))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def factor(self) -> int:
+        """ Downsampling factor: pixels of the images per pixel of the correlated ones. """
+        return self._factor
+
+    # --------------------------------------------------------------------------------------------------------------
+    def register(self, scan: Union[QImage, ImageBuffer], rotation: bool = True) -> Alignment:
+        """ Alignment mapping the reference onto scan. With rotation False only translation is estimated. """
+        buffer = scan if isinstance(scan, ImageBuffer) else ImageBuffer(scan)
+        image = warped = self._downsample(buffer)
+        size = self._size
+        center = np.full(2, (size - 1) / 2)
+
+        angle, scale, matrix = 0.0, 1.0, np.eye(2)
+        if rotation:
+            (angleShift, scaleShift), _ = self._correlate(self._referencePolar, np.fft.rfft2(self._logPolar(image)),
+                                                          (size, size // 2))
+            angle, scale = -angleShift * 180.0 / size, self._logBase ** scaleShift
+            if abs(angle) <= self.MAX_ANGLE and 1 / self.MAX_SCALE <= scale <= self.MAX_SCALE:
+                matrix = Alignment(angle=angle, scale=scale).matrix()
+                # El escaneo visto en las coordenadas de la referencia, salvo la translación
+                warped = self._warp(image, matrix, center)
+            else:
+                angle, scale = 0.0, 1.0
+
+        (shiftY, shiftX), response = self._correlate(np.fft.rfft2(warped), self._referenceSpectrum, (size, size))
+        # warped = S reference + t en el lienzo: solo la translación, o la semejanza ajustada a las teselas
+        similarity, translation = np.eye(2), np.array([shiftX, shiftY])
+        refined = self._refine(warped, translation) if rotation else None
+        if refined is not None:
+            similarity, translation = refined
+
+        # warped(q) = scan(c + A (q - c)), con q = d + o en el lienzo y d en la imagen reducida:
+        # scan = A S d + A S o + c - A c + A t - o
+        total = matrix @ similarity
+        offset = total @ self._origin + center - matrix @ center + matrix @ translation - self._origin
+        angle = math.degrees(math.atan2(total[1, 0], total[0, 0]))
+        scale = math.hypot(total[0, 0], total[1, 0])
+
+        # De la imagen reducida a la completa: d = (D - (f - 1) / 2) / f
+        factor = self._factor
+        half = np.full(2, (factor - 1) / 2)
+        dx, dy = factor * offset + half - total @ half
+        return Alignment(float(dx), float(dy), angle, scale, response)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _downsample(self, buffer: ImageBuffer) -> np.ndarray:
+        """ Area average by factor of the inverted gray levels, zero mean, centred on a SIZE x SIZE float32
+        canvas.
+        """
+        factor, size = self._factor, self._size
+        rows = min(buffer.height() // factor, self._shape[0])
+        columns = min(buffer.width() // factor, self._shape[1])
+        page = np.empty((rows, columns), dtype=np.float32)
+        # Franjas de unas 256 filas, para no expandir entera una imagen bitonal
+        step = max(1, 256 // factor)
+        for row in range(0, rows, step):
+            count = min(step, rows - row)
+            values = buffer.region(QRectF(0, row * factor, columns * factor, count * factor))
+            if values.ndim == 3:
+                values = values[..., :3].mean(axis=2, dtype=np.float32)
+            # Suma de filas y luego de columnas: mucho más rápido que mean(axis=(1, 3))
+            accumulator = np.uint16 if values.dtype == np.uint8 else np.float32
+            sums = values.reshape(count, factor, columns * factor).sum(axis=1, dtype=accumulator)
+            page[row:row + count] = sums.reshape(count, columns, factor).sum(axis=2, dtype=np.float32)
+
+        top = 65535.0 if buffer.array().dtype == np.uint16 else 255.0
+        page = top - page / (factor * factor)
+        page -= page.mean()
+        canvas = np.zeros((size, size), dtype=np.float32)
+        left, top = self._origin.astype(int)
+        canvas[top:top + rows, left:left + columns] = page
+        return canvas
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _tileGrid(self) -> np.ndarray:
+        """ (TILES * TILES, 2) canvas positions (x, y) of the top left corners of the tiles, spread over the page. """
+        rows, columns = self._shape
+        tile = self.TILE_SIZE
+        xs = self._origin[0] + np.linspace(0, max(columns - tile, 0), self.TILES)
+        ys = self._origin[1] + np.linspace(0, max(rows - tile, 0), self.TILES)
+        return np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2).round().astype(int)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _tiles(self, image: np.ndarray, origins: np.ndarray) -> np.ndarray:
+        """ Windowed TILE_SIZE x TILE_SIZE tiles of image at origins, stacked. """
+        tile = self.TILE_SIZE
+        return np.stack([image[y:y + tile, x:x + tile] for x, y in origins.tolist()]) * self._tileWindow
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _refine(self, warped: np.ndarray, translation: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """ Similarity (S, t) with warped = S reference + t fitted by least squares to the shifts of the tiles,
+        which are searched around translation, dropping the tiles that do not fit within a pixel (repeated
+        patterns, such as rows of boxes, can match at the wrong place). None if fewer than 3 tiles match.
+        """
+        tile = self.TILE_SIZE
+        origins = np.clip(self._tileOrigins + np.round(translation).astype(int), 0, self._size - tile)
+        spectra = np.fft.rfft2(self._tiles(warped, origins))
+        points, targets = [], []
+        for index, spectrum in enumerate(spectra):
+            (shiftY, shiftX), response = self._correlate(spectrum, self._referenceTiles[index], (tile, tile))
+            if response < self.MIN_TILE_RESPONSE or math.hypot(shiftX, shiftY) > self.MAX_TILE_SHIFT:
+                continue
+            center = self._tileOrigins[index] + (tile - 1) / 2
+            points.append(center)
+            targets.append(center + origins[index] - self._tileOrigins[index] + (shiftX, shiftY))
+        if len(points) < 3:
+            return None
+
+        # Semejanza [[a, -b], [b, a]] p + t: dos ecuaciones lineales en (a, b, tx, ty) por tesela
+        (x, y), (u, v) = np.array(points).T, np.array(targets).T
+        ones, zeros = np.ones_like(x), np.zeros_like(x)
+        system = np.concatenate([np.stack([x, -y, ones, zeros], axis=1), np.stack([y, x, zeros, ones], axis=1)])
+        values = np.concatenate([u, v])
+        keep = np.ones(len(x), dtype=bool)
+        while True:
+            rows = np.concatenate([keep, keep])
+            solution, *_ = np.linalg.lstsq(system[rows], values[rows], rcond=None)
+            error = np.hypot(*(system @ solution - values).reshape(2, -1))
+            worst = int(np.argmax(np.where(keep, error, -1)))
+            if error[worst] <= 1.0:
+                break
+            keep[worst] = False
+            if keep.sum() < 3:
+                return None
+        a, b, tx, ty = solution
+        return np.array([[a, -b], [b, a]]), np.array([tx, ty])
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _highPassFilter(size: int) -> np.ndarray:
+        """ Emphasis filter for the shifted magnitude spectrum, 0 at the centre (DC) and 1 at the borders. """
+        frequencies = np.cos(np.pi * (np.arange(size) - size / 2) / size)
+        product = np.outer(frequencies, frequencies)
+        return ((1.0 - product) * (2.0 - product)).astype(np.float32)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _logPolar(self, image: np.ndarray) -> np.ndarray:
+        """ High-passed magnitude spectrum resampled to (SIZE angles over 180 degrees, SIZE / 2 log radii). """
+        spectrum = np.abs(np.fft.fftshift(np.fft.fft2(image * self._window))).astype(np.float32)
+        return self._sample(spectrum * self._highPass, self._polarGrid)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _warp(self, image: np.ndarray, matrix: np.ndarray, center: np.ndarray) -> np.ndarray:
+        """ Image sampled at center + matrix (q - center) for every canvas point q. """
+        q = np.arange(self._size, dtype=np.float32) - np.float32(center[0])
+        x = center[0] + matrix[0, 0] * q[None, :] + matrix[0, 1] * q[:, None]
+        y = center[1] + matrix[1, 0] * q[None, :] + matrix[1, 1] * q[:, None]
+        return self._sample(image, self._samplingGrid(x, y, image.shape))
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _samplingGrid(x: np.ndarray, y: np.ndarray, shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """ Bilinear interpolation of an image of shape at the points (x, y): flat indices of the 4 neighbours
+        of each point and their weights, 0 outside the image.
+        """
+        height, width = shape
+        x0, y0 = np.floor(x).astype(np.intp), np.floor(y).astype(np.intp)
+        fx, fy = (x - x0).astype(np.float32), (y - y0).astype(np.float32)
+        inside = (x0 >= 0) & (y0 >= 0) & (x0 < width - 1) & (y0 < height - 1)
+        index = np.where(inside, y0 * width + x0, 0)
+        fx, fy = np.where(inside, fx, 0), np.where(inside, fy, 0)
+        outside = ~inside
+        indices = np.stack([index, index + 1, index + width, index + width + 1])
+        weights = np.stack([(1 - fx) * (1 - fy) - outside, fx * (1 - fy), (1 - fx) * fy, fx * fy])
+        return indices, weights.astype(np.float32)
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _sample(image: np.ndarray, grid: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+        indices, weights = grid
+        values = image.ravel().take(indices)
+        values *= weights
+        return values.sum(axis=0)
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _correlate(first: np.ndarray, second: np.ndarray, shape: Tuple[int, int]) -> Tuple[Tuple[float, float],
+                                                                                           float]:
+        """ Phase correlation of two rfft2 spectra: shift (rows, columns) of the first image relative to the
+        second, with sub-pixel refinement, and the height of the peak.
+        """
+        cross = first * np.conj(second)
+        cross /= np.maximum(np.abs(cross), 1e-12)
+        surface = np.fft.irfft2(cross, s=shape)
+        peak = np.unravel_index(int(np.argmax(surface)), shape)
+
+        shift = []
+        for axis, position in enumerate(peak):
+            before, after = list(peak), list(peak)
+            before[axis] = (position - 1) % shape[axis]
+            after[axis] = (position + 1) % shape[axis]
+            left, middle, right = surface[tuple(before)], surface[peak], surface[tuple(after)]
+            denominator = left - 2 * middle + right
+            offset = 0.5 * (left - right) / denominator if denominator < 0 else 0.0
+            value = position + offset
+            shift.append(value - shape[axis] if value > shape[axis] / 2 else value)
+        return (shift[0], shift[1]), float(surface[peak])
@@ -0,0 +1,287 @@
+# --------------------------------------------------------------------------------------------------------------
+import csv
+import functools
+import json
+import os
+import statistics
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from PySide6.QtCore import QEvent, QObject, QRect, Qt, QTimer, Signal
+from PySide6.QtGui import QColor, QFont, QFontMetrics, QPainter
+from PySide6.QtWidgets import QGraphicsView, QWidget
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class RenderStats:
+    """
+    Opt-in render timings of an image viewer: paint time and items drawn per frame, time spent in the
+    instrumented methods (see timed()), image decode and upload times, and the memory of the displayed image.
+    Disabled by default. While disabled nothing is recorded: the instrumented methods only check `enabled`
+    and the paint timer (PaintTimer) is not even installed.
+    The last HISTORY records of each kind are kept. summary() gives count, mean, median, p95 and max (ms)
+    per timing, dump() writes the summary and the records as JSON or the records as CSV.
+    """
+
+    HISTORY = 2000
+
+    def __init__(self):
+        self.enabled = False
+        self._origin = time.perf_counter()
+        # (seconds since creation, paint ms, items drawn, fields drawn)
+        self._frames = deque(maxlen=self.HISTORY)
+        # name -> deque of (seconds since creation, ms)
+        self._timings = {}
+        self._memorySource = None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setEnabled(self, enabled: bool) -> None:
+        self.enabled = enabled
+
+    # --------------------------------------------------------------------------------------------------------------
+    def clear(self) -> None:
+        """ Drop every record. """
+        self._frames.clear()
+        self._timings.clear()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setMemorySource(self, source: Optional[Callable[[], int]]) -> None:
+        """ Function returning the bytes used by the displayed image, queried by summary() and the overlay. """
+        self._memorySource = source
+
+    # --------------------------------------------------------------------------------------------------------------
+    def addFrame(self, seconds: float, items: int, fields: int) -> None:
+        self._frames.append((time.perf_counter() - self._origin, seconds * 1000, items, fields))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def addTiming(self, name: str, seconds: float) -> None:
+        timings = self._timings.get(name)
+        if timings is None:
+            timings = self._timings[name] = deque(maxlen=self.HISTORY)
+        timings.append((time.perf_counter() - self._origin, seconds * 1000))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def frameRate(self, window: float = 1.0) -> float:
+        """ Frames painted per second over the last window seconds. """
+        since = time.perf_counter() - self._origin - window
+        return sum(1 for frame in self._frames if frame[0] >= since) / window
+
+    # --------------------------------------------------------------------------------------------------------------
+    def memory(self) -> int:
+        return self._memorySource() if self._memorySource is not None else 0
+
+    # --------------------------------------------------------------------------------------------------------------
+    def summary(self) -> dict:
+        """ {"paint": stats, "items": mean, "fields": mean, "fps": ..., "memory": bytes, "timings": {name: stats}},
+        stats being count, mean, median, p95 and max in milliseconds.
+        """
+        frames = list(self._frames)
+        return {
+            "paint": _describe([frame[1] for frame in frames]),
+            "items": statistics.fmean([frame[2] for frame in frames]) if frames else 0.0,
+            "fields": statistics.fmean([frame[3] for frame in frames]) if frames else 0.0,
+            "fps": self.frameRate(),
+            "memory": self.memory(),
+            "timings": {name: _describe([ms for _, ms in timings]) for name, timings in self._timings.items()},
+        }
+
+    # --------------------------------------------------------------------------------------------------------------
+    def records(self) -> List[dict]:
+        """ Every record, oldest first: kind ("frame" or the timing name), time (s), ms, items and fields. """
+        rows = [{"kind": "frame", "time": t, "ms": ms, "items": items, "fields": fields}
+                for t, ms, items, fields in self._frames]
+        for name, timings in self._timings.items():
+            rows.extend({"kind": name, "time": t, "ms": ms, "items": "", "fields": ""} for t, ms in timings)
+        return sorted(rows, key=lambda row: row["time"])
+
+    # --------------------------------------------------------------------------------------------------------------
+    def dump(self, fileName: str) -> None:
+        """ Write the records to a .csv file, or the summary and the records to a JSON file (any other name). """
+        if os.path.splitext(fileName)[1].lower() == ".csv":
+            with open(fileName, "w", newline="", encoding="utf-8") as file:
+                writer = csv.DictWriter(file, fieldnames=["kind", "time", "ms", "items", "fields"])
+                writer.writeheader()
+                writer.writerows(self.records())
+        else:
+            with open(fileName, "w", encoding="utf-8") as file:
+                json.dump({"summary": self.summary(), "records": self.records()}, file, indent=1)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def overlayLines(self) -> List[str]:
+        """ Text of the on-screen overlay: one line per metric. """
+        summary = self.summary()
+        paint = summary["paint"]
+        lines = [f"{summary['fps']:5.1f} fps  paint {paint['median']:6.2f} ms  p95 {paint['p95']:6.2f}  "
+                 f"max {paint['max']:6.2f}",
+                 f"items {summary['items']:6.1f}  fields {summary['fields']:8.1f}  "
+                 f"image {summary['memory'] / 1048576:7.1f} MB"]
+        for name, stats in sorted(summary["timings"].items()):
+            lines.append(f"{name:16s} {stats['median']:7.2f} ms  p95 {stats['p95']:7.2f}  max {stats['max']:7.2f}  "
+                         f"n {stats['count']}")
+        return lines
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _describe(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0, "mean": 0.0, "median": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(values)
+    return {"count": len(values), "mean": statistics.fmean(values), "median": statistics.median(ordered),
+            "p95": ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))], "max": ordered[-1]}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def timed(name: Optional[str] = None):
+    """ Method decorator: while self.renderStats() is enabled, the time of every call is recorded under name
+    (the method name by default). Disabled, it only adds the check of the flag.
+    """
+    def decorator(method):
+        label = name or method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            stats = self.renderStats()
+            if not stats.enabled:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                stats.addTiming(label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class PaintTimer(QObject):
+    """
+    Event filter for the viewport of a QGraphicsView that paints it itself, to time every frame, and then
+    draws the overlay of the stats on top if shown. The items drawn are the ones in the repainted area;
+    fieldsDrawn, if given, returns the running total of fields drawn (see FieldOverlayItem.drawnCount()).
+    The repaints of the overlay area only (its periodic refresh) are not recorded as frames.
+    Only installed while the stats are enabled.
+    """
+
+    MARGIN = 6
+
+    def __init__(self, view: QGraphicsView, stats: RenderStats, fieldsDrawn: Optional[Callable[[], int]] = None):
+        super().__init__(view)
+        self._view = view
+        self._stats = stats
+        self._fieldsDrawn = fieldsDrawn
+        self._overlay = False
+        self._overlayRect = QRect()
+        self._font = QFont("monospace", 8)
+        self._font.setStyleHint(QFont.TypeWriter)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setOverlayVisible(self, visible: bool) -> None:
+        self._overlay = visible
+        self.updateOverlay()
+
+    # --------------------------------------------------------------------------------------------------------------
+    def updateOverlay(self) -> None:
+        """ Repaint the area of the overlay (the old one too, its size follows the text). """
+        self._view.viewport().update(self._overlayRect)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() != QEvent.Paint:
+            return False
+        area = event.region().boundingRect()
+        # Refresco del overlay: no es un frame de la escena
+        refresh = self._overlayRect.contains(area)
+        fields = self._fieldsDrawn() if self._fieldsDrawn is not None else 0
+        start = time.perf_counter()
+        self._view.viewportEvent(event)
+        seconds = time.perf_counter() - start
+        if not refresh:
+            items = len(self._view.items(area))
+            fields = self._fieldsDrawn() - fields if self._fieldsDrawn is not None else 0
+            self._stats.addFrame(seconds, items, fields)
+        if self._overlay:
+            self._paintOverlay(watched)
+        return True
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _paintOverlay(self, viewport) -> None:
+        lines = self._stats.overlayLines()
+        metrics = QFontMetrics(self._font)
+        width = max(metrics.horizontalAdvance(line) for line in lines) + 2 * self.MARGIN
+        height = metrics.lineSpacing() * len(lines) + 2 * self.MARGIN
+        self._overlayRect = QRect(self.MARGIN, self.MARGIN, width, height)
+        painter = QPainter(viewport)
+        painter.setFont(self._font)
+        painter.fillRect(self._overlayRect, QColor(0, 0, 0, 170))
+        painter.setPen(Qt.white)
+        y = self._overlayRect.top() + self.MARGIN + metrics.ascent()
+        for line in lines:
+            painter.drawText(self._overlayRect.left() + self.MARGIN, y, line)
+            y += metrics.lineSpacing()
+        painter.end()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class StartupTimer(QObject):
+    """
+    Startup times of a window, in milliseconds since origin (a time.perf_counter() taken as early as possible,
+    before the imports): time to first paint, when the first frame of the window has been painted, and time to
+    interactive, when the startup has finished (see setInteractive()), the first frame has been painted and the
+    event loop is idle again. finished is emitted once both are known.
+    """
+
+    finished = Signal()
+
+    def __init__(self, origin: float, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._origin = origin
+        self._window = None
+        self._ready = False
+        self._firstPaint = None
+        self._interactive = None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def watch(self, window: QWidget) -> None:
+        """ Wait for the first paint of window (call before showing it). """
+        self._window = window
+        window.installEventFilter(self)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def setInteractive(self) -> None:
+        """ Startup finished: the time to interactive is taken once the pending events have been processed. """
+        self._ready = True
+        QTimer.singleShot(0, self._onInteractive)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def firstPaint(self) -> Optional[float]:
+        return self._firstPaint
+
+    # --------------------------------------------------------------------------------------------------------------
+    def interactive(self) -> Optional[float]:
+        return self._interactive
+
+    # --------------------------------------------------------------------------------------------------------------
+    def report(self) -> str:
+        return "startup: first paint {}, interactive {}".format(
+            *(f"{ms:.0f} ms" if ms is not None else "-" for ms in (self._firstPaint, self._interactive)))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if watched is self._window and event.type() == QEvent.Paint:
+            watched.removeEventFilter(self)
+            # Al volver al bucle de eventos el frame ya está volcado
+            QTimer.singleShot(0, self._onFirstPaint)
+        return False
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onFirstPaint(self) -> None:
+        self._firstPaint = (time.perf_counter() - self._origin) * 1000
+        if self._ready:
+            self._onInteractive()
+
+    def _onInteractive(self) -> None:
+        if self._firstPaint is None or self._interactive is not None:
+            return
+        self._interactive = (time.perf_counter() - self._origin) * 1000
+        self.finished.emit()
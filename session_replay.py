@@ -0,0 +1,315 @@
+# --------------------------------------------------------------------------------------------------------------
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from PySide6.QtCore import QEvent, QObject, QPoint, QPointF, QThreadPool
+from PySide6.QtGui import QMouseEvent, QWheelEvent, Qt
+from PySide6.QtTest import QTest
+from PySide6.QtWidgets import QAbstractScrollArea, QApplication, QFileDialog, QMessageBox, QWidget
+
+SESSION_VERSION = 1
+
+# Tipos de evento grabados y su nombre en el fichero
+_MOUSE_EVENTS = {QEvent.MouseButtonPress: "press", QEvent.MouseButtonRelease: "release",
+                 QEvent.MouseButtonDblClick: "dblclick", QEvent.MouseMove: "move"}
+# ShortcutOverride precede a la pulsación, que no llega si la tecla dispara un atajo: se graba como pulsación
+_KEY_EVENTS = {QEvent.ShortcutOverride: "keypress", QEvent.KeyPress: "keypress", QEvent.KeyRelease: "keyrelease"}
+_MOUSE_TYPES = {name: eventType for eventType, name in _MOUSE_EVENTS.items()}
+
+# Modal dialogs whose answers are recorded, and replayed without showing them: (class, static method)
+DIALOGS = ((QFileDialog, "getOpenFileName"), (QFileDialog, "getSaveFileName"),
+           (QFileDialog, "getExistingDirectory"), (QMessageBox, "question"))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def widgetPath(root: QWidget, widget: QWidget) -> Optional[List[str]]:
+    """ Path from root to widget: one "Class:objectName" or "Class#index" (among the siblings of the same class)
+    per level, "viewport" for the viewport of a scroll area (its position among the siblings changes).
+    Popups such as menus are followed through their parent, across windows. None if outside root.
+    """
+    path = []
+    while widget is not root:
+        parent = widget.parentWidget()
+        if parent is None:
+            return None
+        name = widget.objectName()
+        if isinstance(parent, QAbstractScrollArea) and widget is parent.viewport():
+            path.append("viewport")
+        elif name:
+            path.append(f"{type(widget).__name__}:{name}")
+        else:
+            siblings = [child for child in parent.children() if type(child) is type(widget)]
+            path.append(f"{type(widget).__name__}#{siblings.index(widget)}")
+        widget = parent
+    return path[::-1]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def findWidget(root: QWidget, path: List[str]) -> Optional[QWidget]:
+    """ Widget at a path of widgetPath(), or None if the tree has changed. """
+    widget = root
+    for segment in path:
+        if segment == "viewport":
+            if not isinstance(widget, QAbstractScrollArea):
+                return None
+            widget = widget.viewport()
+            continue
+        if ":" in segment:
+            className, name = segment.split(":", 1)
+            matches = [child for child in widget.children()
+                       if type(child).__name__ == className and child.objectName() == name]
+            index = 0
+        else:
+            className, index = segment.rsplit("#", 1)
+            matches = [child for child in widget.children() if type(child).__name__ == className]
+            index = int(index)
+        if index >= len(matches):
+            return None
+        widget = matches[index]
+    return widget
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class SessionRecorder(QObject):
+    """
+    Records the mouse, wheel and key events of a user session on a window (its widgets and popups) and the
+    answers of the modal dialogs (see DIALOGS), to be replayed by SessionReplayer.
+    Only the widget that first receives each event is recorded, not the parents it propagates to. Events are
+    stored with the time since start(), the path of the widget (see widgetPath()) and its local position.
+    """
+
+    def __init__(self, root: QWidget):
+        super().__init__(root)
+        self._root = root
+        self._events = []
+        self._start = 0.0
+        self._last = None
+        self._lastWidget = None
+        self._originals = {}
+
+    # --------------------------------------------------------------------------------------------------------------
+    def start(self) -> None:
+        self._events = []
+        self._start = time.perf_counter()
+        self._last, self._lastWidget = None, None
+        QApplication.instance().installEventFilter(self)
+        for cls, name in DIALOGS:
+            original = getattr(cls, name)
+            self._originals[(cls, name)] = original
+            setattr(cls, name, self._dialogRecorder(name, original))
+
+    # --------------------------------------------------------------------------------------------------------------
+    def stop(self) -> None:
+        QApplication.instance().removeEventFilter(self)
+        for (cls, name), original in self._originals.items():
+            setattr(cls, name, original)
+        self._originals = {}
+
+    # --------------------------------------------------------------------------------------------------------------
+    def events(self) -> List[dict]:
+        return self._events
+
+    # --------------------------------------------------------------------------------------------------------------
+    def save(self, fileName: str) -> None:
+        """ Write the session as JSON, with the size of the window it was recorded on. """
+        with open(fileName, "w", encoding="utf-8") as file:
+            json.dump({"version": SESSION_VERSION, "size": [self._root.width(), self._root.height()],
+                       "events": self._events}, file, indent=0)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _dialogRecorder(self, name: str, original: Callable) -> Callable:
+        def record(*args, **kwargs):
+            result = original(*args, **kwargs)
+            answer = list(result) if isinstance(result, tuple) else result
+            if isinstance(answer, QMessageBox.StandardButton):
+                answer = answer.value
+            self._events.append({"t": time.perf_counter() - self._start, "type": "dialog", "dialog": name,
+                                 "result": answer})
+            return result
+        return staticmethod(record)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        eventType = event.type()
+        if eventType not in _MOUSE_EVENTS and eventType not in _KEY_EVENTS and eventType != QEvent.Wheel:
+            return False
+        if not isinstance(watched, QWidget):
+            return False
+        # Un evento no aceptado se propaga a los padres con el mismo instante, y una pulsación llega primero como
+        # ShortcutOverride: solo se graba el primero
+        key = (event.timestamp(), _KEY_EVENTS[eventType], event.key()) if eventType in _KEY_EVENTS else \
+            (event.timestamp(), eventType, event.globalPosition().toPoint().toTuple())
+        if key == self._last and (watched is self._lastWidget or watched.isAncestorOf(self._lastWidget)):
+            return False
+        path = widgetPath(self._root, watched)
+        if path is None:
+            return False
+        self._last, self._lastWidget = key, watched
+
+        record = {"t": time.perf_counter() - self._start, "target": path,
+                  "modifiers": event.modifiers().value}
+        if eventType in _KEY_EVENTS:
+            record.update(type=_KEY_EVENTS[eventType], key=event.key(), text=event.text(),
+                          autorepeat=event.isAutoRepeat())
+        else:
+            position = event.position()
+            record.update(x=position.x(), y=position.y(), buttons=event.buttons().value)
+            if eventType == QEvent.Wheel:
+                record.update(type="wheel", dx=event.angleDelta().x(), dy=event.angleDelta().y(),
+                              px=event.pixelDelta().x(), py=event.pixelDelta().y())
+            else:
+                record.update(type=_MOUSE_EVENTS[eventType], button=event.button().value)
+        self._events.append(record)
+        return False
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class SessionReplayer(QObject):
+    """
+    Replays a session of SessionRecorder on a window built the same way (same widget tree) and measures the
+    input-to-paint latency of every event: from sending it until the event loop returns from the first paint
+    of a widget of the window after it (the frame is complete). Events followed by no paint before the next
+    one are reported as not painted.
+    Replay is deterministic: the window is resized to the recorded size, dialogs get the recorded answers
+    without being shown, and background work (decoding, detection) is waited for before every event.
+    With realTime the recorded pauses between events are kept (timers such as frame coalescing or the zoom
+    animation behave as in the session); otherwise the next event is sent as soon as the previous one painted.
+    """
+
+    # Longest wait for the paint of the last event, seconds
+    LAST_PAINT_TIMEOUT = 0.25
+
+    def __init__(self, root: QWidget, session: dict):
+        super().__init__(root)
+        self._root = root
+        self._session = session
+        self._paints = 0
+        self._answers = []
+        self._originals = {}
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def load(fileName: str) -> dict:
+        with open(fileName, encoding="utf-8") as file:
+            session = json.load(file)
+        if session.get("version") != SESSION_VERSION:
+            raise RuntimeError(f"Unsupported session version: {session.get('version')}")
+        return session
+
+    # --------------------------------------------------------------------------------------------------------------
+    def replay(self, realTime: bool = True) -> List[dict]:
+        """ Replay every event. Returns one record per input event: type, target (last path segment),
+        latency in ms (None if it did not paint) and whether its widget was found.
+        """
+        app = QApplication.instance()
+        self._root.resize(*self._session["size"])
+        self._root.show()
+        app.processEvents()
+        self._answers = [event for event in self._session["events"] if event["type"] == "dialog"]
+        for cls, name in DIALOGS:
+            self._originals[(cls, name)] = getattr(cls, name)
+            setattr(cls, name, self._dialogAnswer(name))
+        app.installEventFilter(self)
+        try:
+            return self._replayEvents(app, realTime)
+        finally:
+            app.removeEventFilter(self)
+            for (cls, name), original in self._originals.items():
+                setattr(cls, name, original)
+            self._originals = {}
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _replayEvents(self, app: QApplication, realTime: bool) -> List[dict]:
+        events = [event for event in self._session["events"] if event["type"] != "dialog"]
+        results = []
+        start = time.perf_counter()
+        for index, event in enumerate(events):
+            QThreadPool.globalInstance().waitForDone()
+            app.processEvents()
+            if realTime:
+                due = start + event["t"]
+                while time.perf_counter() < due:
+                    app.processEvents()
+                # Si se llega tarde (trabajos de fondo) se retrasa el resto, para conservar las pausas grabadas
+                start += max(0.0, time.perf_counter() - due)
+
+            widget = findWidget(self._root, event["target"])
+            result = {"type": event["type"], "target": event["target"][-1] if event["target"] else "",
+                      "latency": None, "found": widget is not None}
+            results.append(result)
+            if widget is None:
+                continue
+            paints = self._paints
+            sent = time.perf_counter()
+            self._send(widget, event)
+            # Hasta el primer repintado, o hasta el siguiente evento
+            if index + 1 < len(events):
+                deadline = sent + (events[index + 1]["t"] - event["t"] if realTime else self.LAST_PAINT_TIMEOUT)
+            else:
+                deadline = sent + self.LAST_PAINT_TIMEOUT
+            while self._paints == paints and time.perf_counter() < deadline:
+                app.processEvents()
+            if self._paints != paints:
+                result["latency"] = (time.perf_counter() - sent) * 1000
+        return results
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _send(self, widget: QWidget, event: dict) -> None:
+        modifiers = Qt.KeyboardModifier(event["modifiers"])
+        if event["type"] in ("keypress", "keyrelease"):
+            # QTest pasa por el mapa de atajos, así que los QAction con atajo se disparan como en la sesión
+            key = Qt.Key(event["key"])
+            if event["type"] == "keypress":
+                QTest.keyPress(widget, key, modifiers)
+            else:
+                QTest.keyRelease(widget, key, modifiers)
+            return
+        position = QPointF(event["x"], event["y"])
+        globalPosition = QPointF(widget.mapToGlobal(position))
+        buttons = Qt.MouseButton(event["buttons"])
+        if event["type"] == "wheel":
+            qevent = QWheelEvent(position, globalPosition, QPoint(event["px"], event["py"]),
+                                 QPoint(event["dx"], event["dy"]), buttons, modifiers, Qt.NoScrollPhase, False)
+        else:
+            qevent = QMouseEvent(_MOUSE_TYPES[event["type"]], position, globalPosition,
+                                 Qt.MouseButton(event["button"]), buttons, modifiers)
+        QApplication.sendEvent(widget, qevent)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _dialogAnswer(self, name: str) -> Callable:
+        def answer(*args, **kwargs):
+            while self._answers:
+                recorded = self._answers.pop(0)
+                if recorded["dialog"] == name:
+                    result = recorded["result"]
+                    if name == "question":
+                        return QMessageBox.StandardButton(result)
+                    return tuple(result) if isinstance(result, list) else result
+            # Sin respuesta grabada: como si se cancelara
+            return QMessageBox.No if name == "question" else ("", "") if name != "getExistingDirectory" else ""
+        return staticmethod(answer)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Paint and isinstance(watched, QWidget) \
+                and (watched is self._root or self._root.isAncestorOf(watched)):
+            # El filtro ve el evento antes de pintar: el final se toma al volver de processEvents()
+            self._paints += 1
+        return False
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def latencySummary(results: List[dict]) -> Dict[str, dict]:
+    """ Per event type (and "all"): count, painted, and p50, p90, p95, p99 and max input-to-paint latency (ms). """
+    groups = {"all": results}
+    for result in results:
+        groups.setdefault(result["type"], []).append(result)
+    summary = {}
+    for name, group in groups.items():
+        latencies = np.array([result["latency"] for result in group if result["latency"] is not None])
+        summary[name] = {"count": len(group), "painted": len(latencies)}
+        for label, q in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99), ("max", 100)):
+            summary[name][label] = float(np.percentile(latencies, q)) if len(latencies) else None
+    return summary
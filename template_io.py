@@ -0,0 +1,192 @@
+# --------------------------------------------------------------------------------------------------------------
+"""
+Form templates: the fields (id, name and rectangle) of a FieldStore saved to a file.
+Two formats, chosen by the file extension:
+    .json   Text, one field per line: {"format": ..., "version": 1, "count": n, "fields": [
+                {"id": 1, "name": "...", "x": 0.0, "y": 0.0, "w": 0.0, "h": 0.0},
+                ...]}
+    .tplb   Binary, little endian: header (magic, version, field count, name count), then one record per
+            field (id int64, x, y, w, h float64), one entry per named field (id int64, byte length uint32)
+            and the UTF-8 bytes of those names.
+Both are written and read in chunks of CHUNK_FIELDS fields, so the memory needed does not depend on the
+size of the template beyond the field store itself. JSON files in any other layout are also read, with a
+plain json.load.
+"""
+import json
+import os
+import struct
+import threading
+from typing import BinaryIO, TextIO
+
+import numpy as np
+
+from field_store import FieldStore
+
+JSON_EXTENSION = ".json"
+BINARY_EXTENSION = ".tplb"
+TEMPLATE_EXTENSIONS = (JSON_EXTENSION, BINARY_EXTENSION)
+
+TEMPLATE_FORMAT = "qtimageviewer-template"
+TEMPLATE_VERSION = 1
+CHUNK_FIELDS = 65536
+
+_MAGIC = b"QIVTPL\0\0"
+_HEADER = struct.Struct("<8sIQQ")
+_RECORD_DTYPE = np.dtype([("id", "<i8"), ("x", "<f8"), ("y", "<f8"), ("w", "<f8"), ("h", "<f8")])
+_NAME_DTYPE = np.dtype([("id", "<i8"), ("length", "<u4")])
+_JSON_FIELD = '{{"id": {}, "name": {}, "x": {!r}, "y": {!r}, "w": {!r}, "h": {!r}}}'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def saveTemplate(fileName: str, store: FieldStore) -> None:
+    """ Save the fields of store to fileName, in the format given by its extension.
+    The file is written under a temporary name and renamed into place when complete.
+    Raises a RuntimeError for an unknown extension and OSError if the file cannot be written.
+    """
+    extension = os.path.splitext(fileName)[1].lower()
+    if extension not in TEMPLATE_EXTENSIONS:
+        raise RuntimeError(f"saveTemplate: Unknown template extension '{extension}'.")
+
+    temporary = f"{fileName}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if extension == BINARY_EXTENSION:
+            with open(temporary, "wb") as file:
+                _writeBinary(file, store)
+        else:
+            with open(temporary, "w", encoding="utf-8") as file:
+                _writeJson(file, store)
+        os.replace(temporary, fileName)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def loadTemplate(fileName: str, store: FieldStore) -> None:
+    """ Replace the fields of store with the ones in the template fileName, keeping their ids.
+    Raises OSError if the file cannot be read and RuntimeError if it is not a valid template, leaving
+    the store empty.
+    """
+    store.clear(resetIds=True)
+    try:
+        with open(fileName, "rb") as file:
+            binary = file.read(len(_MAGIC)) == _MAGIC
+        if binary:
+            with open(fileName, "rb") as file:
+                _readBinary(file, store)
+        else:
+            with open(fileName, "r", encoding="utf-8") as file:
+                _readJson(file, store)
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+        store.clear(resetIds=True)
+        raise RuntimeError(f"loadTemplate: Invalid template file '{fileName}': {e}") from e
+    except Exception:
+        store.clear(resetIds=True)
+        raise
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _chunks(store: FieldStore):
+    """ Slices of store.fields() of at most CHUNK_FIELDS fields. """
+    for start in range(0, len(store), CHUNK_FIELDS):
+        yield store.fields()[start:start + CHUNK_FIELDS]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _writeBinary(file: BinaryIO, store: FieldStore) -> None:
+    names = store.names()
+    file.write(_HEADER.pack(_MAGIC, TEMPLATE_VERSION, len(store), len(names)))
+    for fields in _chunks(store):
+        records = np.empty(len(fields), dtype=_RECORD_DTYPE)
+        for name in _RECORD_DTYPE.names:
+            records[name] = fields[name]
+        file.write(records.tobytes())
+
+    encoded = [(fieldId, name.encode("utf-8")) for fieldId, name in sorted(names.items())]
+    entries = np.array([(fieldId, len(data)) for fieldId, data in encoded], dtype=_NAME_DTYPE)
+    file.write(entries.tobytes())
+    file.write(b"".join(data for _, data in encoded))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _readBinary(file: BinaryIO, store: FieldStore) -> None:
+    magic, version, count, nameCount = _HEADER.unpack(file.read(_HEADER.size))
+    if version > TEMPLATE_VERSION:
+        raise ValueError(f"version {version} is not supported")
+
+    remaining = count
+    while remaining:
+        records = np.frombuffer(file.read(min(remaining, CHUNK_FIELDS) * _RECORD_DTYPE.itemsize), _RECORD_DTYPE)
+        if len(records) == 0:
+            raise ValueError("file is truncated")
+        rects = np.stack([records["x"], records["y"], records["w"], records["h"]], axis=1)
+        store.addMany(rects, ids=records["id"])
+        remaining -= len(records)
+
+    entries = np.frombuffer(file.read(nameCount * _NAME_DTYPE.itemsize), _NAME_DTYPE)
+    if len(entries) != nameCount:
+        raise ValueError("file is truncated")
+    data = file.read(int(entries["length"].sum()))
+    names, offset = {}, 0
+    for fieldId, length in entries.tolist():
+        names[fieldId] = data[offset:offset + length].decode("utf-8")
+        offset += length
+    store.setNames(names)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _writeJson(file: TextIO, store: FieldStore) -> None:
+    header = {"format": TEMPLATE_FORMAT, "version": TEMPLATE_VERSION, "count": len(store)}
+    file.write(json.dumps(header)[:-1] + ', "fields": [\n')
+    names = store.names()
+    separator = ""
+    for fields in _chunks(store):
+        lines = [_JSON_FIELD.format(fieldId, json.dumps(names.get(fieldId, "")), x, y, w, h)
+                 for fieldId, x, y, w, h in zip(fields["id"].tolist(), fields["x"].tolist(), fields["y"].tolist(),
+                                                fields["w"].tolist(), fields["h"].tolist())]
+        if lines:
+            file.write(separator + ",\n".join(lines))
+            separator = ",\n"
+    file.write("\n]}\n")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _readJson(file: TextIO, store: FieldStore) -> None:
+    first = file.readline()
+    if not first.rstrip().endswith('"fields": ['):
+        # No está escrito por _writeJson: se lee entero
+        file.seek(0)
+        document = json.load(file)
+        _checkHeader(document)
+        _addJsonFields(store, document["fields"])
+        return
+
+    _checkHeader(json.loads(first.rstrip()[:-len('"fields": [')].rstrip().rstrip(",") + "}"))
+    # Cada bloque de líneas se decodifica con una sola llamada a json.loads
+    lines = []
+    for line in file:
+        line = line.strip().rstrip(",")
+        if line in ("]}", ""):
+            continue
+        lines.append(line)
+        if len(lines) == CHUNK_FIELDS:
+            _addJsonFields(store, json.loads("[" + ",".join(lines) + "]"))
+            lines = []
+    _addJsonFields(store, json.loads("[" + ",".join(lines) + "]"))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _checkHeader(header: dict) -> None:
+    if header.get("format") != TEMPLATE_FORMAT:
+        raise ValueError("not a template file")
+    if header.get("version", 0) > TEMPLATE_VERSION:
+        raise ValueError(f"version {header['version']} is not supported")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _addJsonFields(store: FieldStore, fields: list) -> None:
+    if not fields:
+        return
+    rects = np.array([(field["x"], field["y"], field["w"], field["h"]) for field in fields], dtype=np.float64)
+    store.addMany(rects, ids=np.array([field["id"] for field in fields], dtype=np.int64))
+    store.setNames({field["id"]: field["name"] for field in fields if field.get("name")})
@@ -0,0 +1,245 @@
+# --------------------------------------------------------------------------------------------------------------
+import hashlib
+import os
+import threading
+from typing import Iterable, Optional, Tuple
+
+from PySide6.QtCore import QObject, QRunnable, QSize, QStandardPaths, QThreadPool, Qt, Signal
+from PySide6.QtGui import QImage, QImageReader
+
+from image_cache import ImageCache
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class _ThumbnailSignals(QObject):
+    # file name, thumbnail (null if the file could not be read)
+    finished = Signal(str, QImage)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class _ThumbnailTask(QRunnable):
+    """ Reads a thumbnail from the disk cache, or makes it from the image file and stores it. The disk cache is
+    best-effort: if it cannot be written the thumbnail is still delivered.
+    """
+
+    def __init__(self, cache: "ThumbnailCache", fileName: str, key: Optional[Tuple[str, int, int]]):
+        super().__init__()
+        self.signals = _ThumbnailSignals()
+        self.key = key
+        self.stored = False
+        self._cache = cache
+        self._fileName = fileName
+
+    def run(self) -> None:
+        path = self._cache.keyPath(self.key) if self.key is not None else None
+        thumbnail = QImage(path) if path is not None and os.path.isfile(path) else QImage()
+        if not thumbnail.isNull():
+            # La fecha de modificación marca el último uso: prune() borra primero las menos usadas
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        else:
+            thumbnail = ThumbnailCache.makeThumbnail(self._fileName, self._cache.size())
+            if not thumbnail.isNull() and path is not None:
+                try:
+                    self._cache.store(path, thumbnail)
+                    self.stored = True
+                except OSError:
+                    # Directorio de caché no escribible o disco lleno: la miniatura se muestra igualmente
+                    pass
+        self.signals.finished.emit(self._fileName, thumbnail)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class _PruneTask(QRunnable):
+    """ Runs ThumbnailCache.prune() in a worker thread. """
+
+    def __init__(self, cache: "ThumbnailCache"):
+        super().__init__()
+        self._cache = cache
+
+    def run(self) -> None:
+        self._cache.prune()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class ThumbnailCache(QObject):
+    """
+    Persistent thumbnail cache. Thumbnails are PNG files in a content-addressed directory, named after a
+    hash of the image path, modification time and size, so a changed file gets a new thumbnail and a
+    second visit to a folder needs no image decodes at all.
+    request() never blocks: thumbnails already in memory are returned at once, the rest are read from disk
+    or generated on a background pool and announced through thumbnailReady. The pool is shared with the
+    ImageLoader (the global pool by default) and thumbnails run at a lower PRIORITY, so a page the user asked
+    for starts before any queued thumbnail. Requests still queued for
+    files that are no longer needed can be dropped with retain().
+    The memory cache and the files that could not be read are keyed like the disk cache (see fileKey()),
+    so a file rewritten during the session gets a new thumbnail and a failed file is retried once it changes.
+    The disk cache is limited to maxDiskBytes: it is pruned in the background when the cache is created and
+    after every PRUNE_INTERVAL new thumbnails, removing the least recently used thumbnails first.
+    """
+
+    thumbnailReady = Signal(str, QImage)  # file name, thumbnail
+
+    DEFAULT_SIZE = 160
+    MEMORY_BYTES = 64 * 1024 * 1024
+    DISK_BYTES = 256 * 1024 * 1024
+    PRUNE_INTERVAL = 256
+    # Prioridad en el pool: por debajo de las cargas del ImageLoader (prioridad 0); la poda, aún más baja
+    PRIORITY = -1
+
+    def __init__(self, directory: Optional[str] = None, size: int = DEFAULT_SIZE, parent: Optional[QObject] = None,
+                 maxDiskBytes: int = DISK_BYTES, threadPool: Optional[QThreadPool] = None):
+        super().__init__(parent)
+        if directory is None:
+            directory = os.path.join(QStandardPaths.writableLocation(QStandardPaths.CacheLocation), "thumbnails")
+        self._directory = directory
+        self._size = size
+        self._maxDiskBytes = maxDiskBytes
+        # Miniaturas guardadas en disco desde la última poda
+        self._stored = 0
+        self._pruneLock = threading.Lock()
+        # Claves de fileKey(); las tareas en curso por nombre de archivo
+        self._memory = ImageCache(self.MEMORY_BYTES)
+        self._pending = {}
+        self._failed = set()
+
+        # Un solo pool acotado para miniaturas e imágenes: las cargas pasan delante de las miniaturas en cola
+        # (una miniatura que ya se está generando sí termina antes)
+        self._threadPool = threadPool if threadPool is not None else QThreadPool.globalInstance()
+        self._threadPool.start(_PruneTask(self), self.PRIORITY - 1)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def size(self) -> int:
+        """ Maximum width and height of the thumbnails. """
+        return self._size
+
+    # --------------------------------------------------------------------------------------------------------------
+    def directory(self) -> str:
+        return self._directory
+
+    # --------------------------------------------------------------------------------------------------------------
+    def request(self, fileName: str, key: Optional[Tuple[str, int, int]] = None) -> Optional[QImage]:
+        """ Returns the thumbnail if it is in memory. Otherwise schedules it and returns None.
+        Files that could not be read are not retried until they change.
+        key is the fileKey() of fileName if the caller already has it; otherwise the file is stat'ed.
+        """
+        if key is None:
+            key = self.fileKey(fileName)
+        thumbnail = self._memory.get(key) if key is not None else None
+        if thumbnail is not None:
+            return thumbnail
+        if fileName not in self._pending and (fileName, key) not in self._failed:
+            task = _ThumbnailTask(self, fileName, key)
+            # noinspection PyUnresolvedReferences
+            task.signals.finished.connect(self._onFinished)
+            self._pending[fileName] = task
+            self._threadPool.start(task, self.PRIORITY)
+        return None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def retain(self, fileNames: Iterable[str]) -> None:
+        """ Drop the queued requests for any file not in fileNames (those already running finish normally). """
+        keep = set(fileNames)
+        for fileName in [name for name in self._pending if name not in keep]:
+            if self._threadPool.tryTake(self._pending[fileName]):
+                del self._pending[fileName]
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def fileKey(fileName: str) -> Optional[Tuple[str, int, int]]:
+        """ (absolute path, modification time in ns, size) of fileName, or None if the file cannot be read. """
+        try:
+            stat = os.stat(fileName)
+        except OSError:
+            return None
+        return os.path.abspath(fileName), stat.st_mtime_ns, stat.st_size
+
+    # --------------------------------------------------------------------------------------------------------------
+    def cachePath(self, fileName: str) -> Optional[str]:
+        """ Location of the thumbnail of fileName in the disk cache, or None if the file cannot be read. """
+        key = self.fileKey(fileName)
+        return self.keyPath(key) if key is not None else None
+
+    # --------------------------------------------------------------------------------------------------------------
+    def keyPath(self, key: Tuple[str, int, int]) -> str:
+        """ Location in the disk cache of the thumbnail of a fileKey(). """
+        path, mtime, size = key
+        digest = hashlib.sha1(f"{path}\0{mtime}\0{size}\0{self._size}".encode("utf-8")).hexdigest()
+        return os.path.join(self._directory, digest[:2], digest + ".png")
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def store(path: str, thumbnail: QImage) -> None:
+        """ Write a thumbnail to the disk cache, renamed into place so readers never see it half written. """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if thumbnail.save(temporary, "PNG"):
+            os.replace(temporary, path)
+
+    # --------------------------------------------------------------------------------------------------------------
+    def prune(self) -> int:
+        """ Remove the least recently used thumbnails until the disk cache takes at most maxDiskBytes.
+        Safe to call from worker threads; does nothing if another prune is running. Returns the bytes removed.
+        """
+        if not self._pruneLock.acquire(blocking=False):
+            return 0
+        try:
+            entries = []
+            for folder, _, names in os.walk(self._directory):
+                for name in names:
+                    path = os.path.join(folder, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            # Las más antiguas primero; los .tmp huérfanos de un proceso interrumpido también cuentan
+            for _, size, path in sorted(entries):
+                if total - removed <= self._maxDiskBytes:
+                    break
+                try:
+                    os.remove(path)
+                    removed += size
+                except OSError:
+                    pass
+            return removed
+        finally:
+            self._pruneLock.release()
+
+    # --------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def makeThumbnail(fileName: str, size: int) -> QImage:
+        """ Decode fileName scaled to fit in size x size. Formats that support it (JPEG) decode at reduced size. """
+        reader = QImageReader(fileName)
+        original = reader.size()
+        if original.isValid():
+            reader.setScaledSize(original.scaled(QSize(size, size), Qt.KeepAspectRatio))
+        thumbnail = reader.read()
+        if thumbnail.isNull():
+            return thumbnail
+        if thumbnail.width() > size or thumbnail.height() > size:
+            thumbnail = thumbnail.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if thumbnail.depth() == 1:
+            thumbnail = thumbnail.convertToFormat(QImage.Format_Grayscale8)
+        return thumbnail
+
+    # --------------------------------------------------------------------------------------------------------------
+    def _onFinished(self, fileName: str, thumbnail: QImage) -> None:
+        task = self._pending.pop(fileName, None)
+        key = task.key if task is not None else self.fileKey(fileName)
+        if task is not None and task.stored:
+            self._stored += 1
+            if self._stored >= self.PRUNE_INTERVAL:
+                self._stored = 0
+                self._threadPool.start(_PruneTask(self), self.PRIORITY - 1)
+        if thumbnail.isNull():
+            self._failed.add((fileName, key))
+            return
+        if key is not None:
+            self._memory.put(key, thumbnail)
+        # noinspection PyUnresolvedReferences
+        self.thumbnailReady.emit(fileName, thumbnail)
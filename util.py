@@ -1,24 +1,97 @@
 # --------------------------------------------------------------------------------------------------------------
 import os
-from typing import Union, Optional, Tuple, Any
+from typing import Union, Optional, Tuple, Any, List
 
-from PySide6.QtGui import QImage
+from PySide6.QtGui import QImage, QImageReader
 from PySide6.QtWidgets import QFileDialog
 
 
+# TODO Adaptar los filtros de imagen para todos los tipos que necesite
+IMAGE_EXTENSIONS = (".png", ".jpg", ".bmp", ".tif")
+
+
 # ----------------------------------------------------------------------------------------------------------------------------
-def loadImageFromFile(parent, startupDir) -> Optional[Tuple[Union[QImage, QImage], Union[Union[str, bytes], Any]]]:
+def getImageFileName(parent, startupDir) -> str:
+    """ Pop up a file dialog to choose an image file. Returns an empty string if nothing valid was chosen. """
+    patterns = " ".join("*" + extension for extension in IMAGE_EXTENSIONS)
+    fileName, _ = QFileDialog.getOpenFileName(parent, "Open image file.", dir=startupDir,
+                                              filter=f"Image files ({patterns})")
+    if len(fileName) and os.path.isfile(fileName):
+        return fileName
+    return ""
+
+
+# ----------------------------------------------------------------------------------------------------------------------------
+def getImageFolderName(parent, startupDir) -> str:
+    """ Pop up a dialog to choose a folder. Returns an empty string if nothing was chosen. """
+    folderName = QFileDialog.getExistingDirectory(parent, "Open image folder.", dir=startupDir)
+    if len(folderName) and os.path.isdir(folderName):
+        return folderName
+    return ""
+
+
+# ----------------------------------------------------------------------------------------------------------------------------
+def getTemplateFileName(parent, startupDir, save=False) -> str:
+    """ Pop up a file dialog to choose a template file to open, or to save to.
+    Returns an empty string if nothing valid was chosen.
+    """
+    filters = "Template files (*.json);;Binary template files (*.tplb)"
+    if save:
+        fileName, selected = QFileDialog.getSaveFileName(parent, "Save template.", dir=startupDir, filter=filters)
+        if len(fileName) and not os.path.splitext(fileName)[1]:
+            fileName += ".tplb" if "tplb" in selected else ".json"
+        return fileName
+    fileName, _ = QFileDialog.getOpenFileName(parent, "Open template.", dir=startupDir,
+                                              filter="Template files (*.json *.tplb)")
+    if len(fileName) and os.path.isfile(fileName):
+        return fileName
+    return ""
+
+
+# ----------------------------------------------------------------------------------------------------------------------------
+def listImageFiles(folderName: str) -> List[str]:
+    """ Image files (see IMAGE_EXTENSIONS) directly inside a folder, sorted by name. """
+    with os.scandir(folderName) as entries:
+        files = [entry.path for entry in entries
+                 if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS]
+    return sorted(files, key=lambda path: os.path.basename(path).lower())
+
+
+# ----------------------------------------------------------------------------------------------------------------------------
+def decodeImage(fileName: str, page: int = 0) -> Tuple[Optional[QImage], str]:
+    """ Decode one page of an image file (page 0 for single page formats). Returns (image, "") or (None, error).
+    Only the requested page is decoded, so the cost does not depend on the number of pages of a multi-page TIFF.
+    It does not touch any widget, so it is safe to call from a worker thread.
+    """
+    reader = QImageReader(fileName)
+    if page > 0 and not reader.jumpToImage(page):
+        return None, f"Page {page + 1} not found"
+    image = reader.read()
+    if image.isNull():
+        return None, reader.errorString()
+    return image, ""
+
+
+# ----------------------------------------------------------------------------------------------------------------------------
+def imagePageCount(fileName: str) -> int:
+    """ Number of pages (images) in a file, reading only the file structure. At least 1. """
+    return max(1, QImageReader(fileName).imageCount())
+
+
+# ----------------------------------------------------------------------------------------------------------------------------
+def loadImageFromFile(parent, startupDir,
+                      page=0) -> Optional[Tuple[Union[QImage, QImage], Union[Union[str, bytes], Any]]]:
     """ Load an image from file.
-    Without any arguments, loadImageFromFile() will pop up a file dialog to choose the image file.
-    With a fileName argument, loadImageFromFile(fileName) will attempt to load the specified image file directly.
+    Pops up a file dialog to choose the image file and decodes it (only the given page of a multi-page file)
+    on the calling thread.
+    To keep the GUI responsive use getImageFileName() together with image_loader.ImageLoader instead.
     """
-    # TODO Adaptar los filtros de imagen para todos los tipos que necesite
-    fileName, _ = QFileDialog.getOpenFileName(parent, "Open image file.", dir=startupDir, filter="Image files (*.png "
-                                                                                                 "*.jpg *.bmp *.tif)")
+    fileName = getImageFileName(parent, startupDir)
 
-    if len(fileName) and os.path.isfile(fileName):
-        image = QImage(fileName)
-        name = os.path.basename(fileName)
-        return image, name
+    if len(fileName):
+        image, _ = decodeImage(fileName, page)
+        if image is not None:
+            name = os.path.basename(fileName)
+            return image, name
 
     return None